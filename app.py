@@ -5,144 +5,34 @@ SerpAPI Discovery → Apify Enrichment → Hard Filters → AI Classification 
 
 import streamlit as st
 import pandas as pd
-import re
-import time
-import warnings
-import json
-import google.generativeai as genai
 import plotly.express as px
 from datetime import datetime
 
-warnings.filterwarnings("ignore")
-
-# ————————————————————————————————————————————————————————————————————————————
-# CONSTANTS
-# ──────────────────────────────────────────────
-
-INSTITUTE_KEYWORDS = [
-    'Academy', 'Institute', 'Classes', 'Coaching', 'Tutorial', 'School',
-    'Education', 'Center', 'Hub', 'Campus', 'Group', 'Team',
-    'System', 'Official', 'Centre', 'Learning', 'Foundation'
-]
-
-BRAND_BLACKLIST = [
-    'PW', 'Physics Wallah', 'Unacademy', 'Vedantu', 'Byju', 'Allen',
-    'Adda247', 'Sankalp', 'Magnet Brains', 'Xylem', 'Utkarsh',
-    'Motion', 'Careerwill', 'Apna College', 'Infinity Learn', 'Doubtnut',
-    'Mahendra', 'Wi-Fi Study', 'Exampur', 'Next Toppers',
-    'Infosys', 'TCS', 'Wipro', 'HCL', 'Accenture', 'Cognizant',
-    'Amazon', 'Google', 'Microsoft', 'Meta', 'Facebook', 'Apple', 'OpenAI',
-    'Flipkart', 'Zomato', 'Swiggy', 'Paytm', 'Ola', 'Uber'
-]
-
-EDUCATION_ROLES = [
-    'teacher', 'tutor', 'educator', 'professor', 'lecturer', 'faculty',
-    'principal', 'vice principal', 'director', 'head of department', 'hod',
-    'academic head', 'dean', 'founder', 'co-founder', 'ceo', 'coo', 'cto',
-    'owner', 'managing director', 'administrator', 'coordinator'
-]
-
-INDIAN_CITIES = [
-    "Delhi", "Mumbai", "Bangalore", "Hyderabad", "Chennai", "Kolkata",
-    "Pune", "Jaipur", "Lucknow", "Kota", "Patna", "Chandigarh",
-    "Ahmedabad", "Indore", "Bhopal", "Nagpur", "Varanasi", "Ranchi",
-    "Dehradun", "Allahabad", "Noida", "Gurgaon", "Sikar", "Jodhpur"
-]
-
-SYSTEM_PAGES = [
-    'login', 'signup', 'jobs', 'feed', 'mynetwork', 'messaging',
-    'notifications', 'learning', 'pulse', 'posts', 'company/login'
-]
-
-# Safety Limits
-MAX_SERPAPI_QUERIES = 50
-MAX_APIFY_SCRAPES = 300
-MAX_GEMINI_CALLS = 300
-
-ROLE_OPTIONS = [
-    "All Roles", "Tutor/Teacher", "Principal/Director",
-    "Founder/CEO", "HOD/Academic Head", "Coaching Owner"
-]
-
-CITY_OPTIONS = ["All Cities"] + INDIAN_CITIES
-
-# Phase 3 — Hard Filter Constants
-EDUCATION_KEYWORDS = [
-    'teacher', 'tutor', 'educator', 'professor', 'lecturer', 'faculty',
-    'principal', 'vice principal', 'director of education', 'academic',
-    'head of department', 'hod', 'dean', 'coaching', 'classes',
-    'school', 'academy', 'institute', 'college', 'university',
-    'cbse', 'icse', 'igcse', 'ib', 'cambridge', 'neet', 'jee',
-    'curriculum', 'pedagogy', 'learning', 'education', 'edtech',
-    'tuition', 'teaching', 'instruction', 'mentoring', 'training',
-    'mathematics', 'physics', 'chemistry', 'biology', 'english', 'science',
-    'founder', 'ceo', 'coo', 'managing director'
-]
-
-NON_EDUCATION_KEYWORDS = [
-    'software engineer', 'data scientist', 'product manager', 'marketing',
-    'sales executive', 'business development', 'consultant', 'analyst',
-    'recruiter', 'hr manager', 'finance', 'banking', 'real estate',
-    'insurance', 'automotive', 'hospitality', 'retail'
-]
-
-INDIA_INDICATORS = [
-    'india', 'delhi', 'mumbai', 'bangalore', 'bengaluru', 'hyderabad',
-    'chennai', 'kolkata', 'pune', 'jaipur', 'lucknow', 'kota', 'patna',
-    'chandigarh', 'ahmedabad', 'indore', 'bhopal', 'nagpur', 'varanasi',
-    'ranchi', 'dehradun', 'noida', 'gurgaon', 'gurugram', 'greater noida',
-    'ghaziabad', 'faridabad', 'new delhi', 'navi mumbai', 'thane',
-    'karnataka', 'maharashtra', 'tamil nadu', 'telangana', 'kerala',
-    'uttar pradesh', 'rajasthan', 'gujarat', 'madhya pradesh', 'bihar',
-    'west bengal', 'andhra pradesh', 'odisha', 'jharkhand', 'haryana', 'punjab'
-]
-
-MIN_CONNECTIONS = 100
-MAX_CONNECTIONS = 30000
-MIN_COMPANY_FOLLOWERS = 50
-MAX_COMPANY_FOLLOWERS = 500000
-
-
-# ──────────────────────────────────────────────
-# APIFY KEY MANAGER — Multi-Key Rotation
-# ──────────────────────────────────────────────
-
-class ApifyKeyManager:
-    """Manage multiple Apify API keys with auto-rotation on quota exhaustion."""
-
-    def __init__(self, keys: list):
-        self.keys = [k for k in keys if k]
-        self.current_index = 0
-        self.exhausted_keys: set[int] = set()
-
-    def get_current_key(self) -> str | None:
-        """Return current active key, or None if all exhausted."""
-        while self.current_index < len(self.keys):
-            if self.current_index not in self.exhausted_keys:
-                return self.keys[self.current_index]
-            self.current_index += 1
-        return None
-
-    def mark_exhausted(self) -> str | None:
-        """Mark current key as exhausted and rotate to next."""
-        self.exhausted_keys.add(self.current_index)
-        self.current_index += 1
-        if self.current_index < len(self.keys):
-            return self.keys[self.current_index]
-        return None
-
-    def get_status(self) -> str:
-        """Return status string for sidebar display."""
-        active = len(self.keys) - len(self.exhausted_keys)
-        if not self.keys:
-            return "No Apify keys loaded"
-        return f"{active}/{len(self.keys)} keys active (using key #{self.current_index + 1})"
-
-    def has_keys(self) -> bool:
-        return len(self.keys) > 0
-
-    def is_exhausted(self) -> bool:
-        return self.get_current_key() is None
+from pipeline import (
+    CITY_OPTIONS,
+    LOCAL_MODEL_MIN_EXAMPLES,
+    MAX_APIFY_SCRAPES,
+    MAX_GEMINI_CALLS,
+    MAX_SERPAPI_QUERIES,
+    CAMPAIGN_BUDGET,
+    ROLE_OPTIONS,
+    ApifyKeyManager,
+    JobManager,
+    Metrics,
+    get_actor_health,
+    get_checkpoint_store,
+    get_classification_cache,
+    get_job_manager,
+    get_lead_store,
+    list_local_models,
+    load_existing_linkedin_leads,
+    metrics_budget_line,
+    metrics_provider_rows,
+    metrics_stage_rows,
+    run_fingerprint,
+    summarize_run_metrics,
+    train_local_classifier,
+)
 
 
 # ──────────────────────────────────────────────
@@ -162,1270 +52,43 @@ def _load_key(secret_name: str, label: str, sidebar_container) -> str:
 
 
 # ──────────────────────────────────────────────
-# SERPAPI QUERY GENERATOR
-# ──────────────────────────────────────────────
-
-def generate_linkedin_queries(subject: str, roles: list, cities: list, round_num: int) -> list:
-    """
-    Generate diverse Google-dork queries for SerpAPI.
-    Each round produces different queries so the deep loop keeps finding new profiles.
-    """
-    queries = []
-    subj = subject.strip()
-
-    if round_num == 0:
-        # Round 0 — core role-based queries
-        queries = [
-            f'site:linkedin.com/in/ "{subj}" "teacher" India',
-            f'site:linkedin.com/in/ "{subj}" "tutor" CBSE',
-            f'site:linkedin.com/in/ "{subj}" "coaching" "founder"',
-            f'site:linkedin.com/in/ "principal" "school" India',
-            f'site:linkedin.com/in/ "director" "education" India',
-        ]
-
-    elif round_num == 1:
-        # Round 1 — alternate phrasing
-        queries = [
-            f'site:linkedin.com/in/ "{subj}" "educator" "classes"',
-            f'site:linkedin.com/in/ "head of department" "{subj}" school',
-            f'site:linkedin.com/in/ "academic head" school India',
-            f'site:linkedin.com/in/ "vice principal" school India',
-            f'site:linkedin.com/in/ "{subj}" "faculty" India',
-        ]
-
-    elif 2 <= round_num <= 5:
-        # Rounds 2-5 — city-based queries (6 cities per round)
-        start_idx = (round_num - 2) * 6
-        round_cities = INDIAN_CITIES[start_idx:start_idx + 6]
-        for city in round_cities:
-            queries.append(f'site:linkedin.com/in/ "{subj}" teacher {city}')
-            queries.append(f'site:linkedin.com/in/ "principal" school {city}')
-            queries.append(f'site:linkedin.com/in/ "coaching" "director" {city}')
-
-    elif 6 <= round_num <= 8:
-        # Rounds 6-8 — company page discovery
-        start_idx = (round_num - 6) * 6
-        round_cities = INDIAN_CITIES[start_idx:start_idx + 6]
-        for city in round_cities:
-            queries.append(f'site:linkedin.com/company/ "coaching" "classes" {city}')
-            queries.append(f'site:linkedin.com/company/ "school" "education" {city}')
-            queries.append(f'site:linkedin.com/company/ "academy" "institute" {city}')
-
-    else:
-        # Round 9+ — re-run earlier patterns with pagination offsets
-        page_offset = (round_num - 9) * 10 + 10  # 10, 20, 30 …
-        queries = [
-            f'site:linkedin.com/in/ "{subj}" "teacher" India',
-            f'site:linkedin.com/in/ "{subj}" "tutor" India',
-            f'site:linkedin.com/in/ "{subj}" "coaching" India',
-            f'site:linkedin.com/in/ "principal" "school" India',
-            f'site:linkedin.com/in/ "founder" "education" India',
-        ]
-        # page_offset is passed separately when calling SerpAPI (start param)
-        return queries, page_offset
-
-    return queries, 0
-
-
-# ──────────────────────────────────────────────
-# URL PARSER
-# ──────────────────────────────────────────────
-
-_INDIVIDUAL_RE = re.compile(r'linkedin\.com/in/([a-zA-Z0-9_-]+)', re.IGNORECASE)
-_COMPANY_RE = re.compile(r'linkedin\.com/company/([a-zA-Z0-9_-]+)', re.IGNORECASE)
-
-
-def extract_linkedin_info_from_url(url: str, snippet: str = "", title: str = "") -> dict | None:
-    """
-    Parse a SerpAPI organic result into a profile dict.
-    Returns None if the URL is a system page or invalid.
-    """
-    url = (url or "").strip()
-    if not url:
-        return None
-
-    # Determine profile type
-    ind_match = _INDIVIDUAL_RE.search(url)
-    comp_match = _COMPANY_RE.search(url)
-
-    if ind_match:
-        username = ind_match.group(1).lower()
-        if username in SYSTEM_PAGES:
-            return None
-        profile_type = "individual"
-        normalized_url = f"https://www.linkedin.com/in/{username}"
-    elif comp_match:
-        slug = comp_match.group(1).lower()
-        if slug in SYSTEM_PAGES:
-            return None
-        profile_type = "company"
-        normalized_url = f"https://www.linkedin.com/company/{slug}"
-    else:
-        return None
-
-    # Parse title  (typical: "FirstName LastName - Role - Company | LinkedIn")
-    name, headline, organization = "", "", ""
-    if title:
-        title_clean = title.replace(" | LinkedIn", "").replace("| LinkedIn", "").strip()
-        parts = [p.strip() for p in title_clean.split(" - ")]
-        if len(parts) >= 1:
-            name = parts[0]
-        if len(parts) >= 2:
-            headline = parts[1]
-        if len(parts) >= 3:
-            organization = parts[2]
-
-    return {
-        "url": normalized_url,
-        "name": name,
-        "headline": headline,
-        "organization": organization,
-        "profile_type": profile_type,
-        "snippet": (snippet or "")[:300],
-    }
-
-
-# ──────────────────────────────────────────────
-# SERPAPI DISCOVERY
+# HELPER: run metrics panel
 # ──────────────────────────────────────────────
 
-def discover_via_serpapi(
-    subject: str,
-    roles: list,
-    cities: list,
-    serpapi_key: str,
-    status_container,
-    round_num: int = 0,
-) -> list:
-    """
-    Execute SerpAPI queries for one round and return a list of unique
-    LinkedIn profile dicts.
-    """
-    from serpapi import GoogleSearch
-
-    queries, page_offset = generate_linkedin_queries(subject, roles, cities, round_num)
-    all_profiles: list[dict] = []
-    seen_urls: set[str] = set()
-
-    for i, query in enumerate(queries):
-        try:
-            params = {
-                "q": query,
-                "api_key": serpapi_key,
-                "engine": "google",
-                "num": 20,
-                "gl": "in",
-                "hl": "en",
-            }
-            if page_offset:
-                params["start"] = page_offset
-
-            search = GoogleSearch(params)
-            results = search.get_dict()
-
-            organic = results.get("organic_results", [])
-            status_container.write(
-                f"🔍 Query {i+1}/{len(queries)} → {len(organic)} results"
-            )
-
-            for item in organic:
-                profile = extract_linkedin_info_from_url(
-                    item.get("link", ""),
-                    item.get("snippet", ""),
-                    item.get("title", ""),
-                )
-                if profile and profile["url"] not in seen_urls:
-                    seen_urls.add(profile["url"])
-                    all_profiles.append(profile)
-
-        except Exception as e:
-            err_str = str(e).lower()
-            if any(kw in err_str for kw in ["invalid", "key", "unauthorized"]):
-                status_container.write("❌ SerpAPI: Invalid API key.")
-                return all_profiles
-            if any(kw in err_str for kw in ["quota", "limit", "exceeded"]):
-                status_container.write("⚠ï¸ SerpAPI quota exhausted.")
-                return all_profiles
-            status_container.write(f"⚠ï¸ SerpAPI error: {e}")
-
-        # Rate limit between queries
-        time.sleep(1.5)
-
-    status_container.write(
-        f"📊 Round {round_num} discovery: {len(all_profiles)} unique profiles found"
-    )
-    return all_profiles
-
-
-# ──────────────────────────────────────────────
-# DEDUPLICATION — Master CSV
-# ──────────────────────────────────────────────
-
-def load_existing_linkedin_leads(uploaded_file) -> tuple[set, set, int, str]:
-    """
-    Read a master CSV and return:
-      (existing_urls_set, existing_names_set, count, error_message)
-    """
-    existing_urls: set[str] = set()
-    existing_names: set[str] = set()
-    error_msg = ""
-
-    try:
-        df = pd.read_csv(uploaded_file)
-        # Try common column names for the LinkedIn URL
-        url_col = None
-        for col in df.columns:
-            if "linkedin" in col.lower() and "url" in col.lower():
-                url_col = col
-                break
-        if url_col is None:
-            for col in df.columns:
-                if "url" in col.lower() or "link" in col.lower():
-                    url_col = col
-                    break
-
-        if url_col:
-            for val in df[url_col].dropna():
-                existing_urls.add(str(val).strip().lower().rstrip("/"))
-        else:
-            error_msg = "⚠ï¸ No URL/Link column found in CSV. Dedup by URL skipped."
-
-        # Names
-        name_col = None
-        for col in df.columns:
-            if col.lower() in ["name", "full name", "full_name", "fullname"]:
-                name_col = col
-                break
-        if name_col:
-            for val in df[name_col].dropna():
-                existing_names.add(str(val).strip().lower())
-
-    except Exception as e:
-        error_msg = f"❌ Error reading CSV: {e}"
-
-    return existing_urls, existing_names, len(existing_urls), error_msg
-
-
-# ──────────────────────────────────────────────
-# APIFY — Profile Scraping (Phase 2)
-# ──────────────────────────────────────────────
-
-def _is_apify_quota_error(err) -> bool:
-    """Check if an error indicates Apify quota/credit exhaustion."""
-    err_str = str(err).lower()
-    return any(kw in err_str for kw in ["quota", "credit", "limit", "402", "payment", "subscription"])
-
-
-def _parse_experience(experience_list: list) -> tuple[str, str, int]:
-    """
-    Parse an Apify experience array.
-    Returns (current_company, current_role, experience_years).
-    """
-    current_company = ""
-    current_role = ""
-    experience_years = 0
-
-    if not experience_list:
-        return current_company, current_role, experience_years
-
-    # Find current role (isCurrent=True or first entry)
-    for exp in experience_list:
-        if isinstance(exp, dict):
-            if exp.get("isCurrent", False):
-                current_company = exp.get("companyName", "") or exp.get("company", "")
-                current_role = exp.get("title", "") or exp.get("role", "")
-                break
-    if not current_company and experience_list:
-        first = experience_list[0] if isinstance(experience_list[0], dict) else {}
-        current_company = first.get("companyName", "") or first.get("company", "")
-        current_role = first.get("title", "") or first.get("role", "")
-
-    # Calculate experience years from earliest date
-    try:
-        years = []
-        for exp in experience_list:
-            if isinstance(exp, dict):
-                start = exp.get("startDate", "") or exp.get("dateRange", "")
-                if start and isinstance(start, str):
-                    for token in start.replace(",", " ").split():
-                        if token.isdigit() and 1970 <= int(token) <= 2030:
-                            years.append(int(token))
-        if years:
-            experience_years = datetime.now().year - min(years)
-    except Exception:
-        pass
-
-    return current_company, current_role, experience_years
-
-
-def _parse_apify_profile_item(item: dict) -> dict:
-    """
-    Parse a single Apify profile result into a standardised dict.
-    Handles multiple output schemas from different Apify actors.
-    """
-    bi = item.get("basic_info", {}) or {}
-
-    loc_raw = item.get("location") or bi.get("location") or ""
-    if isinstance(loc_raw, dict):
-        loc_str = loc_raw.get("city", "") or loc_raw.get("default", "") or loc_raw.get("country", "")
-    else:
-        loc_str = str(loc_raw)
-
-    profile = {
-        "linkedin_url": (
-            item.get("linkedinUrl") or item.get("url") or item.get("profileUrl")
-            or item.get("profile_url") or item.get("linkedInUrl")
-            or bi.get("profile_url") or bi.get("linkedinUrl") or ""
-        ),
-        "full_name": (
-            item.get("fullName")
-            or item.get("name")
-            or item.get("full_name")
-            or ((item.get("firstName", "") or "") + " " + (item.get("lastName", "") or "")).strip()
-            or bi.get("fullname") or bi.get("full_name") or "Unknown"
-        ),
-        "headline": (
-            item.get("headline") or item.get("jobTitle") or item.get("title")
-            or item.get("position") or bi.get("headline") or ""
-        ),
-        "location": loc_str,
-        "about": (
-            item.get("about") or item.get("summary") or item.get("description")
-            or bi.get("about") or ""
-        )[:500],
-        "followers": item.get("followersCount") or item.get("followers") or item.get("follower_count") or bi.get("follower_count") or 0,
-        "connections": item.get("connectionsCount") or item.get("connections") or item.get("connections_count") or bi.get("connections_count") or 0,
-        "current_company": item.get("companyName") or item.get("current_company") or item.get("jobCompanyName") or bi.get("current_company") or "",
-        "current_role": "",
-        "experience_years": 0,
-        "education": "",
-        "skills": item.get("skills", []) or [],
-        "profile_type": "individual",
-        "raw_experience": item.get("experience", []) or item.get("experiences", []) or [],
-        "raw_education": item.get("education", []) or item.get("educations", []) or [],
-        "enrichment_status": "enriched",
-    }
-
-    experience = profile["raw_experience"]
-    if experience and isinstance(experience, list) and len(experience) > 0:
-        current = experience[0] if isinstance(experience[0], dict) else {}
-        if not profile["current_company"]:
-            profile["current_company"] = (
-                current.get("companyName") or current.get("company")
-                or current.get("company_name") or ""
-            )
-        profile["current_role"] = (
-            current.get("title") or current.get("role")
-            or current.get("position") or ""
+def _render_metrics_panel(container, metrics: Metrics) -> None:
+    """Per-stage and per-provider tables plus credit totals, drawn from the run's metrics."""
+    with container.container():
+        credits = {p: metrics.total("credits", provider=p) for p in ("serpapi", "apify", "gemini")}
+        rejections = metrics.breakdown("filter_rejections", "reason")
+        st.caption(
+            f"Credits — SerpAPI {credits['serpapi']:g} · Apify {credits['apify']:g} · Gemini {credits['gemini']:g}"
+            + (" | Rejections — " + ", ".join(f"{k} {v:g}" for k, v in sorted(rejections.items())) if rejections else "")
         )
-
-    if profile["raw_experience"]:
-        _, _, exp_years = _parse_experience(profile["raw_experience"])
-        profile["experience_years"] = exp_years
-
-    if profile["raw_education"] and isinstance(profile["raw_education"], list):
-        for edu in profile["raw_education"]:
-            if isinstance(edu, dict):
-                school = edu.get("schoolName", "") or edu.get("school", "") or edu.get("school_name", "")
-                degree = edu.get("degreeName", "") or edu.get("degree", "") or edu.get("degree_name", "")
-                if school:
-                    profile["education"] = f"{degree} - {school}" if degree else school
-                    break
-
-    return profile
-
-
-APIFY_PROFILE_ACTORS = [
-    {
-        "id": "harvestapi/linkedin-profile-scraper",
-        "label": "HarvestAPI (4.8\u2605)",
-        "build_input": lambda urls: {
-            "profileScraperMode": "Profile details no email ($4 per 1k)",
-            "queries": urls,
-        },
-    },
-    {
-        "id": "apimaestro/linkedin-profile-detail",
-        "label": "APIMaestro",
-        "build_input": lambda urls: {
-            "profileUrls": urls,
-        },
-    },
-    {
-        "id": "supreme_coder/linkedin-profile-scraper",
-        "label": "SupremeCoder",
-        "build_input": lambda urls: {
-            "urls": [{"url": u} for u in urls],
-        },
-    },
-]
-
-
-def scrape_linkedin_profiles(
-    urls: list,
-    apify_manager: ApifyKeyManager,
-    status_container,
-) -> list:
-    """
-    Scrape LinkedIn profiles using multiple Apify actors with automatic fallback.
-    Tries actors in order: HarvestAPI > APIMaestro > SupremeCoder.
-    """
-    from apify_client import ApifyClient
-
-    enriched_profiles: list[dict] = []
-    batch_size = 20
-    working_actor_idx = st.session_state.get("_working_actor_idx", 0)
-
-    for i in range(0, len(urls), batch_size):
-        batch_urls = urls[i : i + batch_size]
-        current_key = apify_manager.get_current_key()
-
-        if not current_key:
-            status_container.warning("All Apify keys exhausted. Skipping remaining enrichment.")
-            break
-
-        status_container.write(
-            f"Scraping batch {i // batch_size + 1} ({len(batch_urls)} URLs) "
-            f"with key #{apify_manager.current_index + 1}"
-        )
-
-        batch_results = []
-        for actor_offset in range(len(APIFY_PROFILE_ACTORS)):
-            actor_idx = (working_actor_idx + actor_offset) % len(APIFY_PROFILE_ACTORS)
-            actor = APIFY_PROFILE_ACTORS[actor_idx]
-
-            try:
-                client = ApifyClient(current_key)
-                run_input = actor["build_input"](batch_urls)
-                status_container.write(f"   Trying: {actor['label']} ...")
-
-                run = client.actor(actor["id"]).call(
-                    run_input=run_input,
-                    timeout_secs=180,
-                )
-
-                if run:
-                    dataset_items = client.dataset(run["defaultDatasetId"]).list_items().items
-
-                    if dataset_items and len(dataset_items) > 0:
-                        for item in dataset_items:
-                            profile = _parse_apify_profile_item(item)
-                            if profile["full_name"] != "Unknown" or profile["headline"]:
-                                batch_results.append(profile)
-
-                        if batch_results:
-                            working_actor_idx = actor_idx
-                            st.session_state["_working_actor_idx"] = actor_idx
-                            status_container.write(
-                                f"   Got {len(batch_results)} enriched profiles via {actor['label']}"
-                            )
-                            break
-                        else:
-                            status_container.write(
-                                f"   {actor['label']} returned items but none usable. Trying next..."
-                            )
-                    else:
-                        status_container.write(
-                            f"   {actor['label']} returned 0 results. Trying next..."
-                        )
-
-            except Exception as e:
-                error_msg = str(e).lower()
-                # Rate-limit: wait and retry same actor (don't rotate key)
-                if any(kw in error_msg for kw in ["429", "rate limit", "too many requests", "rate-limit"]):
-                    status_container.write(f"   Rate limited on {actor['label']} — waiting 30s and retrying...")
-                    time.sleep(30)
-                    try:
-                        client = ApifyClient(current_key)
-                        run_input = actor["build_input"](batch_urls)
-                        run = client.actor(actor["id"]).call(run_input=run_input, timeout_secs=180)
-                        if run:
-                            dataset_items = client.dataset(run["defaultDatasetId"]).list_items().items
-                            if dataset_items:
-                                for item in dataset_items:
-                                    profile = _parse_apify_profile_item(item)
-                                    if profile["full_name"] != "Unknown" or profile["headline"]:
-                                        batch_results.append(profile)
-                                if batch_results:
-                                    working_actor_idx = actor_idx
-                                    st.session_state["_working_actor_idx"] = actor_idx
-                                    status_container.write(f"   Retry OK: {len(batch_results)} profiles via {actor['label']}")
-                                    break
-                    except Exception:
-                        status_container.write(f"   Retry also failed, trying next actor...")
-                    continue
-                elif _is_apify_quota_error(e):
-                    status_container.write(
-                        f"   Key #{apify_manager.current_index + 1} quota exhausted - rotating"
-                    )
-                    next_key = apify_manager.mark_exhausted()
-                    if next_key is None:
-                        status_container.write("   All Apify keys exhausted.")
-                        break
-                    current_key = next_key
-                    continue
-                elif "not found" in error_msg:
-                    status_container.write(f"   Actor {actor['label']} not found, trying next...")
-                    continue
-                else:
-                    status_container.write(f"   {actor['label']} error: {str(e)[:120]}")
-                    continue
-
-        enriched_profiles.extend(batch_results)
-        time.sleep(3)
-
-    return enriched_profiles
-
-
-def scrape_linkedin_companies(
-    urls: list[str],
-    apify_manager: ApifyKeyManager,
-    status_container,
-) -> list[dict]:
-    """
-    Scrape LinkedIn company pages via Apify.
-    Returns list of enriched company dicts.
-    """
-    from apify_client import ApifyClient
-
-    enriched: list[dict] = []
-    batch_size = 30
-
-    for batch_start in range(0, len(urls), batch_size):
-        batch_urls = urls[batch_start : batch_start + batch_size]
-        key = apify_manager.get_current_key()
-        if key is None:
-            status_container.write("⚠ï¸ All Apify keys exhausted — stopping company scraping.")
-            break
-
-        status_container.write(
-            f"🏢 Scraping companies batch {batch_start // batch_size + 1} "
-            f"({len(batch_urls)} URLs) with key #{apify_manager.current_index + 1}…"
-        )
-
-        try:
-            client = ApifyClient(key)
-            # dev_fusion company scraper (no cookies)
-            run = client.actor("dev_fusion/linkedin-company-scraper").call(
-                run_input={"companyUrls": batch_urls}
-            )
-            items = list(client.dataset(run["defaultDatasetId"]).iterate_items())
-
-            for item in items:
-                hq = item.get("headquarters", {})
-                if not isinstance(hq, dict):
-                    hq = {}
-
-                company = {
-                    "linkedin_url": item.get("url", ""),
-                    "full_name": item.get("name", ""),
-                    "company_name": item.get("name", ""),
-                    "headline": item.get("description", "")[:200] if item.get("description") else "",
-                    "about": (item.get("description", "") or "")[:500],
-                    "location": hq.get("city", "") or hq.get("geographicArea", ""),
-                    "industry": item.get("industry", ""),
-                    "company_size": item.get("employeeCount", "") or item.get("staffCount", ""),
-                    "website": item.get("website", ""),
-                    "founded": item.get("founded", ""),
-                    "specialties": item.get("specialties", []),
-                    "followers": item.get("followersCount", 0) or 0,
-                    "connections": 0,
-                    "current_company": item.get("name", ""),
-                    "current_role": "Company Page",
-                    "experience_years": 0,
-                    "education": "",
-                    "skills": [],
-                    "profile_type": "company",
-                    "raw_experience": [],
-                    "raw_education": [],
-                    "enrichment_status": "enriched",
-                }
-                enriched.append(company)
-
-            status_container.write(f"   ✅ Got {len(items)} enriched companies from this batch")
-
-        except Exception as e:
-            if _is_apify_quota_error(e):
-                status_container.write(
-                    f"⚠ï¸ Apify key #{apify_manager.current_index + 1} quota exhausted — rotating…"
-                )
-                next_key = apify_manager.mark_exhausted()
-                if next_key is None:
-                    status_container.write("⚠ï¸ All Apify keys exhausted.")
-                    break
-                continue
-            else:
-                status_container.write(f"⚠ï¸ Apify company scrape error: {e}")
-
-        time.sleep(3)
-
-    return enriched
+        budget_line = metrics_budget_line(metrics)
+        if budget_line:
+            st.caption(budget_line)
+        col_stages, col_providers = st.columns(2)
+        col_stages.dataframe(pd.DataFrame(metrics_stage_rows(metrics)), hide_index=True, use_container_width=True)
+        provider_rows = metrics_provider_rows(metrics)
+        if provider_rows:
+            col_providers.dataframe(pd.DataFrame(provider_rows), hide_index=True, use_container_width=True)
 
 
 # ──────────────────────────────────────────────
-# UNIFIED ENRICHMENT (Phase 2)
+# HELPER: background job manager
 # ──────────────────────────────────────────────
 
-def enrich_discovered_profiles(
-    discovered: list[dict],
-    apify_manager: ApifyKeyManager,
-    status_container,
-) -> list[dict]:
-    """
-    Enrich discovered profiles by scraping full data via Apify.
-    Falls back to SerpAPI-only data if all keys are exhausted.
-    """
-    if not apify_manager.has_keys() or apify_manager.is_exhausted():
-        status_container.write("No Apify keys available - returning SerpAPI-only data.")
-        for p in discovered:
-            p.setdefault("enrichment_status", "serpapi_only")
-            p.setdefault("full_name", p.get("name", ""))
-            p.setdefault("location", "")
-            p.setdefault("about", p.get("snippet", ""))
-            p.setdefault("followers", 0)
-            p.setdefault("connections", 0)
-            p.setdefault("current_company", p.get("organization", ""))
-            p.setdefault("current_role", p.get("headline", ""))
-            p.setdefault("experience_years", 0)
-            p.setdefault("education", "")
-            p.setdefault("skills", [])
-            p.setdefault("raw_experience", [])
-            p.setdefault("raw_education", [])
-        return discovered
-
-    # Separate individual vs company URLs
-    individual_urls = [p["url"] for p in discovered if p.get("profile_type") == "individual"]
-    company_urls = [p["url"] for p in discovered if p.get("profile_type") == "company"]
-
-    status_container.write(
-        f"Enrichment targets: {len(individual_urls)} individuals, {len(company_urls)} companies"
-    )
-
-    # Scrape
-    enriched_profiles = scrape_linkedin_profiles(individual_urls, apify_manager, status_container)
-    enriched_companies = scrape_linkedin_companies(company_urls, apify_manager, status_container)
-
-    # Helper to normalize LinkedIn URLs for matching
-    def _norm_url(url_str: str) -> str:
-        """Normalize a LinkedIn URL to just the username/slug for matching."""
-        url_str = (url_str or "").lower().strip().rstrip("/")
-        # Extract username from /in/username or /company/slug
-        m = re.search(r'linkedin\.com/in/([a-z0-9_-]+)', url_str)
-        if m:
-            return f"in/{m.group(1)}"
-        m = re.search(r'linkedin\.com/company/([a-z0-9_-]+)', url_str)
-        if m:
-            return f"company/{m.group(1)}"
-        return url_str
-
-    # Build normalized URL -> enriched data map
-    enriched_map: dict[str, dict] = {}
-    for ep in enriched_profiles + enriched_companies:
-        # Try multiple URL fields since different actors use different field names
-        ep_url = (
-            ep.get("linkedin_url", "")
-            or ep.get("linkedinUrl", "")
-            or ep.get("url", "")
-            or ep.get("profileUrl", "")
-            or ep.get("profile_url", "")
-            or ep.get("linkedInUrl", "")
-            or ""
-        )
-        norm = _norm_url(ep_url)
-        if norm:
-            enriched_map[norm] = ep
-
-    status_container.write(
-        f"Enrichment map built: {len(enriched_map)} profiles matched from scraping"
-    )
-
-    # Also map by publicIdentifier for actors that use it (e.g., HarvestAPI)
-    for ep in enriched_profiles + enriched_companies:
-        pub_id = ep.get("publicIdentifier", "") or ""
-        if pub_id and pub_id.strip():
-            key = f"in/{pub_id.strip().lower()}"
-            if key not in enriched_map:
-                enriched_map[key] = ep
-
-    # Debug: show sample URLs from both sides to diagnose matching issues
-    if enriched_profiles and not enriched_map:
-        # Enriched profiles exist but none mapped - log the raw URL fields
-        sample_ep = enriched_profiles[0]
-        status_container.write(
-            f"DEBUG: Sample enriched profile keys: {list(sample_ep.keys())[:15]}"
-        )
-        status_container.write(
-            f"DEBUG: Enriched URL fields -> "
-            f"linkedin_url='{sample_ep.get('linkedin_url', 'N/A')}' | "
-            f"url='{sample_ep.get('url', 'N/A')}' | "
-            f"profileUrl='{sample_ep.get('profileUrl', 'N/A')}' | "
-            f"profile_url='{sample_ep.get('profile_url', 'N/A')}'"
-        )
-    if enriched_map:
-        sample_keys = list(enriched_map.keys())[:3]
-        status_container.write(f"DEBUG: Enriched map sample keys: {sample_keys}")
-    if discovered:
-        sample_disc = [_norm_url(p["url"]) for p in discovered[:3]]
-        status_container.write(f"DEBUG: Discovered sample norm URLs: {sample_disc}")
-
-    # Merge enriched data back into discovered list
-    result: list[dict] = []
-    enriched_count = 0
-    for p in discovered:
-        norm_url = _norm_url(p["url"])
-        if norm_url in enriched_map:
-            ep = enriched_map[norm_url]
-            merged = {**p, **ep}
-            # Preserve the original url field name
-            merged["url"] = p["url"]
-            if not merged.get("full_name") or merged["full_name"] == "Unknown":
-                merged["full_name"] = p.get("name", "")
-            merged["enrichment_status"] = "enriched"
-            result.append(merged)
-            enriched_count += 1
-        else:
-            # Fallback to SerpAPI-only data
-            p["enrichment_status"] = "serpapi_only"
-            p.setdefault("full_name", p.get("name", ""))
-            p.setdefault("location", "")
-            p.setdefault("about", p.get("snippet", ""))
-            p.setdefault("followers", 0)
-            p.setdefault("connections", 0)
-            p.setdefault("current_company", p.get("organization", ""))
-            p.setdefault("current_role", p.get("headline", ""))
-            p.setdefault("experience_years", 0)
-            p.setdefault("education", "")
-            p.setdefault("skills", [])
-            p.setdefault("raw_experience", [])
-            p.setdefault("raw_education", [])
-            result.append(p)
-
-    serpapi_only = len(result) - enriched_count
-    status_container.write(
-        f"Enrichment done: {enriched_count} enriched, {serpapi_only} SerpAPI-only"
-    )
-
-    return result
+JOB_POLL_SECS = 2      # progress refresh interval while a job runs
+JOB_LOG_TAIL = 40      # status lines shown per job
 
 
+@st.cache_resource
+def _get_job_manager() -> JobManager:
+    """One job manager per server process, shared by every session and rerun."""
+    return get_job_manager()
 
-# ──────────────────────────────────────────────
-
-def is_complete_profile(profile: dict) -> tuple[bool, str]:
-    """
-    Reject profiles that are too sparse to be useful.
-    Must have at least: name AND (headline OR current_role).
-    SerpAPI-only profiles need education keyword in snippet.
-    """
-    name = (profile.get("full_name") or profile.get("name") or "").strip()
-    if not name:
-        return False, "Missing name"
-
-    headline = (profile.get("headline") or "").strip()
-    current_role = (profile.get("current_role") or "").strip()
-
-    if not headline and not current_role:
-        return False, "Missing both headline and role"
-
-    # SerpAPI-only profiles need extra check
-    if profile.get("enrichment_status") == "serpapi_only":
-        snippet = (profile.get("snippet") or "").lower()
-        combined = f"{name} {headline} {current_role} {snippet}".lower()
-        has_edu = any(kw in combined for kw in EDUCATION_KEYWORDS)
-        if not has_edu:
-            return False, "SerpAPI-only profile with no education signal"
-
-    return True, "Complete"
-
-
-def is_blacklisted_brand(profile: dict) -> tuple[bool, str]:
-    """
-    Check if profile belongs to a blacklisted brand (Big EdTech / Big Corp).
-    Returns (True, reason) if blacklisted — i.e. should be REJECTED.
-    """
-    name = (profile.get("full_name") or profile.get("name") or "").lower()
-    headline = (profile.get("headline") or "").lower()
-    company = (profile.get("current_company") or profile.get("organization") or "").lower()
-    company_name = (profile.get("company_name") or "").lower()
-
-    text_to_check = f"{name} ||| {headline} ||| {company} ||| {company_name}"
-
-    for brand in BRAND_BLACKLIST:
-        if brand.lower() in text_to_check:
-            return True, f"Blacklisted brand: {brand}"
-
-    return False, "Not blacklisted"
-
-
-def is_india_based(profile: dict) -> tuple[bool, str]:
-    """
-    Check if profile is India-based.
-    If location is empty, check headline + about for India indicators.
-    If still unclear → PASS (benefit of doubt).
-    """
-    location = (profile.get("location") or "").lower()
-
-    # Check location field first
-    if location:
-        for indicator in INDIA_INDICATORS:
-            if indicator in location:
-                return True, f"India location: {location}"
-        # Location is present but doesn't match India
-        return False, f"Non-India location: {location}"
-
-    # Location missing — check headline + about for India clues
-    headline = (profile.get("headline") or "").lower()
-    about = (profile.get("about") or profile.get("snippet") or "").lower()
-    combined = f"{headline} {about}"
-
-    for indicator in INDIA_INDICATORS:
-        if indicator in combined:
-            return True, f"India indicator in text: {indicator}"
-
-    # No location data, no India clues — benefit of doubt
-    return True, "Location unknown — passing (benefit of doubt)"
-
-
-def is_connection_in_range(profile: dict) -> tuple[bool, str]:
-    """
-    Check if connections/followers are within acceptable range.
-    Zero or missing values → PASS (benefit of doubt).
-    """
-    profile_type = profile.get("profile_type", "individual")
-    connections = profile.get("connections", 0) or 0
-    followers = profile.get("followers", 0) or 0
-
-    if profile_type == "company":
-        # Company pages use followers
-        if followers == 0:
-            return True, "Company followers unknown — passing"
-        if followers < MIN_COMPANY_FOLLOWERS:
-            return False, f"Too few company followers: {followers} (min {MIN_COMPANY_FOLLOWERS})"
-        if followers > MAX_COMPANY_FOLLOWERS:
-            return False, f"Too many company followers: {followers} (max {MAX_COMPANY_FOLLOWERS})"
-        return True, f"Company followers OK: {followers}"
-    else:
-        # Individual profiles use connections
-        if connections == 0:
-            return True, "Connections unknown — passing"
-        if connections < MIN_CONNECTIONS:
-            return False, f"Too few connections: {connections} (min {MIN_CONNECTIONS})"
-        if connections > MAX_CONNECTIONS:
-            return False, f"Too many connections: {connections} (max {MAX_CONNECTIONS})"
-        return True, f"Connections OK: {connections}"
-
-
-def is_education_relevant(profile: dict) -> tuple[bool, str]:
-    """
-    Check if the profile is education-relevant.
-    Combines headline + about + current_role + current_company + skills.
-    Founder/CEO/Director profiles need additional education context.
-    """
-    headline = (profile.get("headline") or "").lower()
-    about = (profile.get("about") or profile.get("snippet") or "").lower()
-    role = (profile.get("current_role") or "").lower()
-    company = (profile.get("current_company") or profile.get("organization") or "").lower()
-    skills = " ".join(s.lower() if isinstance(s, str) else "" for s in (profile.get("skills") or []))
-
-    combined = f"{headline} {about} {role} {company} {skills}"
-
-    # If combined text is basically empty, pass (benefit of doubt)
-    if len(combined.strip()) < 5:
-        return True, "Insufficient text to evaluate — passing"
-
-    # Check for education keywords
-    edu_matches = [kw for kw in EDUCATION_KEYWORDS if kw in combined]
-    non_edu_matches = [kw for kw in NON_EDUCATION_KEYWORDS if kw in combined]
-
-    # Leadership roles that need education context
-    leadership_keywords = ['founder', 'ceo', 'coo', 'managing director', 'director']
-    is_leadership = any(lk in combined for lk in leadership_keywords)
-
-    if not edu_matches:
-        return False, f"No education keywords found"
-
-    if non_edu_matches and not any(
-        kw for kw in edu_matches if kw not in leadership_keywords
-    ):
-        # Only leadership keywords matched + non-education keywords present
-        return False, f"Leadership role without education context (non-edu: {', '.join(non_edu_matches[:3])})"
-
-    if is_leadership:
-        # Leadership profiles need at least one non-leadership education keyword
-        edu_context_keywords = [
-            'school', 'academy', 'institute', 'college', 'university',
-            'coaching', 'classes', 'education', 'edtech', 'teaching',
-            'cbse', 'icse', 'igcse', 'ib', 'neet', 'jee', 'tuition',
-            'curriculum', 'pedagogy', 'learning', 'training'
-        ]
-        has_context = any(ck in combined for ck in edu_context_keywords)
-        if not has_context:
-            return False, "Leadership role without education context"
-
-    return True, f"Education relevant ({', '.join(edu_matches[:3])})"
-
-
-def apply_hard_filters(
-    profiles: list[dict], status_container
-) -> tuple[list[dict], dict]:
-    """
-    Apply hard filters in order (cheapest first):
-    1. Completeness  2. Brand blacklist  3. Location  4. Connections  5. Education relevance
-    Returns (filtered_profiles, rejection_stats).
-    """
-    stats = {
-        "input": len(profiles),
-        "incomplete": 0,
-        "blacklisted": 0,
-        "non_india": 0,
-        "connection_range": 0,
-        "non_education": 0,
-        "passed": 0,
-    }
-    passed: list[dict] = []
-
-    for p in profiles:
-        # 1. Completeness
-        ok, reason = is_complete_profile(p)
-        if not ok:
-            stats["incomplete"] += 1
-            continue
-
-        # 2. Brand blacklist
-        blacklisted, reason = is_blacklisted_brand(p)
-        if blacklisted:
-            stats["blacklisted"] += 1
-            continue
-
-        # 3. Location (India-based)
-        india, reason = is_india_based(p)
-        if not india:
-            stats["non_india"] += 1
-            continue
-
-        # 4. Connection / follower range
-        in_range, reason = is_connection_in_range(p)
-        if not in_range:
-            stats["connection_range"] += 1
-            continue
-
-        # 5. Education relevance
-        edu_ok, reason = is_education_relevant(p)
-        if not edu_ok:
-            stats["non_education"] += 1
-            continue
-
-        passed.append(p)
-
-    stats["passed"] = len(passed)
-    rejected = stats["input"] - stats["passed"]
-
-    status_container.write(
-        f"🔍 **Hard Filters Applied:**\n"
-        f"   Input: {stats['input']} | ✅ Passed: {stats['passed']} | ❌ Rejected: {rejected}"
-    )
-    status_container.write(
-        f"   📋 Rejections: "
-        f"Incomplete: {stats['incomplete']} | "
-        f"Blacklisted: {stats['blacklisted']} | "
-        f"Non-India: {stats['non_india']} | "
-        f"Connection range: {stats['connection_range']} | "
-        f"Non-education: {stats['non_education']}"
-    )
-
-    return passed, stats
-
-
-# ──────────────────────────────────────────────────────────────────────────────
-# PHASE 4: GEMINI AI CLASSIFICATION
-# ──────────────────────────────────────────────────────────────────────────────
-
-def fallback_classify(profile: dict) -> dict:
-    """Keyword-based classification when Gemini is unavailable."""
-    headline = (profile.get("headline", "") or "").lower()
-    company = (profile.get("current_company", "") or "").lower()
-    
-    # Check for institute keywords
-    if any(kw.lower() in company for kw in INSTITUTE_KEYWORDS):
-        return {
-            "persona_type": "Coaching Institute Owner",
-            "is_relevant": True,
-            "reason": "Institute keyword match"
-        }
-    
-    # Check for school roles
-    if any(role in headline for role in ["principal", "vice principal", "headmaster", "director"]):
-        return {
-            "persona_type": "Institute Leader",
-            "is_relevant": True,
-            "reason": "School leadership role match"
-        }
-    
-    # Check for founder/CEO
-    if any(role in headline for role in ["founder", "ceo", "co-founder"]):
-        if any(kw in headline + company for kw in ["education", "edtech", "learn", "school", "academy"]):
-            return {
-                "persona_type": "EdTech Decision-Maker",
-                "is_relevant": True,
-                "reason": "EdTech founder match"
-            }
-    
-    # Default
-    return {
-        "persona_type": "Individual Tutor",
-        "is_relevant": True,
-        "reason": "Fallback default"
-    }
-
-def classify_linkedin_profile(profile: dict, api_key: str) -> dict:
-    """Classify profile using Gemini AI."""
-    if not api_key:
-        return fallback_classify(profile)
-
-    try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.0-flash')
-
-        prompt = f"""Analyze this LinkedIn profile for an education platform collaboration. Return ONLY valid JSON.
-
-        Profile Data:
-        - Name: {profile.get('full_name', '')}
-        - Headline: {profile.get('headline', '')}
-        - Location: {profile.get('location', '')}
-        - About: {profile.get('about', '')[:500]}
-        - Current Company: {profile.get('current_company', '')}
-        - Current Role: {profile.get('current_role', '')}
-        - Experience: {str(profile.get('raw_experience', []))[:500]}
-        - Education: {str(profile.get('raw_education', []))[:300]}
-        - Skills: {str(profile.get('skills', []))[:200]}
-
-        Classify into ONE persona type:
-        - "Individual Tutor": Single teacher/tutor
-        - "Institute Leader": Principal, VP, Director of school/coaching
-        - "EdTech Decision-Maker": Founder/CEO/COO of edtech
-        - "School Administrator": HOD, Academic Head, Coordinator
-        - "Coaching Institute Owner": Owner of coaching center
-        - "Irrelevant": Not education related or Big Corp employee
-
-        Also detect:
-        - subjects: [Mathematics, Physics, Chemistry, Biology, English, etc]
-        - grades: [6,7,8,9,10,11,12]
-        - boards: [CBSE, ICSE, IB, IGCSE, Cambridge]
-        - seniority: "Owner/Founder", "C-Level", "Director", "Principal", "HOD", "Teacher"
-        - collaboration_potential: "High" (decision-maker), "Medium", "Low"
-
-        Return ONLY JSON:
-        {{"persona_type": "...", "subjects": [...], "grades": [...], "boards": [...], "seniority": "...", "collaboration_potential": "...", "is_relevant": true, "reason": "..."}}
-        """
-
-        response = model.generate_content(prompt)
-        text = response.text.strip()
-        # Clean markdown if present
-        if text.startswith("```json"):
-            text = text[7:]
-        if text.endswith("```"):
-            text = text[:-3]
-        
-        return json.loads(text)
-
-    except Exception as e:
-        return fallback_classify(profile)
-
-# ──────────────────────────────────────────────────────────────────────────────
-# PHASE 5: CONTACT EXTRACTION + TIER SCORING
-# ──────────────────────────────────────────────────────────────────────────────
-
-def extract_linkedin_contacts(profile: dict) -> dict:
-    """Extract email, phone, and social links from text fields."""
-    text_blob = (
-        f"{profile.get('about', '')} {profile.get('headline', '')} "
-        f"{profile.get('website', '')}"
-    ).lower()
-
-    contacts = {
-        "email": "", "phone": "", "website": "", "twitter": "",
-        "facebook": "", "instagram": "", "youtube": "", "whatsapp": ""
-    }
-
-    # Email
-    email_match = re.search(r'[\w\.-]+@[\w\.-]+\.\w+', text_blob)
-    if email_match:
-        contacts["email"] = email_match.group(0)
-
-    # Phone (Indian format mostly)
-    phone_match = re.search(r'(?:\+91[\s-]?)?(?:0)?[6-9]\d{9}', text_blob)
-    if phone_match:
-        contacts["phone"] = phone_match.group(0)
-    
-    # Socials
-    if "wa.me" in text_blob or "chat.whatsapp" in text_blob:
-        contacts["whatsapp"] = "Yes"
-    if "instagram.com" in text_blob:
-        contacts["instagram"] = "Yes"
-    if "youtube.com" in text_blob or "youtu.be" in text_blob:
-        contacts["youtube"] = "Yes"
-    
-    # External Website from Apify
-    if profile.get("website"):
-        contacts["website"] = profile.get("website")
-
-    return contacts
-
-def calculate_contact_confidence(contacts: dict) -> str:
-    if contacts["email"] and contacts["phone"]: return "High"
-    if contacts["email"] or contacts["phone"]: return "Medium"
-    if contacts["website"] or contacts["whatsapp"]: return "Medium-Low"
-    return "LinkedIn Only"
-
-def calculate_linkedin_tier(profile: dict, contacts: dict, classification: dict) -> str:
-    """
-    Tier A: Decision Maker + High Potential + Contact Info
-    Tier B: Relevant + Senior Role + Contact Info
-    Tier C: Relevant + LinkedIn Only
-    Tier D: Low priority
-    """
-    persona = classification.get("persona_type", "")
-    seniority = classification.get("seniority", "")
-    is_relevant = classification.get("is_relevant", True)
-    has_contact = bool(contacts["email"] or contacts["phone"] or contacts["website"])
-    
-    if not is_relevant:
-        return "D"
-
-    # Tier A: Decision Makers with Contact
-    if has_contact and (
-        "Founder" in seniority or "Owner" in seniority or 
-        "Principal" in seniority or "Director" in seniority or "C-Level" in seniority
-    ):
-        return "A"
-    
-    # Tier B: HODs/Teachers with Contact OR Decision Makers without contact
-    if has_contact or "Founder" in seniority or "Principal" in seniority:
-        return "B"
-        
-    # Tier C: Teachers/Tutors (LinkedIn reachout)
-    if persona in ["Individual Tutor", "Teacher"]:
-        return "C"
-        
-    return "D"
-
-def generate_linkedin_fit_summary(profile: dict, api_key: str) -> str:
-    """Generate 2-sentence fit summary for Tier A/B."""
-    if not api_key: return "Fit summary unavailable (no key)."
-    try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        prompt = f"""Write a 2-sentence summary of why this LinkedIn professional is a good B2B lead for an online tutoring platform.
-        Profile: {profile.get('full_name')} | {profile.get('headline')} | {profile.get('persona_type')}
-        Return ONLY the summary."""
-        response = model.generate_content(prompt)
-        return response.text.strip()
-    except:
-        return f"{profile.get('persona_type')} based in {profile.get('location')}."
-
-# ──────────────────────────────────────────────────────────────────────────────
-# PHASE 6: DEEP FILTERING ORCHESTRATOR
-# ──────────────────────────────────────────────────────────────────────────────
-
-def smart_fetch_linkedin_profiles(
-    subject, roles, cities, target_count,
-    serpapi_key, apify_manager, google_api_key,
-    status_container, existing_urls
-) -> list:
-    
-    approved_leads = []
-    seen_urls = existing_urls.copy() if existing_urls else set()
-    
-    # Counters
-    gemini_calls = 0
-    serpapi_calls = 0
-    search_round = 0
-    max_rounds = 15
-    consecutive_empty = 0
-    
-    while len(approved_leads) < target_count and search_round < max_rounds:
-        search_round += 1
-        
-        # 1. DISCOVERY
-        # ------------------------------------------------------------------
-        if consecutive_empty >= 4:
-            status_container.warning("⚠️ Stopping: No new profiles found in last 4 rounds.")
-            break
-            
-        discovered = discover_via_serpapi(
-            subject, roles, cities, serpapi_key, status_container, round_num=search_round-1
-        )
-        serpapi_calls += 5
-        
-        # Dedup
-        new_profiles = [p for p in discovered if p["url"].lower().rstrip("/") not in seen_urls]
-        if not new_profiles:
-            consecutive_empty += 1
-            status_container.write(f"   Round {search_round}: All duplicates. Retrying...")
-            continue
-        consecutive_empty = 0
-        
-        # Add to seen
-        for p in new_profiles:
-            seen_urls.add(p["url"].lower().rstrip("/"))
-
-        # 2. ENRICHMENT (Batch logic)
-        # ------------------------------------------------------------------
-        needed = target_count - len(approved_leads)
-        batch_size = min(needed * 2, 40, len(new_profiles))
-        batch_to_enrich = new_profiles[:batch_size]
-        
-        enriched = enrich_discovered_profiles(batch_to_enrich, apify_manager, status_container)
-        
-        # 3. HARD FILTERS
-        # ------------------------------------------------------------------
-        filtered, _ = apply_hard_filters(enriched, status_container)
-        
-        # 4. CLASSIFICATION & SCORING
-        # ------------------------------------------------------------------
-        for profile in filtered:
-            if len(approved_leads) >= target_count: break
-            if gemini_calls >= MAX_GEMINI_CALLS: break
-            
-            # AI Classify
-            classification = classify_linkedin_profile(profile, google_api_key)
-            gemini_calls += 1
-            time.sleep(4)  # Gemini free tier: ~15 req/min
-            
-            # Merge classification data
-            profile.update(classification)
-            
-            # Check relevance from AI
-            if not profile.get("is_relevant", True):
-                continue
-                
-            # Extract Contact
-            contacts = extract_linkedin_contacts(profile)
-            profile.update(contacts)
-            profile["contact_confidence"] = calculate_contact_confidence(contacts)
-            
-            # Tier Scoring
-            profile["tier"] = calculate_linkedin_tier(profile, contacts, classification)
-            
-            # Strings for display
-            profile["subjects_str"] = ", ".join(profile.get("subjects", []))
-            
-            # AI Summary (Only for high value to save credits)
-            if profile["tier"] in ["A", "B"] and gemini_calls < MAX_GEMINI_CALLS:
-                profile["ai_summary"] = generate_linkedin_fit_summary(profile, google_api_key)
-                gemini_calls += 1
-                time.sleep(4)  # Gemini free tier: ~15 req/min
-            else:
-                profile["ai_summary"] = f"{profile.get('headline', '')}"
-                
-            approved_leads.append(profile)
-            status_container.write(f"   ✨ Approved: {profile['full_name']} ({profile['persona_type']}) - Tier {profile['tier']}")
-            
-        status_container.write(f"📊 **Progress:** {len(approved_leads)} / {target_count} leads found")
-        time.sleep(1)
-        
-    return approved_leads
 
+job_manager = _get_job_manager()
 
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -1506,6 +169,25 @@ with st.sidebar:
     )
     if apify_count:
         st.caption(f"🔄 {apify_manager.get_status()}")
+        for key in apify_manager.utilization():
+            if key["status"] == "exhausted":
+                retry = datetime.fromtimestamp(key["retry_at"]).strftime("%d %b %H:%M") if key["retry_at"] else "soon"
+                st.caption(f"🔑 {key['key']}: exhausted — re-probed {retry}")
+            else:
+                st.caption(f"🔑 {key['key']}: ~${key['headroom_usd']:.2f} left ({key['source']})")
+    actor_health = get_actor_health()
+    if apify_count and actor_health:
+        for health in actor_health.stats():
+            if not health["runs"]:
+                st.caption(f"🎭 {health['label']}: untried")
+                continue
+            latency = health["p50_secs"]
+            st.caption(
+                f"🎭 {health['label']}: {health['success_rate']:.0%} ok"
+                + (f", p50 {latency:.0f}s / p95 {health['p95_secs']:.0f}s" if latency is not None else "")
+                + f", ${health['cost_per_usable'] * 1000:.2f} per 1k usable"
+                + ("" if health["circuit"] == "closed" else f" — circuit {health['circuit']}")
+            )
 
     # ── Active filters display ──
     st.markdown("---")
@@ -1514,25 +196,89 @@ with st.sidebar:
 **Region:** India 🇮🇳  
 **Blacklist:** Big EdTech + Big Corp  
 **Max SerpAPI Queries:** {MAX_SERPAPI_QUERIES}  
+**Max Apify Scrapes:** {MAX_APIFY_SCRAPES}  
 **Max Gemini Calls:** {MAX_GEMINI_CALLS}
     """)
 
     # ── Deduplication uploader ──
     st.markdown("---")
     st.subheader("📂 Deduplication")
-    master_csv = st.file_uploader("Upload Master Lead CSV", type=["csv"])
-    if master_csv is not None:
-        urls, names, count, err = load_existing_linkedin_leads(master_csv)
+    lead_store = get_lead_store()
+    master_csv = st.file_uploader("Import Master Lead CSV / Parquet (one-time)", type=["csv", "gz", "parquet"])
+    upload_id = getattr(master_csv, "file_id", None) or getattr(master_csv, "name", None)
+    if master_csv is not None and st.session_state.get("_imported_master") != upload_id:
+        imported: list[int] = []
+        urls, names, count, err = load_existing_linkedin_leads(
+            master_csv, on_url_chunk=lambda keys: imported.append(lead_store.import_urls(keys))
+        )
         if err:
             st.warning(err)
         else:
-            st.success(f"Loaded {count} existing leads for dedup")
-        st.session_state["existing_urls"] = urls
+            st.success(f"Imported {sum(imported)} new of {count} existing leads into the lead store")
         st.session_state["existing_names"] = names
+        st.session_state["_imported_master"] = upload_id
+    lead_counts = lead_store.counts()
+    st.caption(
+        f"🗄️ Lead store: {sum(lead_counts.values())} known profiles "
+        f"({lead_counts.get('approved', 0)} approved, {lead_counts.get('rejected', 0)} rejected)"
+    )
+
+    # ── Local classifier ──
+    st.markdown("---")
+    st.subheader("🧠 Local Classifier")
+    local_models = list_local_models()
+    if local_models:
+        latest = local_models[-1]
+        m = latest["metrics"]
+        st.caption(
+            f"v{latest['version']} ({'deployed' if latest.get('deployable') else 'not deployed'}) — "
+            f"{latest['n_train']} train / {latest['n_holdout']} held-out labels, "
+            f"{m['coverage']:.0%} confident at {m['confident_accuracy']:.0%} accuracy"
+        )
+    else:
+        st.caption("No model trained yet.")
+    if st.button("Train from Gemini labels"):
+        classification_cache = get_classification_cache()
+        examples = classification_cache.labeled_examples() if classification_cache else []
+        with st.spinner(f"Training on {len(examples)} labels…"):
+            model = train_local_classifier(examples)
+        if model is None:
+            st.warning(f"Need at least {LOCAL_MODEL_MIN_EXAMPLES} Gemini labels (have {len(examples)}).")
+        else:
+            m = model.meta["metrics"]
+            st.success(
+                f"Trained v{model.version}: held-out accuracy {m['overall_accuracy']:.0%}, "
+                f"{m['coverage']:.0%} confident at {m['confident_accuracy']:.0%}"
+                + ("" if model.meta["deployable"] else " — below the deploy bar, Gemini stays in charge")
+            )
+
+    # ── Background jobs ──
+    st.markdown("---")
+    st.subheader("🗂️ Runs")
+    for campaign in job_manager.campaigns()[:3]:
+        snap = campaign.snapshot()
+        if st.button(
+            f"📦 Campaign of {len(snap['jobs'])} — {snap['status']} ({snap['approved']}/{snap['target_count']})",
+            key=f"campaign_{campaign.id}", use_container_width=True,
+        ):
+            st.session_state["active_campaign"] = campaign.id
+            st.session_state.pop("active_job", None)
+            st.query_params.clear()
+            st.query_params["campaign"] = campaign.id
+    recent_jobs = job_manager.jobs()
+    if recent_jobs:
+        for job in recent_jobs[:8]:
+            snap = job.snapshot()
+            if st.button(
+                f"{snap['subject'][:28]} — {snap['status']} ({snap['approved']}/{snap['target_count']})",
+                key=f"job_{job.id}", use_container_width=True,
+            ):
+                st.session_state["active_job"] = job.id
+                st.session_state.pop("active_campaign", None)
+                st.query_params.clear()
+                st.query_params["job"] = job.id
     else:
-        if "existing_urls" not in st.session_state:
-            st.session_state["existing_urls"] = set()
-            st.session_state["existing_names"] = set()
+        st.caption("No runs yet.")
 
     # ── Phase info ──
     st.markdown("---")
@@ -1599,6 +345,19 @@ with col_city:
 # SEARCH BUTTON
 # ──────────────────────────────────────────────
 
+checkpoint_store = get_checkpoint_store()
+saved_run = checkpoint_store.load(
+    run_fingerprint(subject, selected_roles, selected_cities, target_count)
+) if checkpoint_store is not None and subject.strip() else None
+resume_run = True
+if saved_run:
+    resume_run = st.checkbox(
+        f"♻️ Resume the interrupted run for this search (round {saved_run.get('round', 0)}, "
+        f"{len(saved_run.get('approved', []))} leads already approved, "
+        f"saved {datetime.fromtimestamp(saved_run['saved_at']):%d %b %H:%M})",
+        value=True,
+    )
+
 search_clicked = st.button("🚀 Discover LinkedIn Profiles", type="primary", use_container_width=True)
 
 if search_clicked:
@@ -1610,23 +369,181 @@ if search_clicked:
         st.error("⚠️ Please provide your SerpAPI key.")
         st.stop()
 
-    existing_urls = st.session_state.get("existing_urls", set())
-    
-    # Run the Smart Loop
-    with st.status("🚀 TuTrain Agent Active...", expanded=True) as status_box:
-        results = smart_fetch_linkedin_profiles(
-            subject, selected_roles, selected_cities, target_count,
-            serpapi_key, apify_manager, google_api_key,
-            status_box, existing_urls
-        )
-        
-        if results:
-            status_box.update(label=f"✅ Mission Complete! Found {len(results)} leads.", state="complete")
+    # Run the Smart Loop as a background job; this script run returns right away
+    job_id = job_manager.submit(
+        subject, selected_roles, selected_cities, target_count,
+        serpapi_key, apify_manager, google_api_key,
+        lead_store=lead_store, resume=resume_run,
+    )
+    st.session_state["active_job"] = job_id
+    st.session_state.pop("active_campaign", None)
+    st.query_params.clear()
+    st.query_params["job"] = job_id
+
+
+# ──────────────────────────────────────────────
+# CAMPAIGN — several searches at once, one shared budget
+# ──────────────────────────────────────────────
+
+with st.expander("📦 Campaign — run several searches at once"):
+    st.caption(
+        "Searches run concurrently, share the lead store (a profile found by two searches is "
+        "enriched and classified once) and draw on one credit budget. Role and city filters above apply to all."
+    )
+    campaign_plan = st.data_editor(
+        pd.DataFrame({
+            "run": True,
+            "subject": [v for v in SEARCH_PRESETS.values() if v],
+            "target": target_count,
+        }),
+        hide_index=True, num_rows="dynamic", use_container_width=True, key="campaign_plan",
+        column_config={"target": st.column_config.NumberColumn(min_value=1, max_value=500, step=5)},
+    )
+    col_serp, col_apify, col_gemini, col_usd = st.columns(4)
+    campaign_limits = {
+        "serpapi": col_serp.number_input("SerpAPI searches", 1, 10_000, CAMPAIGN_BUDGET["serpapi"]),
+        "apify": col_apify.number_input("Apify profiles", 1, 100_000, CAMPAIGN_BUDGET["apify"]),
+        "gemini": col_gemini.number_input("Gemini requests", 1, 100_000, CAMPAIGN_BUDGET["gemini"]),
+        "usd": col_usd.number_input("Total USD", 0.5, 10_000.0, float(CAMPAIGN_BUDGET["usd"]), step=1.0),
+    }
+    if st.button("📦 Start campaign", use_container_width=True):
+        searches = [
+            (str(row["subject"]).strip(), int(row["target"]))
+            for _, row in campaign_plan.iterrows()
+            if row["run"] and str(row["subject"] or "").strip() and row["target"] and row["target"] > 0
+        ]
+        if not searches:
+            st.error("⚠️ Tick at least one search with a subject and a target.")
+        elif not serpapi_key:
+            st.error("⚠️ Please provide your SerpAPI key.")
+        else:
+            campaign_id = job_manager.submit_campaign(
+                searches, selected_roles, selected_cities,
+                serpapi_key, apify_manager, google_api_key,
+                limits=campaign_limits, lead_store=lead_store,
+            )
+            st.session_state["active_campaign"] = campaign_id
+            st.session_state.pop("active_job", None)
+            st.query_params.clear()
+            st.query_params["campaign"] = campaign_id
+
+
+# ──────────────────────────────────────────────
+# JOB PROGRESS — polled without blocking the script
+# ──────────────────────────────────────────────
+
+JOB_STATUS_LABELS = {
+    "queued": ("⏳ Queued — waiting for a free run slot...", "running"),
+    "running": ("🚀 TuTrain Agent Active...", "running"),
+    "done": ("✅ Mission Complete! Found {approved} leads.", "complete"),
+    "cancelled": ("⏹ Cancelled — kept {approved} leads.", "error"),
+    "failed": ("❌ Run failed: {error}", "error"),
+}
+
+
+def _job_progress(job_id: str) -> None:
+    """Status log, live metrics and leads so far for one job; hands results to the dashboard when done."""
+    job = job_manager.get(job_id)
+    if job is None:
+        st.warning("That job is no longer available (the server may have restarted).")
+        return
+    snap = job.snapshot()
+    label, state = JOB_STATUS_LABELS[snap["status"]]
+    if snap["status"] == "done" and not snap["approved"]:
+        label, state = "❌ No leads found matching criteria.", "error"
+    with st.status(label.format(**snap), state=state, expanded=job.is_active):
+        lines, _ = job.messages()
+        for kind, msg in lines[-JOB_LOG_TAIL:]:
+            getattr(st, kind)(msg)
+
+    if job.is_active:
+        _render_metrics_panel(st, job.metrics)
+        leads = job.leads()
+        st.caption(f"📊 {len(leads)} / {snap['target_count']} leads approved so far — job `{job_id}`")
+        if leads:
+            st.dataframe(
+                pd.DataFrame(leads[-10:])[["full_name", "persona_type", "tier", "current_company"]],
+                hide_index=True, use_container_width=True,
+            )
+        st.button("⏹ Cancel run", key=f"cancel_{job_id}", on_click=job_manager.cancel, args=(job_id,))
+    elif st.session_state.get("results_job") != job_id:
+        st.session_state["results"] = job.leads()
+        st.session_state["run_metrics"] = job.metrics
+        st.session_state["results_job"] = job_id
+        st.rerun()
+
+
+def _campaign_progress(campaign_id: str) -> None:
+    """Per-search status and shared budget for one campaign; hands the combined leads to the dashboard when done."""
+    campaign = job_manager.get_campaign(campaign_id)
+    if campaign is None:
+        st.warning("That campaign is no longer available (the server may have restarted).")
+        return
+    snap = campaign.snapshot()
+    st.subheader(f"📦 Campaign — {snap['status']} ({snap['approved']}/{snap['target_count']} leads)")
+    st.dataframe(
+        pd.DataFrame([
+            {"subject": j["subject"], "status": j["status"], "approved": j["approved"], "target": j["target_count"]}
+            for j in snap["jobs"]
+        ]),
+        hide_index=True, use_container_width=True,
+    )
+    for provider, b in snap["budget"].items():
+        if provider == "usd":
+            text = f"USD: ~${b['used']:.2f} spent, projected ~${b['projected']:.2f}"
+            text += f" of ${b['limit']:.2f}" if b["limit"] else ""
         else:
-            status_box.update(label="❌ No leads found matching criteria.", state="error")
+            text = f"{provider}: {b['used']:g} / {b['limit']:g} credits"
+        st.progress(min(b["used"] / b["limit"], 1.0) if b["limit"] else 0.0, text=text)
+
+    if campaign.is_active:
+        st.button(
+            "⏹ Cancel campaign", key=f"cancel_campaign_{campaign_id}",
+            on_click=job_manager.cancel_campaign, args=(campaign_id,),
+        )
+    elif st.session_state.get("results_job") != campaign_id:
+        st.session_state["results"] = campaign.leads()
+        st.session_state.pop("run_metrics", None)
+        st.session_state["results_job"] = campaign_id
+        st.rerun()
+
+
+active_campaign_id = st.session_state.get("active_campaign") or st.query_params.get("campaign")
+if active_campaign_id:
+    st.session_state["active_campaign"] = active_campaign_id
+    active_campaign = job_manager.get_campaign(active_campaign_id)
+    poll_every = JOB_POLL_SECS if active_campaign is not None and active_campaign.is_active else None
+    st.fragment(run_every=poll_every)(_campaign_progress)(active_campaign_id)
+
+active_job_id = None if active_campaign_id else st.session_state.get("active_job") or st.query_params.get("job")
+active_job = job_manager.get(active_job_id) if active_job_id else None
+if active_job_id:
+    st.session_state["active_job"] = active_job_id
+    # Poll only while the job is still going; a finished job renders once
+    poll_every = JOB_POLL_SECS if active_job is not None and active_job.is_active else None
+    st.fragment(run_every=poll_every)(_job_progress)(active_job_id)
 
-    # ─── Store results ───
-    st.session_state["results"] = results
+
+# ──────────────────────────────────────────────
+# RUN METRICS — last run, with JSON / Prometheus export
+# ──────────────────────────────────────────────
+
+run_metrics = st.session_state.get("run_metrics")
+if run_metrics is not None and st.session_state.get("results_job") == active_job_id:
+    with st.expander("📈 Run Metrics (last run)"):
+        _render_metrics_panel(st, run_metrics)
+        for line in summarize_run_metrics(run_metrics):
+            st.caption(line)
+        col_json, col_prom = st.columns(2)
+        stamp = datetime.now().strftime("%Y%m%d_%H%M")
+        col_json.download_button(
+            "⬇️ Metrics (JSON)", run_metrics.to_json(),
+            file_name=f"tutrain_metrics_{stamp}.json", mime="application/json",
+        )
+        col_prom.download_button(
+            "⬇️ Metrics (Prometheus)", run_metrics.to_prometheus(),
+            file_name=f"tutrain_metrics_{stamp}.prom", mime="text/plain",
+        )
 
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -0,0 +1,459 @@
+"""
+Microbenchmarks for the pure hot-path functions in pipeline.py.
+
+Runs fully offline on synthetic corpora (no API keys, no network, no
+Streamlit) and reports ops/sec and tracemalloc peak memory per benchmark.
+
+    python benchmarks/bench_hotpaths.py                      # 10k items, compare to baseline
+    python benchmarks/bench_hotpaths.py --size 1000000       # 1M items
+    python benchmarks/bench_hotpaths.py --only filter        # benchmarks whose name contains "filter"
+    python benchmarks/bench_hotpaths.py --save-baseline      # record the current numbers
+
+When benchmarks/baseline.json has numbers for the same corpus size, each
+result is compared against it and the script exits non-zero if any
+benchmark is slower than the baseline by more than --threshold.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pipeline  # noqa: E402
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+POOL_SIZE = 20_000   # unique records per corpus; larger corpora cycle through the pool
+WARMUP_ITEMS = 1_000
+MIN_BENCH_SECS = 1.0   # fast benchmarks keep taking passes until this much time is spent
+MAX_PASSES = 50
+
+
+# ──────────────────────────────────────────────
+# SYNTHETIC CORPORA
+# ──────────────────────────────────────────────
+
+_WORDS = (
+    "physics chemistry maths biology teacher tutor faculty principal director founder "
+    "academy school cbse jee neet coaching classes students learning education online "
+    "software engineer marketing sales consultant analyst google startup product "
+    "passionate experience years mentor board exams delhi kota pune india"
+).split()
+_FIRST = ["Aarav", "Priya", "Rohit", "Neha", "Vikram", "Ananya", "Suresh", "Kavita", "Arjun", "Meera"]
+_LAST = ["Sharma", "Verma", "Iyer", "Gupta", "Nair", "Reddy", "Khan", "Das", "Mehta", "Joshi"]
+_ROLES = [
+    "Physics Teacher", "Maths Faculty", "Principal", "Founder & Director", "Academic Coordinator",
+    "HOD Chemistry", "Software Engineer", "Marketing Manager", "Vice Principal", "Home Tutor",
+]
+_COMPANIES = [
+    "Delhi Public School", "Kota Classes", "Bright Minds Academy", "Infosys", "Physics Wallah",
+    "Kendriya Vidyalaya", "Self-employed", "Unacademy", "Sunrise Coaching Institute", "Accenture",
+]
+_LOCATIONS = [
+    "New Delhi, Delhi, India", "Kota, Rajasthan", "Pune, Maharashtra, India", "Bengaluru",
+    "London, United Kingdom", "Dubai, UAE", "India", "", "Hyderabad, Telangana", "New York, US",
+]
+_DOMAINS = ["www.", "in.", "", "uk.", "m."]
+
+
+def _text(rng: random.Random, lo: int, hi: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(rng.randint(lo, hi)))
+
+
+def _name(rng: random.Random) -> str:
+    return f"{rng.choice(_FIRST)} {rng.choice(_LAST)}"
+
+
+def _slug(rng: random.Random, i: int) -> str:
+    return f"{rng.choice(_FIRST).lower()}-{rng.choice(_LAST).lower()}-{i:x}"
+
+
+def _cycle(pool: list, size: int) -> list:
+    """`size` items drawn round-robin from `pool` (items are shared, not copied)."""
+    return [pool[i % len(pool)] for i in range(size)]
+
+
+def make_serp_results(rng: random.Random, size: int) -> list[tuple[str, str, str]]:
+    """(url, snippet, title) triples as returned by SerpAPI organic results."""
+    pool = []
+    for i in range(min(size, POOL_SIZE)):
+        roll = rng.random()
+        slug = _slug(rng, i)
+        if roll < 0.75:
+            url = f"https://{rng.choice(_DOMAINS)}linkedin.com/in/{slug}" + rng.choice(["", "/", "?trk=x"])
+        elif roll < 0.9:
+            url = f"https://www.linkedin.com/company/{slug}/"
+        elif roll < 0.95:
+            url = "https://www.linkedin.com/in/login"
+        else:
+            url = f"https://example.com/{slug}"
+        title = f"{_name(rng)} - {rng.choice(_ROLES)} - {rng.choice(_COMPANIES)} | LinkedIn"
+        pool.append((url, _text(rng, 10, 40), title))
+    return _cycle(pool, size)
+
+
+def _experience(rng: random.Random, schema: str) -> list[dict]:
+    entries = []
+    for j in range(rng.randint(0, 5)):
+        year = rng.randint(1995, 2024)
+        if schema == "harvestapi":
+            entries.append({
+                "companyName": rng.choice(_COMPANIES), "position": rng.choice(_ROLES),
+                "title": rng.choice(_ROLES), "startDate": f"Jan {year}", "isCurrent": j == 0,
+            })
+        elif schema == "apimaestro":
+            entries.append({
+                "company": rng.choice(_COMPANIES), "title": rng.choice(_ROLES),
+                "startDate": str(year), "is_current": j == 0,
+            })
+        else:
+            entries.append({
+                "companyName": rng.choice(_COMPANIES), "title": rng.choice(_ROLES),
+                "dateRange": f"Jun {year} - Present" if j == 0 else f"{year} - {year + 2}",
+            })
+    return entries
+
+
+def _apify_item(rng: random.Random, schema: str, i: int) -> dict:
+    slug = _slug(rng, i)
+    first, last = rng.choice(_FIRST), rng.choice(_LAST)
+    if schema == "harvestapi":
+        return {
+            "linkedinUrl": f"https://www.linkedin.com/in/{slug}",
+            "firstName": first, "lastName": last,
+            "headline": f"{rng.choice(_ROLES)} at {rng.choice(_COMPANIES)}",
+            "location": {"linkedinText": rng.choice(_LOCATIONS), "countryCode": "IN"},
+            "about": _text(rng, 0, 80),
+            "connectionsCount": rng.choice([0, 120, 500, 2500]),
+            "followerCount": rng.randint(0, 5000),
+            "experience": _experience(rng, schema),
+            "education": [{"schoolName": "University of Delhi", "degree": "B.Sc."}] if rng.random() < 0.7 else [],
+            "skills": [{"name": rng.choice(_WORDS)} for _ in range(rng.randint(0, 5))],
+        }
+    if schema == "apimaestro":
+        return {
+            "basic_info": {
+                "fullname": f"{first} {last}",
+                "headline": f"{rng.choice(_ROLES)} | {rng.choice(_COMPANIES)}",
+                "location": {"city": rng.choice(_LOCATIONS), "country": "India"},
+                "profile_url": f"https://www.linkedin.com/in/{slug}",
+                "about": _text(rng, 0, 80),
+                "connections_count": rng.choice([0, 120, 500, 2500]),
+                "follower_count": rng.randint(0, 5000),
+                "current_company": rng.choice(_COMPANIES),
+            },
+            "experience": _experience(rng, schema),
+            "education": [{"school": "IIT Bombay", "degree_name": "M.Sc."}] if rng.random() < 0.7 else [],
+        }
+    return {
+        "url": f"https://www.linkedin.com/in/{slug}",
+        "fullName": f"{first} {last}",
+        "jobTitle": rng.choice(_ROLES),
+        "companyName": rng.choice(_COMPANIES),
+        "location": rng.choice(_LOCATIONS),
+        "summary": _text(rng, 0, 80),
+        "connections": rng.choice([0, 120, 500, 2500]),
+        "followers": rng.randint(0, 5000),
+        "experiences": _experience(rng, schema),
+        "educations": [{"schoolName": "Mumbai University", "degreeName": "B.Ed."}] if rng.random() < 0.7 else [],
+    }
+
+
+def make_apify_items(rng: random.Random, size: int, schema: str) -> list[dict]:
+    """Raw Apify dataset items in one actor's output schema."""
+    return _cycle([_apify_item(rng, schema, i) for i in range(min(size, POOL_SIZE))], size)
+
+
+def make_experience_lists(rng: random.Random, size: int) -> list[list[dict]]:
+    schemas = ("harvestapi", "apimaestro", "supreme_coder")
+    return _cycle([_experience(rng, schemas[i % 3]) for i in range(min(size, POOL_SIZE))], size)
+
+
+def _profile(rng: random.Random, i: int) -> dict:
+    serp_only = rng.random() < 0.2
+    contact = rng.random()
+    about = _text(rng, 0, 120)
+    if contact < 0.1:
+        about += f" reach me at {_FIRST[i % 10].lower()}{i}@gmail.com"
+    elif contact < 0.2:
+        about += f" call +91 9{rng.randint(100000000, 999999999)}"
+    elif contact < 0.25:
+        about += " whatsapp wa.me/91 youtube.com/@classes"
+    return {
+        "linkedin_url": f"https://www.linkedin.com/in/{_slug(rng, i)}",
+        "full_name": _name(rng) if rng.random() > 0.02 else "",
+        "headline": f"{rng.choice(_ROLES)} at {rng.choice(_COMPANIES)}" if rng.random() > 0.05 else "",
+        "current_role": rng.choice(_ROLES),
+        "current_company": rng.choice(_COMPANIES),
+        "about": about,
+        "location": rng.choice(_LOCATIONS),
+        "skills": [rng.choice(_WORDS) for _ in range(rng.randint(0, 6))],
+        "education": rng.choice(["", "B.Ed. - University of Delhi", "B.Tech - IIT Delhi"]),
+        "connections": rng.choice([0, 30, 500, 2500, 40000]),
+        "followers": rng.choice([0, 100, 5000, 900000]),
+        "profile_type": "company" if rng.random() < 0.1 else "individual",
+        "snippet": _text(rng, 0, 30),
+        "website": rng.choice(["", "", "", "https://brightminds.in"]),
+        "enrichment_status": "serpapi_only" if serp_only else "enriched",
+    }
+
+
+def make_profiles(rng: random.Random, size: int) -> list[dict]:
+    """Parsed profiles with a realistic mix of filter outcomes."""
+    return _cycle([_profile(rng, i) for i in range(min(size, POOL_SIZE))], size)
+
+
+def make_tier_inputs(rng: random.Random, size: int) -> list[tuple[dict, dict, dict]]:
+    """(profile, contacts, classification) triples for tier scoring."""
+    pool = []
+    for p in make_profiles(rng, min(size, POOL_SIZE)):
+        classification = {
+            "persona_type": rng.choice(pipeline.PERSONA_TYPES),
+            "seniority": rng.choice(pipeline.SENIORITY_LEVELS),
+            "is_relevant": rng.random() < 0.8,
+        }
+        pool.append((p, pipeline.extract_linkedin_contacts(p), classification))
+    return _cycle(pool, size)
+
+
+def make_master_csv(rng: random.Random, size: int, directory: str) -> str:
+    """Write a master lead CSV with `size` rows of URL variants; returns its path."""
+    path = os.path.join(directory, f"master_{size}.csv")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("Name,LinkedIn URL,Headline,City\n")
+        for i in range(size):
+            slug = _slug(rng, i)
+            url = rng.choice([
+                f"https://www.linkedin.com/in/{slug}",
+                f"https://in.linkedin.com/in/{slug}/",
+                f"http://linkedin.com/in/{slug.upper()}?trk=public",
+                f"https://www.linkedin.com/company/{slug}",
+            ])
+            f.write(f'"{_name(rng)}",{url},"{rng.choice(_ROLES)}",{rng.choice(_LOCATIONS).split(",")[0]}\n')
+    return path
+
+
+# ──────────────────────────────────────────────
+# BENCHMARK DEFINITIONS
+# ──────────────────────────────────────────────
+
+class _NullStatus:
+    """Stand-in for a Streamlit status container."""
+
+    def write(self, *_args, **_kwargs):
+        pass
+
+
+def _each(fn):
+    """Runner calling `fn(item)` for every corpus item."""
+    def run(corpus):
+        for item in corpus:
+            fn(item)
+    return run
+
+
+def _each_star(fn):
+    """Runner calling `fn(*item)` for every corpus item."""
+    def run(corpus):
+        for item in corpus:
+            fn(*item)
+    return run
+
+
+def _run_master_csv(path):
+    urls, _names, count, error = pipeline.load_existing_linkedin_leads(path)
+    if error:
+        raise RuntimeError(error)
+
+
+# name -> (corpus builder(rng, size, tmpdir), runner(corpus))
+BENCHMARKS = {
+    "extract_linkedin_info_from_url": (
+        lambda rng, n, _: make_serp_results(rng, n),
+        _each_star(pipeline.extract_linkedin_info_from_url),
+    ),
+    "parse_apify_item[harvestapi]": (
+        lambda rng, n, _: make_apify_items(rng, n, "harvestapi"),
+        _each(pipeline._parse_apify_profile_item),
+    ),
+    "parse_apify_item[apimaestro]": (
+        lambda rng, n, _: make_apify_items(rng, n, "apimaestro"),
+        _each(pipeline._parse_apify_profile_item),
+    ),
+    "parse_apify_item[supreme_coder]": (
+        lambda rng, n, _: make_apify_items(rng, n, "supreme_coder"),
+        _each(pipeline._parse_apify_profile_item),
+    ),
+    "parse_experience": (
+        lambda rng, n, _: make_experience_lists(rng, n),
+        _each(pipeline._parse_experience),
+    ),
+    "filter.is_complete_profile": (
+        lambda rng, n, _: make_profiles(rng, n),
+        _each(pipeline.is_complete_profile),
+    ),
+    "filter.is_blacklisted_brand": (
+        lambda rng, n, _: make_profiles(rng, n),
+        _each(pipeline.is_blacklisted_brand),
+    ),
+    "filter.is_india_based": (
+        lambda rng, n, _: make_profiles(rng, n),
+        _each(pipeline.is_india_based),
+    ),
+    "filter.is_connection_in_range": (
+        lambda rng, n, _: make_profiles(rng, n),
+        _each(pipeline.is_connection_in_range),
+    ),
+    "filter.is_education_relevant": (
+        lambda rng, n, _: make_profiles(rng, n),
+        _each(pipeline.is_education_relevant),
+    ),
+    "filter.apply_hard_filters": (
+        lambda rng, n, _: make_profiles(rng, n),
+        lambda corpus: pipeline.apply_hard_filters(corpus, _NullStatus()),
+    ),
+    "extract_linkedin_contacts": (
+        lambda rng, n, _: make_profiles(rng, n),
+        _each(pipeline.extract_linkedin_contacts),
+    ),
+    "calculate_linkedin_tier": (
+        lambda rng, n, _: make_tier_inputs(rng, n),
+        _each_star(pipeline.calculate_linkedin_tier),
+    ),
+    "load_existing_linkedin_leads": (
+        lambda rng, n, tmp: make_master_csv(rng, n, tmp),
+        _run_master_csv,
+    ),
+}
+
+
+# ──────────────────────────────────────────────
+# RUNNER
+# ──────────────────────────────────────────────
+
+def run_benchmark(name: str, size: int, repeat: int, seed: int, tmpdir: str, measure_memory: bool = True) -> dict:
+    """
+    Build the corpus for `name`, time at least `repeat` passes over it (best
+    pass wins; quick benchmarks take more passes, up to MIN_BENCH_SECS) and,
+    separately, measure the tracemalloc peak of one pass.
+    """
+    build, run = BENCHMARKS[name]
+    corpus = build(random.Random(f"{seed}:{name}"), size, tmpdir)
+    # Warm-up: regex caches, lazy imports, first-touch allocations
+    run(corpus[:WARMUP_ITEMS] if isinstance(corpus, list) else corpus)
+
+    best, spent, passes = float("inf"), 0.0, 0
+    while passes < repeat or (spent < MIN_BENCH_SECS and passes < MAX_PASSES):
+        gc.collect()
+        start = time.perf_counter()
+        run(corpus)
+        elapsed = time.perf_counter() - start
+        best, spent, passes = min(best, elapsed), spent + elapsed, passes + 1
+
+    peak = 0
+    if measure_memory:
+        gc.collect()
+        tracemalloc.start()
+        run(corpus)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        "items": size,
+        "seconds": round(best, 6),
+        "passes": passes,
+        "ops_per_sec": round(size / best, 1) if best else 0.0,
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def load_baseline(path: Path) -> dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_baseline(path: Path, size: int, results: dict) -> None:
+    """Merge `results` into the baseline file under their corpus size."""
+    baseline = load_baseline(path)
+    baseline.setdefault("sizes", {}).setdefault(str(size), {}).update(results)
+    baseline["environment"] = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "platform": platform.platform(terse=True),
+        "recorded_at": time.strftime("%Y-%m-%d"),
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=10_000, help="items per corpus (default 10000)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed passes per benchmark; the best is kept")
+    parser.add_argument("--seed", type=int, default=1, help="corpus RNG seed")
+    parser.add_argument("--only", action="append", default=[], help="run benchmarks whose name contains this (repeatable)")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH, help="baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="write results to the baseline file")
+    parser.add_argument("--threshold", type=float, default=0.3, help="allowed slowdown vs. baseline (default 0.3 = 30%%)")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    names = [n for n in BENCHMARKS if not args.only or any(o in n for o in args.only)]
+    if not names:
+        parser.error(f"no benchmark matches {args.only}; choose from: {', '.join(BENCHMARKS)}")
+
+    reference = load_baseline(args.baseline).get("sizes", {}).get(str(args.size), {})
+    results: dict[str, dict] = {}
+    regressions: list[str] = []
+
+    if not args.json:
+        print(f"{'benchmark':<34} {'ops/sec':>13} {'peak KiB':>10} {'baseline':>13} {'change':>8}")
+    with tempfile.TemporaryDirectory(prefix="tutrain-bench-") as tmpdir:
+        for name in names:
+            result = run_benchmark(name, args.size, args.repeat, args.seed, tmpdir, not args.no_memory)
+            results[name] = result
+            base = reference.get(name, {}).get("ops_per_sec")
+            change = ""
+            if base:
+                delta = result["ops_per_sec"] / base - 1
+                change = f"{delta:+.1%}"
+                if delta < -args.threshold:
+                    regressions.append(f"{name}: {result['ops_per_sec']:,.0f} ops/sec vs baseline {base:,.0f} ({delta:+.1%})")
+                    change += " !"
+            if not args.json:
+                print(
+                    f"{name:<34} {result['ops_per_sec']:>13,.0f} {result['peak_kib']:>10,.1f} "
+                    f"{(f'{base:,.0f}' if base else '-'):>13} {change:>8}"
+                )
+
+    if args.json:
+        print(json.dumps({"size": args.size, "results": results, "regressions": regressions}, indent=2))
+    assert "streamlit" not in sys.modules, "benchmarks must not import Streamlit"
+
+    if args.save_baseline:
+        save_baseline(args.baseline, args.size, results)
+        print(f"Baseline for {args.size:,} items written to {args.baseline}", file=sys.stderr)
+        return 0
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:", file=sys.stderr)
+        for line in regressions:
+            print(f"  {line}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
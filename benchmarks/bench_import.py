@@ -0,0 +1,92 @@
+"""
+Cold import time of pipeline.py, measured in fresh interpreters.
+
+    python benchmarks/bench_import.py                  # compare to baseline
+    python benchmarks/bench_import.py --save-baseline  # record the current number
+
+Each run also checks that importing the pipeline does not pull in the heavy
+SDKs it imports lazily (Streamlit, Plotly, pandas, google.generativeai) and
+exits non-zero if it does, if the median exceeds --budget-ms, or if it is
+slower than the baseline by more than --threshold.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+HEAVY_MODULES = ("streamlit", "plotly", "pandas", "google.generativeai")
+
+_PROBE = f"""
+import sys, time, json
+start = time.perf_counter()
+import pipeline
+elapsed = time.perf_counter() - start
+print(json.dumps({{"ms": elapsed * 1000, "heavy": [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def measure(runs: int) -> tuple[list[float], list[str]]:
+    """Import pipeline in `runs` fresh interpreters; returns (times_ms, heavy modules seen)."""
+    # One untimed run so the .pyc files exist, as they would in a deployed install
+    subprocess.run([sys.executable, "-c", "import pipeline"], cwd=ROOT, check=True, capture_output=True)
+    times, heavy = [], set()
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-W", "ignore", "-c", _PROBE], cwd=ROOT, check=True, capture_output=True, text=True
+        )
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        times.append(result["ms"])
+        heavy.update(result["heavy"])
+    return times, sorted(heavy)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=7, help="fresh interpreters to time (default 7)")
+    parser.add_argument("--budget-ms", type=float, default=300.0, help="fail if the median exceeds this (default 300)")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH, help="baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="write the median to the baseline file")
+    parser.add_argument("--threshold", type=float, default=0.3, help="allowed slowdown vs. baseline (default 0.3 = 30%%)")
+    args = parser.parse_args(argv)
+
+    times, heavy = measure(args.runs)
+    median = statistics.median(times)
+    print(f"import pipeline: median {median:.1f} ms, min {min(times):.1f} ms over {len(times)} runs")
+
+    try:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    except (OSError, ValueError):
+        baseline = {}
+
+    if args.save_baseline:
+        baseline["import_pipeline_ms"] = round(median, 1)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}", file=sys.stderr)
+
+    failures = []
+    if heavy:
+        failures.append(f"importing pipeline loaded {', '.join(heavy)}")
+    if median > args.budget_ms:
+        failures.append(f"median {median:.1f} ms is over the {args.budget_ms:g} ms budget")
+    reference = baseline.get("import_pipeline_ms")
+    if reference and not args.save_baseline:
+        change = median / reference - 1
+        print(f"baseline {reference:.1f} ms ({change:+.1%})")
+        if change > args.threshold:
+            failures.append(f"median {median:.1f} ms vs baseline {reference:.1f} ms ({change:+.1%})")
+
+    for line in failures:
+        print(f"FAIL: {line}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
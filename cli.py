@@ -0,0 +1,178 @@
+"""
+TuTrain LinkedIn Educator Discovery Agent — command line
+Runs the discovery → enrichment → filter → classify pipeline without the
+Streamlit UI and writes the approved leads to CSV or Parquet.
+
+    python cli.py "physics teacher" --target 25 --role Tutor/Teacher --city Delhi -o leads.csv
+    python cli.py "school principal" -o leads.parquet --metrics-json run_metrics.json
+    python cli.py "physics teacher" "maths teacher=40" "NEET JEE coaching" -o weekly.csv   # campaign
+
+API keys are read from the environment, under the same names as the
+Streamlit secrets: SERPAPI_KEY, GOOGLE_API_KEY, APIFY_KEY_1 … APIFY_KEY_4.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import pipeline
+
+
+class ConsoleStatus:
+    """Stand-in for a Streamlit status container that prints progress to stderr."""
+
+    def __init__(self, quiet: bool = False):
+        self.quiet = quiet
+
+    def write(self, msg) -> None:
+        if not self.quiet:
+            print(str(msg).replace("**", ""), file=sys.stderr, flush=True)
+
+    def warning(self, msg) -> None:
+        print(f"WARNING: {msg}", file=sys.stderr, flush=True)
+
+
+def write_leads(leads: list[dict], path: str, fmt: str | None = None) -> str:
+    """
+    Write leads to `path` as CSV or Parquet (inferred from the suffix unless
+    `fmt` is given). Parquet stores list/dict fields as JSON strings.
+    Returns the format used.
+    """
+    import pandas as pd
+
+    fmt = fmt or ("parquet" if path.lower().endswith((".parquet", ".pq")) else "csv")
+    df = pd.DataFrame(leads)
+    if fmt == "parquet":
+        for col in df.columns:
+            if df[col].map(lambda v: isinstance(v, (list, dict))).any():
+                df[col] = df[col].map(lambda v: json.dumps(v) if isinstance(v, (list, dict)) else v)
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+    return fmt
+
+
+def parse_search(value: str, default_target: int) -> tuple[str, int]:
+    """'subject' or 'subject=N' → (subject, target)."""
+    subject, sep, target = value.rpartition("=")
+    if sep and target.strip().isdigit() and subject.strip():
+        return subject.strip(), int(target)
+    return value.strip(), default_target
+
+
+def run_campaign(searches, roles, cities, serpapi_key, apify_manager, google_api_key, limits, options, quiet) -> list[dict]:
+    """Run several searches as one campaign, streaming each job's log to stderr; returns the combined leads."""
+    manager = pipeline.JobManager()
+    campaign = manager.get_campaign(manager.submit_campaign(
+        searches, roles, cities, serpapi_key, apify_manager, google_api_key, limits=limits, **options,
+    ))
+    cursors = {job.id: 0 for job in campaign.jobs}
+    status = ConsoleStatus(quiet=quiet)
+    while True:
+        active = campaign.is_active
+        for job in campaign.jobs:
+            lines, cursors[job.id] = job.messages(cursors[job.id])
+            for kind, msg in lines:
+                getattr(status, kind)(f"[{job.subject}] {msg}")
+        if not active:
+            break
+        time.sleep(1)
+    for provider, b in campaign.budget.snapshot().items():
+        if provider == "usd":
+            print(f"usd: ~${b['used']:.2f} spent" + (f" of ${b['limit']:.2f}" if b["limit"] else ""), file=sys.stderr)
+        else:
+            print(f"{provider}: {b['used']:g} / {b['limit']:g} credits", file=sys.stderr)
+    return campaign.leads()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Discover LinkedIn educator leads and export them.",
+        epilog="Keys: SERPAPI_KEY (required), GOOGLE_API_KEY, APIFY_KEY_1..APIFY_KEY_4 environment variables.",
+    )
+    parser.add_argument(
+        "subject", nargs="+",
+        help='subject / role / keyword, e.g. "physics teacher"; give several (optionally as "subject=N") '
+             "to run them as one campaign sharing dedup and a credit budget",
+    )
+    parser.add_argument("-n", "--target", type=int, default=25, help="target lead count per subject (default 25)")
+    parser.add_argument(
+        "--role", action="append", choices=pipeline.ROLE_OPTIONS, metavar="ROLE",
+        help=f"role filter, repeatable: {', '.join(pipeline.ROLE_OPTIONS)}",
+    )
+    parser.add_argument(
+        "--city", action="append", choices=pipeline.CITY_OPTIONS, metavar="CITY",
+        help="city filter, repeatable (any city the app offers)",
+    )
+    parser.add_argument("-o", "--output", help="output file, .csv or .parquet (default linkedin_leads_<timestamp>.csv)")
+    parser.add_argument("--format", choices=["csv", "parquet"], help="override the format inferred from --output")
+    parser.add_argument("--no-serp-gate", action="store_true", help="send every new profile to Apify")
+    parser.add_argument(
+        "--no-resume", action="store_true",
+        help="start over even if an interrupted run with the same parameters left a checkpoint",
+    )
+    parser.add_argument("--metrics-json", help="also write the run metrics as JSON here")
+    parser.add_argument("--metrics-prom", help="also write the run metrics in Prometheus text format here")
+    for provider, default in pipeline.CAMPAIGN_BUDGET.items():
+        parser.add_argument(
+            f"--budget-{provider}", type=type(default), default=default, metavar="N",
+            help=f"campaign {provider} budget (default {default:g})",
+        )
+    parser.add_argument("-q", "--quiet", action="store_true", help="only print warnings and the final result line")
+    args = parser.parse_args(argv)
+
+    serpapi_key = os.environ.get("SERPAPI_KEY", "").strip()
+    if not serpapi_key:
+        parser.error("SERPAPI_KEY is not set")
+    google_api_key = os.environ.get("GOOGLE_API_KEY", "").strip()
+    apify_manager = pipeline.ApifyKeyManager([os.environ.get(f"APIFY_KEY_{i}", "").strip() for i in range(1, 5)])
+
+    output = args.output or f"linkedin_leads_{datetime.now().strftime('%Y%m%d_%H%M')}.csv"
+    searches = [parse_search(s, args.target) for s in args.subject]
+    roles, cities = args.role or ["All Roles"], args.city or ["All Cities"]
+    options = {"use_serp_gate": not args.no_serp_gate, "resume": not args.no_resume}
+
+    if len(searches) > 1:
+        if args.metrics_json or args.metrics_prom:
+            parser.error("--metrics-json/--metrics-prom need a single subject")
+        limits = {p: getattr(args, f"budget_{p}") for p in pipeline.CAMPAIGN_BUDGET}
+        results = run_campaign(
+            searches, roles, cities, serpapi_key, apify_manager, google_api_key, limits, options, args.quiet,
+        )
+        if not results:
+            print("No leads found matching criteria.", file=sys.stderr)
+            return 1
+        fmt = write_leads(results, output, args.format)
+        print(f"{len(results)} leads written to {output} ({fmt})", file=sys.stderr)
+        return 0
+
+    subject, target = searches[0]
+    status = ConsoleStatus(quiet=args.quiet)
+    metrics = pipeline.Metrics()
+
+    results = pipeline.smart_fetch_linkedin_profiles(
+        subject, roles, cities, target,
+        serpapi_key, apify_manager, google_api_key,
+        status, metrics=metrics, **options,
+    )
+
+    if args.metrics_json:
+        with open(args.metrics_json, "w", encoding="utf-8") as f:
+            f.write(metrics.to_json())
+    if args.metrics_prom:
+        with open(args.metrics_prom, "w", encoding="utf-8") as f:
+            f.write(metrics.to_prometheus())
+
+    if not results:
+        print("No leads found matching criteria.", file=sys.stderr)
+        return 1
+    fmt = write_leads(results, output, args.format)
+    print(f"{len(results)} leads written to {output} ({fmt})", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,5667 @@
+"""
+TuTrain LinkedIn Educator Discovery Agent — pipeline
+Discovery, enrichment, filtering, classification and scoring, with no Streamlit
+dependency so it can be imported by the app, scripts and benchmarks alike.
+Heavy SDKs (pandas, google.generativeai, serpapi, apify_client, pyarrow) are
+imported where they are first used, keeping `import pipeline` cheap.
+"""
+
+import numpy as np
+import re
+import math
+import os
+import time
+import sqlite3
+import warnings
+import json
+import hashlib
+import zlib
+import queue
+import threading
+import bisect
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+warnings.filterwarnings("ignore")
+
+# ————————————————————————————————————————————————————————————————————————————
+# CONSTANTS
+# ──────────────────────────────────────────────
+
+INSTITUTE_KEYWORDS = [
+    'Academy', 'Institute', 'Classes', 'Coaching', 'Tutorial', 'School',
+    'Education', 'Center', 'Hub', 'Campus', 'Group', 'Team',
+    'System', 'Official', 'Centre', 'Learning', 'Foundation'
+]
+
+BRAND_BLACKLIST = [
+    'PW', 'Physics Wallah', 'Unacademy', 'Vedantu', 'Byju', 'Allen',
+    'Adda247', 'Sankalp', 'Magnet Brains', 'Xylem', 'Utkarsh',
+    'Motion', 'Careerwill', 'Apna College', 'Infinity Learn', 'Doubtnut',
+    'Mahendra', 'Wi-Fi Study', 'Exampur', 'Next Toppers',
+    'Infosys', 'TCS', 'Wipro', 'HCL', 'Accenture', 'Cognizant',
+    'Amazon', 'Google', 'Microsoft', 'Meta', 'Facebook', 'Apple', 'OpenAI',
+    'Flipkart', 'Zomato', 'Swiggy', 'Paytm', 'Ola', 'Uber'
+]
+
+EDUCATION_ROLES = [
+    'teacher', 'tutor', 'educator', 'professor', 'lecturer', 'faculty',
+    'principal', 'vice principal', 'director', 'head of department', 'hod',
+    'academic head', 'dean', 'founder', 'co-founder', 'ceo', 'coo', 'cto',
+    'owner', 'managing director', 'administrator', 'coordinator'
+]
+
+INDIAN_CITIES = [
+    "Delhi", "Mumbai", "Bangalore", "Hyderabad", "Chennai", "Kolkata",
+    "Pune", "Jaipur", "Lucknow", "Kota", "Patna", "Chandigarh",
+    "Ahmedabad", "Indore", "Bhopal", "Nagpur", "Varanasi", "Ranchi",
+    "Dehradun", "Allahabad", "Noida", "Gurgaon", "Sikar", "Jodhpur"
+]
+
+SYSTEM_PAGES = [
+    'login', 'signup', 'jobs', 'feed', 'mynetwork', 'messaging',
+    'notifications', 'learning', 'pulse', 'posts', 'company/login'
+]
+
+# Safety Limits — hard caps per run, enforced by the budget scheduler
+MAX_SERPAPI_QUERIES = 50
+MAX_APIFY_SCRAPES = 300
+MAX_GEMINI_CALLS = 300
+RUN_CAPS = {"serpapi": MAX_SERPAPI_QUERIES, "apify": MAX_APIFY_SCRAPES, "gemini": MAX_GEMINI_CALLS}
+
+# Cost model (USD list prices; Apify actor prices live on APIFY_PROFILE_ACTORS)
+SERPAPI_COST_PER_SEARCH = 0.015                 # $75 / 5k searches
+APIFY_COMPANY_COST_PER_PROFILE = 0.005
+GEMINI_COST_PER_1M_INPUT_TOKENS = 0.10
+GEMINI_COST_PER_1M_OUTPUT_TOKENS = 0.40
+GEMINI_OUTPUT_TOKENS_PER_PROFILE = 80           # estimated reply size per classified / summarized profile
+# Budget scheduler — once less than this share of a shared limit is left, what
+# remains is split between runs by approved leads per dollar (with this prior)
+BUDGET_SCARCE_FRACTION = 0.25
+BUDGET_PRIOR_USD = 0.10
+
+# SerpAPI pacing — queries fan out over a thread pool, gated by a token bucket
+SERPAPI_REQUESTS_PER_SEC = 1.0
+SERPAPI_BURST = 3
+SERPAPI_MAX_WORKERS = 4
+
+# Deep loop pipeline — max batches buffered between consecutive stages
+PIPELINE_QUEUE_SIZE = 2
+
+# Background jobs — runs executing at once (later ones queue), finished jobs kept, log lines kept per job
+JOB_MAX_CONCURRENT = 3
+JOB_HISTORY = 20
+JOB_LOG_MAX_LINES = 2000
+
+# Campaigns — default credit budget shared by all searches of one campaign
+CAMPAIGN_BUDGET = {
+    "serpapi": 200,     # searches
+    "apify": 1500,      # profiles scraped
+    "gemini": 1000,     # requests
+    "usd": 15.0,        # estimated total cost
+}
+
+# Run metrics — latency histogram bucket bounds (seconds) and Prometheus name prefix
+METRICS_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+METRICS_PROMETHEUS_PREFIX = "tutrain_"
+
+# Apify — concurrent actor runs allowed per key
+APIFY_MAX_RUNS_PER_KEY = 2
+APIFY_RUN_DEADLINE_SECS = 180     # runs still going after this are aborted
+APIFY_POLL_INTERVAL_SECS = 3
+
+# Apify key pool — batches are spread over keys in proportion to their remaining
+# credit, read from the Apify API where possible and otherwise inferred from usage
+APIFY_KEY_DEFAULT_CREDIT_USD = 5.0            # monthly credit assumed when a key's balance can't be read (free plan)
+APIFY_KEY_MIN_HEADROOM_USD = 0.05             # a key reported below this counts as exhausted
+APIFY_KEY_PROBE_TTL_SECS = 3600               # re-read an active key's balance after this long
+APIFY_KEY_REPROBE_SECS = 6 * 3600             # exhausted key with no known cycle end: first re-probe, doubled per failed revival
+APIFY_KEY_REPROBE_MAX_SECS = 7 * 86400
+APIFY_KEY_CHECK_SECS = 60                     # how often a key pool looks for probes that are due
+
+# Apify actor routing — per-actor run history kept across sessions; each batch
+# goes to the actor with the lowest expected cost per usable profile
+ACTOR_HEALTH_WINDOW = 50              # most recent runs per actor the stats cover
+ACTOR_PRIOR_RUNS = 2                  # successful pseudo-runs blended into every actor's success rate
+ACTOR_PRIOR_PROFILES = 40             # pseudo-profiles blended into the yield estimate ...
+ACTOR_PRIOR_USABLE_RATIO = 0.8        # ... at this usable-item ratio
+ACTOR_BREAKER_FAILURES = 3            # consecutive failed runs that open an actor's circuit
+ACTOR_BREAKER_COOLDOWN_SECS = 1800    # an open circuit skips the actor this long, then allows one trial run
+ACTOR_DEADLINE_MIN_RUNS = 5           # successful runs needed before an actor gets its own deadline ...
+ACTOR_DEADLINE_P95_MULTIPLE = 2.0     # ... of this multiple of its p95 latency,
+ACTOR_DEADLINE_FLOOR_SECS = 60        # ... never shorter than this nor longer than APIFY_RUN_DEADLINE_SECS
+
+# Gemini model used for classification and summaries (part of the classification cache key)
+GEMINI_MODEL = "gemini-2.0-flash"
+
+# Gemini pacing — concurrent requests under per-minute request and token budgets
+GEMINI_RPM = 15                   # free tier; raise for paid tiers
+GEMINI_TPM = 1_000_000
+GEMINI_MAX_WORKERS = 4
+GEMINI_MAX_RETRIES = 3            # attempts after the first when rate limited
+GEMINI_BACKOFF_SECS = 5           # first pause after a 429, doubled per retry
+
+# Gemini batch classification — profiles packed per prompt, capped by input size
+GEMINI_BATCH_SIZE = 10
+GEMINI_BATCH_MAX_INPUT_TOKENS = 8000
+GEMINI_CHARS_PER_TOKEN = 4        # rough estimate used to size batches
+
+# Allowed values in a classification result
+PERSONA_TYPES = [
+    "Individual Tutor", "Institute Leader", "EdTech Decision-Maker",
+    "School Administrator", "Coaching Institute Owner", "Irrelevant",
+]
+SENIORITY_LEVELS = ["Owner/Founder", "C-Level", "Director", "Principal", "HOD", "Teacher"]
+COLLABORATION_LEVELS = ["High", "Medium", "Low"]
+
+# Teaching scope keywords — fill subjects/boards when Gemini didn't classify the profile
+SUBJECT_KEYWORDS = {
+    "Mathematics": ["mathematics", "maths", "math"],
+    "Physics": ["physics"],
+    "Chemistry": ["chemistry"],
+    "Biology": ["biology", "botany", "zoology"],
+    "Science": ["science"],
+    "English": ["english"],
+    "Hindi": ["hindi"],
+    "Computer Science": ["computer science", "coding", "programming"],
+    "Economics": ["economics"],
+    "Accountancy": ["accountancy", "accounts"],
+    "Social Studies": ["social studies", "social science", "history", "geography"],
+}
+BOARD_KEYWORDS = {
+    "CBSE": ["cbse"],
+    "ICSE": ["icse", "isc"],
+    "IB": ["ib", "international baccalaureate"],
+    "IGCSE": ["igcse"],
+    "Cambridge": ["cambridge"],
+}
+
+# Local persona classifier — trained on stored Gemini labels; confident predictions skip Gemini
+LOCAL_MODEL_DIM = 2 ** 16           # hashed feature space
+LOCAL_MODEL_MIN_EXAMPLES = 200      # labels needed before a model is trained
+LOCAL_MODEL_MIN_CONFIDENCE = 0.9    # calibrated confidence needed to skip Gemini
+LOCAL_MODEL_MIN_ACCURACY = 0.9      # held-out accuracy on confident predictions needed to deploy
+
+# Local persistent state (caches, stores) lives here
+DATA_DIR = os.environ.get("TUTRAIN_DATA_DIR", ".tutrain_data")
+
+# SerpAPI response cache — re-running a recent search costs zero credits
+SERP_CACHE_TTL_HOURS = 72
+SERP_CACHE_MAX_ENTRIES = 5000
+
+# Lead store — a 'discovered' claim abandoned this long ago may be re-claimed
+LEAD_CLAIM_TTL_HOURS = 24
+
+# Run checkpoints — an interrupted run can be resumed until its claims expire
+CHECKPOINT_TTL_HOURS = LEAD_CLAIM_TTL_HOURS
+
+# Enrichment cache — scraped profiles/companies are reused while fresh
+ENRICH_CACHE_TTL_DAYS = 30
+APIFY_COST_PER_PROFILE = 0.004    # USD; HarvestAPI charges $4 per 1k profiles
+
+# Master lead import — rows read per chunk
+MASTER_CSV_CHUNK_ROWS = 50_000
+
+ROLE_OPTIONS = [
+    "All Roles", "Tutor/Teacher", "Principal/Director",
+    "Founder/CEO", "HOD/Academic Head", "Coaching Owner"
+]
+
+CITY_OPTIONS = ["All Cities"] + INDIAN_CITIES
+
+# Search terms each role filter expands to in the generated queries
+ROLE_QUERY_TERMS = {
+    "Tutor/Teacher": ["teacher", "tutor", "educator", "faculty"],
+    "Principal/Director": ["principal", "vice principal", "director"],
+    "Founder/CEO": ["founder", "ceo"],
+    "HOD/Academic Head": ["head of department", "academic head"],
+    "Coaching Owner": ["coaching", "owner"],
+}
+# Role filters that also want institution (company page) queries
+COMPANY_PAGE_ROLES = {"All Roles", "Principal/Director", "Founder/CEO", "Coaching Owner"}
+
+# Query planner — picks template × role × city queries by new slugs per credit
+QUERIES_FIRST_ROUND = 5
+QUERIES_PER_ROUND = 12
+PLANNER_PRIOR_YIELD = 5.0      # optimistic yield assumed for untried queries
+PLANNER_MIN_CREDITS = 2        # credits an arm must spend before it can be retired
+PLANNER_MIN_YIELD = 0.5        # retire arms whose marginal yield drops below this
+PLANNER_EWMA_ALPHA = 0.5
+PLANNER_RETRY_DAYS = 14        # retired arms are explored again after this long
+PLANNER_MAX_START = 40         # deepest SerpAPI page offset per arm
+
+# Phase 3 — Hard Filter Constants
+EDUCATION_KEYWORDS = [
+    'teacher', 'tutor', 'educator', 'professor', 'lecturer', 'faculty',
+    'principal', 'vice principal', 'director of education', 'academic',
+    'head of department', 'hod', 'dean', 'coaching', 'classes',
+    'school', 'academy', 'institute', 'college', 'university',
+    'cbse', 'icse', 'igcse', 'ib', 'cambridge', 'neet', 'jee',
+    'curriculum', 'pedagogy', 'learning', 'education', 'edtech',
+    'tuition', 'teaching', 'instruction', 'mentoring', 'training',
+    'mathematics', 'physics', 'chemistry', 'biology', 'english', 'science',
+    'founder', 'ceo', 'coo', 'managing director'
+]
+
+NON_EDUCATION_KEYWORDS = [
+    'software engineer', 'data scientist', 'product manager', 'marketing',
+    'sales executive', 'business development', 'consultant', 'analyst',
+    'recruiter', 'hr manager', 'finance', 'banking', 'real estate',
+    'insurance', 'automotive', 'hospitality', 'retail'
+]
+
+# Leadership roles that need education context to count as relevant
+LEADERSHIP_KEYWORDS = ['founder', 'ceo', 'coo', 'managing director', 'director']
+
+EDU_CONTEXT_KEYWORDS = [
+    'school', 'academy', 'institute', 'college', 'university',
+    'coaching', 'classes', 'education', 'edtech', 'teaching',
+    'cbse', 'icse', 'igcse', 'ib', 'neet', 'jee', 'tuition',
+    'curriculum', 'pedagogy', 'learning', 'training'
+]
+
+INDIA_INDICATORS = [
+    'india', 'delhi', 'mumbai', 'bangalore', 'bengaluru', 'hyderabad',
+    'chennai', 'kolkata', 'pune', 'jaipur', 'lucknow', 'kota', 'patna',
+    'chandigarh', 'ahmedabad', 'indore', 'bhopal', 'nagpur', 'varanasi',
+    'ranchi', 'dehradun', 'noida', 'gurgaon', 'gurugram', 'greater noida',
+    'ghaziabad', 'faridabad', 'new delhi', 'navi mumbai', 'thane',
+    'karnataka', 'maharashtra', 'tamil nadu', 'telangana', 'kerala',
+    'uttar pradesh', 'rajasthan', 'gujarat', 'madhya pradesh', 'bihar',
+    'west bengal', 'andhra pradesh', 'odisha', 'jharkhand', 'haryana', 'punjab'
+]
+
+MIN_CONNECTIONS = 100
+MAX_CONNECTIONS = 30000
+MIN_COMPANY_FOLLOWERS = 50
+MAX_COMPANY_FOLLOWERS = 500000
+
+
+# ──────────────────────────────────────────────
+# APIFY KEY MANAGER — Multi-Key Rotation
+# ──────────────────────────────────────────────
+
+_SHARED_LEDGER = object()  # ApifyKeyManager default: the process-wide get_key_ledger()
+
+
+class ApifyKeyManager:
+    """
+    Pool of Apify API keys. Keys are leased concurrently: `acquire()` hands
+    out a key with a free run slot (up to `max_runs_per_key` leases per key),
+    preferring the free key with the fewest batches per dollar of remaining
+    credit, so batches spread in proportion to headroom while every idle
+    slot stays usable.
+
+    Balances are read from the Apify API where the key allows it and
+    otherwise inferred from billed usage (`charge()`) against
+    APIFY_KEY_DEFAULT_CREDIT_USD. They live in an ApifyKeyLedger under each
+    key's fingerprint, so spend and exhaustion carry across runs; pass
+    `ledger=None` to keep them in memory only. Balance probes run on a
+    background thread. An exhausted key is probed again at its billing-cycle
+    end (or on a backoff schedule when that is unknown) and rejoins the pool
+    once it has credit.
+    """
+
+    def __init__(self, keys: list, max_runs_per_key: int = APIFY_MAX_RUNS_PER_KEY, ledger=_SHARED_LEDGER):
+        self.keys = [k for k in keys if k]
+        self.current_index = 0
+        self.exhausted_keys: set[int] = set()
+        self.max_runs_per_key = max(1, max_runs_per_key)
+        self._in_use: dict[int, int] = {}
+        self._cond = threading.Condition()
+        self._fingerprints = [key_fingerprint(k) for k in self.keys]
+        self._ledger = get_key_ledger() if ledger is _SHARED_LEDGER else ledger
+        # Per key: batches leased and USD billed through this pool, and the ledger's view
+        self._batches = [0] * len(self.keys)
+        self._spent = [0.0] * len(self.keys)
+        self._headroom = [APIFY_KEY_DEFAULT_CREDIT_USD] * len(self.keys)
+        self._source = ["estimated"] * len(self.keys)
+        self._probed_at = [0.0] * len(self.keys)
+        self._retry_at: dict[int, float] = {}
+        self._probing: set[int] = set()
+        self._next_check = 0.0
+        with self._cond:
+            self._sync()
+
+    def _sync(self) -> None:
+        """Refresh balances and exhaustion from the ledger. Caller holds the lock."""
+        if self._ledger is None:
+            return
+        rows = self._ledger.rows(self._fingerprints)
+        for i, fp in enumerate(self._fingerprints):
+            row = rows.get(fp)
+            if row is None:
+                continue
+            self._headroom[i] = ApifyKeyLedger.headroom(row)
+            self._source[i] = row["source"]
+            self._probed_at[i] = row["probed_at"]
+            if row["exhausted_at"] is not None:
+                self.exhausted_keys.add(i)
+                self._retry_at[i] = row["retry_at"] or 0.0
+            elif i in self.exhausted_keys:
+                self.exhausted_keys.discard(i)
+                self._retry_at.pop(i, None)
+
+    def _maintain(self) -> None:
+        """
+        Every APIFY_KEY_CHECK_SECS: pick up other pools' spend from the ledger,
+        and start a background probe of stale balances and of exhausted keys
+        whose retry time came. Never waits on the Apify API itself.
+        """
+        if self._ledger is None:
+            return
+        with self._cond:
+            if time.monotonic() < self._next_check:
+                return
+            self._next_check = time.monotonic() + APIFY_KEY_CHECK_SECS
+            self._sync()
+            now = time.time()
+            due = [
+                i for i in range(len(self.keys))
+                if i not in self._probing and (
+                    self._retry_at.get(i, 0.0) <= now if i in self.exhausted_keys
+                    else now - self._probed_at[i] > APIFY_KEY_PROBE_TTL_SECS
+                )
+            ]
+            self._probing.update(due)
+        if due:
+            threading.Thread(
+                target=self._probe_due, args=(due,), name="apify-key-probe", daemon=True
+            ).start()
+
+    def _probe_due(self, due: list[int]) -> None:
+        """Probe keys one by one, waking `acquire()` waiters after each."""
+        for i in due:
+            try:
+                self._probe(i)
+            except Exception:
+                pass  # left as it was; the next check tries again
+            finally:
+                with self._cond:
+                    self._probing.discard(i)
+                    self._sync()
+                    self._cond.notify_all()
+
+    def _probe(self, index: int) -> None:
+        """Read a key's balance; revive it if it was exhausted and has credit again."""
+        fp = self._fingerprints[index]
+        report = _probe_apify_balance(self.keys[index])
+        if report is None:
+            # Balance unreadable: after the wait, the next run on the key is the probe
+            self._ledger.touch(fp)
+            if index in self.exhausted_keys:
+                self._ledger.revive(fp)
+        elif report["balance_usd"] < APIFY_KEY_MIN_HEADROOM_USD:
+            self._ledger.report(fp, **report)
+            self._ledger.mark_exhausted(fp)
+        else:
+            self._ledger.report(fp, **report)
+            self._ledger.revive(fp)
+
+    def get_current_key(self) -> str | None:
+        """Return current active key, or None if all exhausted."""
+        self._maintain()
+        with self._cond:
+            active = self.active_indexes()
+            while not active and self._probing:
+                # A probe in flight may bring a key back
+                self._cond.wait()
+                active = self.active_indexes()
+            if not active:
+                return None
+            if self.current_index not in active:
+                # Next active key after the cursor, wrapping round to keys revived behind it
+                self.current_index = next((i for i in active if i > self.current_index), active[0])
+            return self.keys[self.current_index]
+
+    def mark_exhausted(self, index: int | None = None) -> str | None:
+        """
+        Mark a key (default: the current one) as exhausted until its next
+        probe. Returns the next active key, or None if all are exhausted.
+        """
+        with self._cond:
+            if index is None:
+                index = self.current_index
+            self.exhausted_keys.add(index)
+            if self._ledger is not None:
+                self._ledger.mark_exhausted(self._fingerprints[index])
+                self._sync()
+            else:
+                self._retry_at[index] = time.time() + APIFY_KEY_REPROBE_SECS
+            if index == self.current_index:
+                self.current_index += 1
+            # Wake waiters: they either get another key or learn all are gone
+            self._cond.notify_all()
+        return self.get_current_key()
+
+    def charge(self, index: int, usd: float) -> None:
+        """Record `usd` billed on a key, lowering its estimated headroom."""
+        with self._cond:
+            self._spent[index] += usd
+            self._headroom[index] -= usd
+        if self._ledger is not None:
+            self._ledger.charge(self._fingerprints[index], usd)
+
+    def active_indexes(self) -> list[int]:
+        return [i for i in range(len(self.keys)) if i not in self.exhausted_keys]
+
+    def acquire(self) -> int | None:
+        """
+        Lease a non-exhausted key, blocking only while every one is at its
+        concurrency limit. Among keys with a free slot, the one whose next
+        batch leaves it the fewest batches per dollar of headroom wins, so a
+        well-funded key takes most of the load but a low-credit key's idle
+        slot is still used rather than left waiting. Returns the key index,
+        or None if all keys are exhausted. Pair with `release()`.
+        """
+        self._maintain()
+        with self._cond:
+            while True:
+                active = self.active_indexes()
+                if not active:
+                    if self._probing:
+                        # A probe in flight may bring a key back
+                        self._cond.wait()
+                        continue
+                    return None
+                free = [i for i in active if self._in_use.get(i, 0) < self.max_runs_per_key]
+                if free:
+                    idx = min(free, key=lambda i: (
+                        (self._batches[i] + 1) / max(self._headroom[i], APIFY_KEY_MIN_HEADROOM_USD),
+                        self._in_use.get(i, 0),
+                    ))
+                    self._in_use[idx] = self._in_use.get(idx, 0) + 1
+                    self._batches[idx] += 1
+                    return idx
+                self._cond.wait()
+
+    def release(self, index: int) -> None:
+        with self._cond:
+            self._in_use[index] = max(0, self._in_use.get(index, 0) - 1)
+            self._cond.notify_all()
+
+    def capacity(self) -> int:
+        """How many actor runs may be in flight at once across active keys."""
+        self._maintain()
+        return len(self.active_indexes()) * self.max_runs_per_key
+
+    def utilization(self) -> list[dict]:
+        """
+        Per-key load and credit: batches leased and USD billed through this
+        pool, runs in flight, and the estimated headroom with its source
+        ("reported" by the Apify API or "estimated" from usage).
+        """
+        with self._cond:
+            total = sum(self._batches)
+            return [
+                {
+                    "key": f"#{i + 1}",
+                    "fingerprint": self._fingerprints[i],
+                    "status": "exhausted" if i in self.exhausted_keys else "active",
+                    "in_use": self._in_use.get(i, 0),
+                    "batches": self._batches[i],
+                    "share": self._batches[i] / total if total else 0.0,
+                    "spent_usd": self._spent[i],
+                    "headroom_usd": max(0.0, self._headroom[i]),
+                    "source": self._source[i],
+                    "retry_at": self._retry_at.get(i) if i in self.exhausted_keys else None,
+                }
+                for i in range(len(self.keys))
+            ]
+
+    def get_status(self) -> str:
+        """Return status string for sidebar display."""
+        if not self.keys:
+            return "No Apify keys loaded"
+        active = self.active_indexes()
+        headroom = sum(max(0.0, self._headroom[i]) for i in active)
+        return f"{len(active)}/{len(self.keys)} keys active, ~${headroom:.2f} credit left"
+
+    def has_keys(self) -> bool:
+        return len(self.keys) > 0
+
+    def is_exhausted(self) -> bool:
+        return self.get_current_key() is None
+
+
+# ──────────────────────────────────────────────
+# RATE LIMITER — Token Bucket
+# ──────────────────────────────────────────────
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, up to `capacity` banked."""
+
+    def __init__(self, rate: float, capacity: int = 1):
+        self.rate = max(float(rate), 0.001)
+        self.capacity = max(int(capacity), 1)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def set_rate(self, rate: float) -> None:
+        """Change the refill rate; tokens banked so far are kept."""
+        with self._lock:
+            self._refill()
+            self.rate = max(float(rate), 0.001)
+
+    def acquire(self, stop_event: threading.Event | None = None, amount: float = 1) -> bool:
+        """
+        Block until `amount` tokens are available and take them (amounts above
+        capacity are clamped to it). Returns False (without taking tokens) if
+        `stop_event` is set while waiting.
+        """
+        amount = min(float(amount), self.capacity)
+        while True:
+            if stop_event is not None and stop_event.is_set():
+                return False
+            with self._lock:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return True
+                wait = (amount - self._tokens) / self.rate
+            if stop_event is not None:
+                stop_event.wait(wait)
+            else:
+                time.sleep(wait)
+
+
+# Shared across rounds so back-to-back rounds can't exceed the configured rate
+_serpapi_bucket = TokenBucket(SERPAPI_REQUESTS_PER_SEC, SERPAPI_BURST)
+
+
+# ──────────────────────────────────────────────
+# RUN METRICS — counters, gauges and latency histograms
+# ──────────────────────────────────────────────
+
+class Metrics:
+    """
+    Thread-safe, in-memory metrics for a pipeline run. Every series is a
+    name plus labels (stage, provider, key, actor, reason, ...):
+
+      counters    provider_requests, credits, cache_lookups, filter_rejections,
+                  wasted_credits, stage_items, classifications, leads_approved,
+                  provider_rate_limited, apify_key_spend_usd, identity_aliases
+      gauges      gemini_effective_rpm, classification_cache_entries, local_model_version,
+                  apify_key_headroom_usd
+      histograms  provider_latency_seconds, stage_batch_seconds
+
+    Exported as JSON (`snapshot()` / `to_json()`) and Prometheus text
+    (`to_prometheus()`); the run summary and the Streamlit status panel are
+    rendered from the same data. API keys are only ever labelled by position
+    ("#1"), never by value.
+    """
+
+    def __init__(self, buckets: tuple = METRICS_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+        self._lock = threading.Lock()
+        self._counters: dict[tuple, float] = {}
+        self._gauges: dict[tuple, float] = {}
+        self._histograms: dict[tuple, dict] = {}
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    @staticmethod
+    def _matches(key: tuple, name: str, filters: dict) -> bool:
+        if key[0] != name:
+            return False
+        labels = dict(key[1])
+        return all(labels.get(k) == str(v) for k, v in filters.items())
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """Add `value` to a counter."""
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        """Set a gauge."""
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        """Record one latency sample in a histogram."""
+        key = self._key(name, labels)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            hist["counts"][bisect.bisect_left(self.buckets, seconds)] += 1
+            hist["sum"] += seconds
+            hist["count"] += 1
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Context manager observing the wall time of its body."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - start, **labels)
+
+    def total(self, name: str, **filters) -> float:
+        """Sum of a counter over every series whose labels include `filters`."""
+        with self._lock:
+            return sum(v for k, v in self._counters.items() if self._matches(k, name, filters))
+
+    def breakdown(self, name: str, label: str, **filters) -> dict[str, float]:
+        """Counter totals grouped by one label, e.g. rejections by reason."""
+        out: dict[str, float] = {}
+        with self._lock:
+            for k, v in self._counters.items():
+                if self._matches(k, name, filters):
+                    group = dict(k[1]).get(label, "")
+                    out[group] = out.get(group, 0) + v
+        return out
+
+    def gauge(self, name: str, **labels) -> float | None:
+        with self._lock:
+            return self._gauges.get(self._key(name, labels))
+
+    def latency(self, name: str, **filters) -> dict:
+        """
+        Merged histogram of matching series: count, mean and bucket-bound
+        estimates of p50 / p95 (None when there are no samples).
+        """
+        counts = [0] * (len(self.buckets) + 1)
+        total, n = 0.0, 0
+        with self._lock:
+            for k, hist in self._histograms.items():
+                if self._matches(k, name, filters):
+                    counts = [a + b for a, b in zip(counts, hist["counts"])]
+                    total += hist["sum"]
+                    n += hist["count"]
+
+        def _quantile(q: float) -> float | None:
+            if not n:
+                return None
+            seen = 0
+            for bound, c in zip(self.buckets + (math.inf,), counts):
+                seen += c
+                if seen >= q * n:
+                    return bound
+            return math.inf
+
+        return {"count": n, "mean": total / n if n else None, "p50": _quantile(0.5), "p95": _quantile(0.95)}
+
+    def snapshot(self) -> dict:
+        """Plain-data copy of every series (histogram buckets are cumulative)."""
+        with self._lock:
+            counters = [
+                {"name": k[0], "labels": dict(k[1]), "value": v} for k, v in sorted(self._counters.items())
+            ]
+            gauges = [
+                {"name": k[0], "labels": dict(k[1]), "value": v} for k, v in sorted(self._gauges.items())
+            ]
+            histograms = []
+            for k, hist in sorted(self._histograms.items()):
+                cumulative, running = {}, 0
+                for bound, c in zip(self.buckets + (math.inf,), hist["counts"]):
+                    running += c
+                    cumulative["+Inf" if bound == math.inf else f"{bound:g}"] = running
+                histograms.append({
+                    "name": k[0], "labels": dict(k[1]),
+                    "count": hist["count"], "sum": round(hist["sum"], 6), "buckets": cumulative,
+                })
+        return {"counters": counters, "gauges": gauges, "histograms": histograms}
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self, prefix: str = METRICS_PROMETHEUS_PREFIX) -> str:
+        """Prometheus text exposition format (counters get a `_total` suffix)."""
+
+        def _labels(labels: dict, extra: tuple = ()) -> str:
+            pairs = list(labels.items()) + list(extra)
+            if not pairs:
+                return ""
+            escaped = (
+                f'{k}="' + str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+                for k, v in pairs
+            )
+            return "{" + ",".join(escaped) + "}"
+
+        snap = self.snapshot()
+        lines: list[str] = []
+        typed: set[str] = set()
+
+        def _type(metric: str, kind: str) -> None:
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} {kind}")
+
+        for c in snap["counters"]:
+            metric = f"{prefix}{c['name']}_total"
+            _type(metric, "counter")
+            lines.append(f"{metric}{_labels(c['labels'])} {c['value']:g}")
+        for g in snap["gauges"]:
+            metric = f"{prefix}{g['name']}"
+            _type(metric, "gauge")
+            lines.append(f"{metric}{_labels(g['labels'])} {g['value']:g}")
+        for h in snap["histograms"]:
+            metric = f"{prefix}{h['name']}"
+            _type(metric, "histogram")
+            for bound, count in h["buckets"].items():
+                lines.append(f"{metric}_bucket{_labels(h['labels'], (('le', bound),))} {count}")
+            lines.append(f"{metric}_sum{_labels(h['labels'])} {h['sum']:g}")
+            lines.append(f"{metric}_count{_labels(h['labels'])} {h['count']}")
+        return "\n".join(lines) + "\n"
+
+
+# ──────────────────────────────────────────────
+# BUDGET SCHEDULER — cost model and hard caps for paid calls
+# ──────────────────────────────────────────────
+
+BUDGET_PROVIDERS = ("serpapi", "apify", "gemini")
+
+
+def gemini_cost(input_tokens: int, output_tokens: int) -> float:
+    """Estimated USD cost of one Gemini request."""
+    return (
+        input_tokens * GEMINI_COST_PER_1M_INPUT_TOKENS + output_tokens * GEMINI_COST_PER_1M_OUTPUT_TOKENS
+    ) / 1_000_000
+
+
+def unit_cost(provider: str) -> float:
+    """Default USD cost of one unit: a SerpAPI search, an Apify profile or a Gemini request."""
+    if provider == "serpapi":
+        return SERPAPI_COST_PER_SEARCH
+    if provider == "apify":
+        return APIFY_COST_PER_PROFILE
+    return gemini_cost(GEMINI_BATCH_MAX_INPUT_TOKENS // 2, GEMINI_OUTPUT_TOKENS_PER_PROFILE * GEMINI_BATCH_SIZE)
+
+
+class BudgetExhausted(Exception):
+    """The budget scheduler granted nothing for a paid call."""
+
+
+class RunBudget:
+    """
+    One run's account with a BudgetScheduler: units and estimated USD
+    reserved per provider, and leads approved so far. Paid calls go through
+    `reserve()` first and spend only what it grants.
+    """
+
+    def __init__(self, scheduler: "BudgetScheduler", target_count: int, label: str = ""):
+        self.scheduler = scheduler
+        self.target_count = target_count
+        self.label = label
+        self.used = {p: 0 for p in BUDGET_PROVIDERS}
+        self.usd = 0.0
+        self.approved = 0
+        self.finished = False
+
+    def reserve(self, provider: str, units: int, cost: float | None = None) -> int:
+        """
+        Ask to spend `units` of `provider` at `cost` USD each (default
+        `unit_cost(provider)`). Returns how many were granted (possibly 0).
+        """
+        return self.scheduler._grant(self, provider, units, unit_cost(provider) if cost is None else cost)
+
+    def settle(self, provider: str, reserved: int, actual: int, cost: float | None = None) -> None:
+        """Correct a reservation once the real number of billed units is known."""
+        cost = unit_cost(provider) if cost is None else cost
+        with self.scheduler._lock:
+            self.used[provider] += actual - reserved
+            self.usd += (actual - reserved) * cost
+
+    def remaining(self, provider: str) -> int:
+        """Units this run could still be granted right now."""
+        return self.scheduler._allowance(self, provider)
+
+    def note_approved(self, count: int = 1) -> None:
+        with self.scheduler._lock:
+            self.approved += count
+
+    def preload(self, used: dict, usd: float) -> None:
+        """Carry over what an interrupted run had already spent (from its checkpoint)."""
+        with self.scheduler._lock:
+            for p, units in used.items():
+                self.used[p] = self.used.get(p, 0) + units
+            self.usd += usd
+
+    def finish(self) -> None:
+        with self.scheduler._lock:
+            self.finished = True
+
+    def max_usd(self) -> float:
+        """Estimated cost if the run spends every unit its caps allow."""
+        caps = self.scheduler.run_caps
+        return self.usd + sum(
+            max(caps.get(p, 0) - self.used[p], 0) * unit_cost(p) for p in BUDGET_PROVIDERS
+        )
+
+    def projected_usd(self) -> float:
+        """
+        Expected total cost to reach the target: spend so far plus the cost
+        per approved lead to date for the leads still missing, never more
+        than `max_usd()`.
+        """
+        if self.finished or self.approved >= self.target_count:
+            return self.usd
+        if not self.approved:
+            return self.max_usd()
+        return min(self.usd + self.usd / self.approved * (self.target_count - self.approved), self.max_usd())
+
+    def snapshot(self) -> dict:
+        caps = self.scheduler.run_caps
+        return {
+            "label": self.label,
+            "usd": self.usd,
+            "projected_usd": self.projected_usd(),
+            "approved": self.approved,
+            "providers": {p: {"used": self.used[p], "limit": caps.get(p)} for p in BUDGET_PROVIDERS},
+        }
+
+
+class BudgetScheduler:
+    """
+    Hard caps and a cost model for paid calls, shared by any number of runs.
+    Each run `attach()`es and reserves units (SerpAPI searches, Apify
+    profiles, Gemini requests) before spending them. Grants never exceed the
+    run's caps (`run_caps`, MAX_SERPAPI_QUERIES / MAX_APIFY_SCRAPES /
+    MAX_GEMINI_CALLS by default) or the shared `limits` (units per
+    provider, plus "usd" for the estimated total).
+    Once less than BUDGET_SCARCE_FRACTION of a shared limit is left, the
+    rest is split between active runs in proportion to the approved leads
+    per dollar each has delivered, so the last credits go where they buy
+    the most leads; the best run may always take what is left.
+    """
+
+    def __init__(self, limits: dict[str, float] | None = None, run_caps: dict[str, float] | None = None):
+        self.limits = dict(limits or {})
+        self.run_caps = dict(RUN_CAPS if run_caps is None else run_caps)
+        self._lock = threading.RLock()     # re-entered when a grant checks the allowance
+        self._runs: list[RunBudget] = []
+
+    def attach(self, target_count: int, label: str = "") -> RunBudget:
+        run = RunBudget(self, target_count, label)
+        with self._lock:
+            self._runs.append(run)
+        return run
+
+    def used(self, provider: str) -> float:
+        """Units reserved across all runs ("usd" for the estimated cost)."""
+        with self._lock:
+            return self._used(provider)
+
+    def _used(self, provider: str) -> float:
+        if provider == "usd":
+            return sum(r.usd for r in self._runs)
+        return sum(r.used[provider] for r in self._runs)
+
+    def _share(self, run: RunBudget, left: float, limit: float) -> float:
+        """The part of `left` this run may take (called with the lock held)."""
+        active = [r for r in self._runs if not r.finished]
+        if left >= limit * BUDGET_SCARCE_FRACTION or len(active) <= 1 or run not in active:
+            return left
+        weights = {id(r): (r.approved + 1) / (r.usd + BUDGET_PRIOR_USD) for r in active}
+        if weights[id(run)] >= max(weights.values()):
+            return left
+        return left * weights[id(run)] / sum(weights.values())
+
+    def _allowance(self, run: RunBudget, provider: str, cost: float | None = None) -> int:
+        cost = unit_cost(provider) if cost is None else cost
+        allowance = math.inf
+        with self._lock:
+            if provider in self.run_caps:
+                allowance = self.run_caps[provider] - run.used[provider]
+            if provider in self.limits:
+                left = self.limits[provider] - self._used(provider)
+                allowance = min(allowance, self._share(run, left, self.limits[provider]))
+            if "usd" in self.limits and cost > 0:
+                left = self.limits["usd"] - self._used("usd")
+                allowance = min(allowance, self._share(run, left, self.limits["usd"]) / cost)
+        return int(max(min(allowance, 1_000_000_000), 0))
+
+    def _grant(self, run: RunBudget, provider: str, units: int, cost: float) -> int:
+        with self._lock:
+            granted = min(int(units), self._allowance(run, provider, cost))
+            run.used[provider] += granted
+            run.usd += granted * cost
+        return granted
+
+    def spent_usd(self) -> float:
+        return self.used("usd")
+
+    def projected_usd(self) -> float:
+        """Spend so far plus each active run's projected cost to finish, capped by the USD limit."""
+        with self._lock:
+            runs = list(self._runs)
+        projected = sum(r.projected_usd() for r in runs)
+        return min(projected, self.limits["usd"]) if "usd" in self.limits else projected
+
+    def snapshot(self) -> dict[str, dict]:
+        """{provider: {"used", "limit"}} for every shared limit, plus "usd" with "projected"."""
+        snap = {p: {"used": self.used(p), "limit": limit} for p, limit in self.limits.items() if p != "usd"}
+        snap["usd"] = {"used": self.spent_usd(), "limit": self.limits.get("usd"), "projected": self.projected_usd()}
+        return snap
+
+
+# ──────────────────────────────────────────────
+# LOCAL STORAGE — SQLite helpers
+# ──────────────────────────────────────────────
+
+def _connect_sqlite(filename: str) -> sqlite3.Connection:
+    """Open (creating if needed) a SQLite file under DATA_DIR in WAL mode."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    conn = sqlite3.connect(
+        os.path.join(DATA_DIR, filename), timeout=30, check_same_thread=False
+    )
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+# ──────────────────────────────────────────────
+# SERP CACHE — persistent SerpAPI response cache
+# ──────────────────────────────────────────────
+
+class SerpCache:
+    """
+    On-disk cache of SerpAPI responses keyed on (q, start, gl, hl, num).
+    Entries expire after `ttl_hours`; once more than `max_entries` are stored
+    the least recently used ones are evicted.
+    """
+
+    def __init__(
+        self,
+        filename: str = "serp_cache.db",
+        ttl_hours: float = SERP_CACHE_TTL_HOURS,
+        max_entries: int = SERP_CACHE_MAX_ENTRIES,
+    ):
+        self.ttl_secs = ttl_hours * 3600
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = _connect_sqlite(filename)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS serp_cache (
+                    q TEXT NOT NULL,
+                    start INTEGER NOT NULL,
+                    gl TEXT NOT NULL,
+                    hl TEXT NOT NULL,
+                    num INTEGER NOT NULL,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (q, start, gl, hl, num)
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_serp_cache_access ON serp_cache (last_access)"
+            )
+            self._conn.execute(
+                "DELETE FROM serp_cache WHERE created_at < ?", (time.time() - self.ttl_secs,)
+            )
+
+    @staticmethod
+    def _key(params: dict) -> tuple:
+        return (
+            params.get("q", ""),
+            int(params.get("start", 0) or 0),
+            params.get("gl", ""),
+            params.get("hl", ""),
+            int(params.get("num", 10) or 10),
+        )
+
+    def get(self, params: dict) -> dict | None:
+        """Return the cached response for these search params, or None."""
+        key = self._key(params)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM serp_cache "
+                "WHERE q = ? AND start = ? AND gl = ? AND hl = ? AND num = ?",
+                key,
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl_secs:
+                self.misses += 1
+                return None
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE serp_cache SET last_access = ? "
+                    "WHERE q = ? AND start = ? AND gl = ? AND hl = ? AND num = ?",
+                    (now, *key),
+                )
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, params: dict, response: dict) -> None:
+        """Store a response, evicting least recently used entries past max_entries."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO serp_cache VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (*self._key(params), json.dumps(response), now, now),
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM serp_cache").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM serp_cache WHERE rowid IN ("
+                    "SELECT rowid FROM serp_cache ORDER BY last_access ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+
+    def stats(self) -> dict:
+        """Hit/miss counters for this process plus the current entry count."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM serp_cache").fetchone()[0]
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": entries,
+            }
+
+
+_serp_cache: SerpCache | None = None
+
+
+def get_serp_cache() -> SerpCache | None:
+    """Return the shared SERP cache, or None if the cache file can't be opened."""
+    global _serp_cache
+    if _serp_cache is None:
+        try:
+            _serp_cache = SerpCache()
+        except (OSError, sqlite3.Error):
+            return None
+    return _serp_cache
+
+
+# ──────────────────────────────────────────────
+# SERPAPI QUERY GENERATOR
+# ──────────────────────────────────────────────
+
+QUERY_TEMPLATES = [
+    {"id": "in_subject_role", "query": 'site:linkedin.com/in/ "{subject}" "{role}" India', "role": True, "city": False},
+    {"id": "in_subject_role_board", "query": 'site:linkedin.com/in/ "{subject}" "{role}" CBSE', "role": True, "city": False},
+    {"id": "in_subject_role_city", "query": 'site:linkedin.com/in/ "{subject}" "{role}" {city}', "role": True, "city": True},
+    {"id": "in_role_school_city", "query": 'site:linkedin.com/in/ "{role}" school {city}', "role": True, "city": True},
+    {"id": "company_coaching_city", "query": 'site:linkedin.com/company/ "coaching" "classes" {city}', "role": False, "city": True},
+    {"id": "company_school_city", "query": 'site:linkedin.com/company/ "school" "education" {city}', "role": False, "city": True},
+    {"id": "company_academy_city", "query": 'site:linkedin.com/company/ "academy" "institute" {city}', "role": False, "city": True},
+]
+
+
+class QueryPlanner:
+    """
+    Yield-aware scheduler for SerpAPI queries.
+
+    Every template × role × city combination ("arm") keeps a running count of
+    credits spent and new unique slugs found, persisted across runs. Each
+    round picks the arms with the best expected new slugs per credit, pages
+    deeper into arms that are still producing, and retires arms whose
+    marginal yield has collapsed (they are re-explored after PLANNER_RETRY_DAYS).
+    """
+
+    def __init__(self, subject: str, roles: list, cities: list, filename: str = "query_planner.db"):
+        self.subject = subject.strip()
+        self._subject_key = self.subject.lower()
+        self._lock = threading.Lock()
+        self._stats: dict[str, dict] = {}
+        self._next_start: dict[str, int] = {}
+        self._done: set[str] = set()
+        self._arms = self._build_arms(roles, cities)
+
+        try:
+            self._conn = _connect_sqlite(filename)
+            with self._conn:
+                self._conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS arm_stats (
+                        arm TEXT PRIMARY KEY,
+                        credits INTEGER NOT NULL,
+                        new_slugs INTEGER NOT NULL,
+                        ewma_yield REAL NOT NULL,
+                        updated_at REAL NOT NULL
+                    )
+                    """
+                )
+            keys = [a["arm"] for a in self._arms]
+            for i in range(0, len(keys), 500):
+                chunk = keys[i : i + 500]
+                rows = self._conn.execute(
+                    f"SELECT arm, credits, new_slugs, ewma_yield, updated_at FROM arm_stats "
+                    f"WHERE arm IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                for arm, credits, new_slugs, ewma, updated in rows:
+                    self._stats[arm] = {
+                        "credits": credits, "new_slugs": new_slugs,
+                        "ewma_yield": ewma, "updated_at": updated,
+                    }
+        except (OSError, sqlite3.Error):
+            # No persistent stats — still plan, just without history
+            self._conn = None
+
+    def _build_arms(self, roles: list, cities: list) -> list[dict]:
+        """Expand the templates over the user's role and city selections."""
+        roles = [r for r in (roles or []) if r in ROLE_QUERY_TERMS] or ["All Roles"]
+        if "All Roles" in roles:
+            roles = list(ROLE_QUERY_TERMS)
+        role_terms: list[str] = []
+        for r in roles:
+            for term in ROLE_QUERY_TERMS[r]:
+                if term not in role_terms:
+                    role_terms.append(term)
+        include_companies = any(r in COMPANY_PAGE_ROLES for r in roles)
+
+        city_list = [c for c in (cities or []) if c in INDIAN_CITIES] or list(INDIAN_CITIES)
+
+        arms: list[dict] = []
+        for tpl in QUERY_TEMPLATES:
+            if not tpl["role"] and not include_companies:
+                continue
+            # Arms whose query embeds the subject only share history with that subject
+            scope = self._subject_key if "{subject}" in tpl["query"] else "*"
+            for role in (role_terms if tpl["role"] else [""]):
+                for city in (city_list if tpl["city"] else [""]):
+                    arms.append({
+                        "arm": f"{tpl['id']}|{role}|{city}|{scope}",
+                        "template": tpl["id"],
+                        "q": tpl["query"].format(subject=self.subject, role=role, city=city),
+                    })
+        return arms
+
+    def _expected_yield(self, arm: str) -> float:
+        s = self._stats.get(arm)
+        if not s or s["credits"] == 0:
+            return PLANNER_PRIOR_YIELD
+        if s["credits"] < PLANNER_MIN_CREDITS:
+            return (s["new_slugs"] + PLANNER_PRIOR_YIELD) / (s["credits"] + 1)
+        return s["ewma_yield"]
+
+    def _is_retired(self, arm: str) -> bool:
+        s = self._stats.get(arm)
+        if not s or s["credits"] < PLANNER_MIN_CREDITS:
+            return False
+        if time.time() - s["updated_at"] > PLANNER_RETRY_DAYS * 86400:
+            return False
+        return s["ewma_yield"] < PLANNER_MIN_YIELD
+
+    def next_queries(self, count: int) -> list[dict]:
+        """Pick up to `count` queries ({'q', 'start', 'arm'}) by expected yield."""
+        with self._lock:
+            candidates = [
+                a for a in self._arms
+                if a["arm"] not in self._done
+                and self._next_start.get(a["arm"], 0) <= PLANNER_MAX_START
+                and not self._is_retired(a["arm"])
+            ]
+            scored = [(self._expected_yield(a["arm"]), i, a) for i, a in enumerate(candidates)]
+
+            picked: list[dict] = []
+            per_template: dict[str, int] = {}
+            while scored and len(picked) < count:
+                # Spread a round across templates unless one is clearly better
+                best = max(
+                    scored,
+                    key=lambda t: (t[0] / (1 + 0.5 * per_template.get(t[2]["template"], 0)), -t[1]),
+                )
+                scored.remove(best)
+                arm = best[2]
+                per_template[arm["template"]] = per_template.get(arm["template"], 0) + 1
+                picked.append({
+                    "q": arm["q"],
+                    "start": self._next_start.get(arm["arm"], 0),
+                    "arm": arm["arm"],
+                })
+            return picked
+
+    def record(self, arm: str, new_slugs: int, organic_count: int, credits: int = 1) -> None:
+        """
+        Record the outcome of one query. Cached queries pass credits=0: they
+        advance this run's paging but don't move the persisted yield stats.
+        """
+        with self._lock:
+            if new_slugs > 0 and organic_count > 0:
+                self._next_start[arm] = self._next_start.get(arm, 0) + 10
+            else:
+                self._done.add(arm)
+
+            if credits <= 0:
+                return
+            s = self._stats.setdefault(
+                arm, {"credits": 0, "new_slugs": 0, "ewma_yield": PLANNER_PRIOR_YIELD, "updated_at": 0.0}
+            )
+            marginal = new_slugs / credits
+            s["ewma_yield"] = (
+                marginal if s["credits"] == 0
+                else PLANNER_EWMA_ALPHA * marginal + (1 - PLANNER_EWMA_ALPHA) * s["ewma_yield"]
+            )
+            s["credits"] += credits
+            s["new_slugs"] += new_slugs
+            s["updated_at"] = time.time()
+
+            if self._conn is not None:
+                try:
+                    with self._conn:
+                        self._conn.execute(
+                            "INSERT OR REPLACE INTO arm_stats VALUES (?, ?, ?, ?, ?)",
+                            (arm, s["credits"], s["new_slugs"], s["ewma_yield"], s["updated_at"]),
+                        )
+                except sqlite3.Error:
+                    pass
+
+    def is_exhausted(self) -> bool:
+        """True once every arm is retired, paged out or dry for this run."""
+        return not self.next_queries(1)
+
+    def paging_state(self) -> dict:
+        """This run's page offsets and dry arms, for checkpointing."""
+        with self._lock:
+            return {"next_start": dict(self._next_start), "done": sorted(self._done)}
+
+    def restore_paging(self, state: dict) -> None:
+        """Continue paging from a `paging_state()` snapshot."""
+        with self._lock:
+            self._next_start.update(state.get("next_start", {}))
+            self._done.update(state.get("done", []))
+
+
+def generate_linkedin_queries(
+    subject: str, roles: list, cities: list, round_num: int, planner: QueryPlanner | None = None
+) -> list[dict]:
+    """
+    Pick this round's Google-dork queries from the yield-aware planner.
+    Returns a list of {'q', 'start', 'arm'} dicts; `start` is the SerpAPI page offset.
+    """
+    planner = planner or QueryPlanner(subject, roles, cities)
+    count = QUERIES_FIRST_ROUND if round_num == 0 else QUERIES_PER_ROUND
+    return planner.next_queries(count)
+
+
+# ──────────────────────────────────────────────
+# URL PARSER
+# ──────────────────────────────────────────────
+
+_INDIVIDUAL_RE = re.compile(r'linkedin\.com/in/([a-zA-Z0-9_-]+)', re.IGNORECASE)
+_COMPANY_RE = re.compile(r'linkedin\.com/company/([a-zA-Z0-9_-]+)', re.IGNORECASE)
+
+
+def _norm_url(url_str: str) -> str:
+    """Normalize a LinkedIn URL to just the username/slug for matching."""
+    url_str = (url_str or "").lower().strip().rstrip("/")
+    # Extract username from /in/username or /company/slug
+    m = re.search(r'linkedin\.com/in/([a-z0-9_-]+)', url_str)
+    if m:
+        return f"in/{m.group(1)}"
+    m = re.search(r'linkedin\.com/company/([a-z0-9_-]+)', url_str)
+    if m:
+        return f"company/{m.group(1)}"
+    return url_str
+
+
+def extract_linkedin_info_from_url(url: str, snippet: str = "", title: str = "") -> dict | None:
+    """
+    Parse a SerpAPI organic result into a profile dict.
+    Returns None if the URL is a system page or invalid.
+    """
+    url = (url or "").strip()
+    if not url:
+        return None
+
+    # Determine profile type
+    ind_match = _INDIVIDUAL_RE.search(url)
+    comp_match = _COMPANY_RE.search(url)
+
+    if ind_match:
+        username = ind_match.group(1).lower()
+        if username in SYSTEM_PAGES:
+            return None
+        profile_type = "individual"
+        normalized_url = f"https://www.linkedin.com/in/{username}"
+    elif comp_match:
+        slug = comp_match.group(1).lower()
+        if slug in SYSTEM_PAGES:
+            return None
+        profile_type = "company"
+        normalized_url = f"https://www.linkedin.com/company/{slug}"
+    else:
+        return None
+
+    # Parse title  (typical: "FirstName LastName - Role - Company | LinkedIn")
+    name, headline, organization = "", "", ""
+    if title:
+        title_clean = title.replace(" | LinkedIn", "").replace("| LinkedIn", "").strip()
+        parts = [p.strip() for p in title_clean.split(" - ")]
+        if len(parts) >= 1:
+            name = parts[0]
+        if len(parts) >= 2:
+            headline = parts[1]
+        if len(parts) >= 3:
+            organization = parts[2]
+
+    return {
+        "url": normalized_url,
+        "name": name,
+        "headline": headline,
+        "organization": organization,
+        "profile_type": profile_type,
+        "snippet": (snippet or "")[:300],
+    }
+
+
+# ──────────────────────────────────────────────
+# SERPAPI DISCOVERY
+# ──────────────────────────────────────────────
+
+def _serpapi_fatal_error(err) -> str:
+    """Classify a SerpAPI failure: 'invalid_key', 'quota' or '' (non-fatal)."""
+    err_str = str(err).lower()
+    if any(kw in err_str for kw in ["invalid", "key", "unauthorized"]):
+        return "invalid_key"
+    if any(kw in err_str for kw in ["quota", "limit", "exceeded"]):
+        return "quota"
+    return ""
+
+
+def _run_serpapi_query(
+    params: dict,
+    rate_limiter: TokenBucket,
+    stop_event: threading.Event,
+    cache: SerpCache | None = None,
+    metrics: Metrics | None = None,
+    budget: RunBudget | None = None,
+) -> tuple[dict | None, bool]:
+    """
+    Run one SerpAPI search, serving it from the cache when possible.
+    Returns (results, from_cache); results is None if discovery was aborted
+    or `budget` granted no search before the query was sent.
+    Raises on transport errors and on fatal errors reported in the response body.
+    """
+    from serpapi import GoogleSearch
+
+    metrics = metrics or Metrics()
+    if cache is not None:
+        cached = cache.get(params)
+        metrics.inc("cache_lookups", cache="serp", result="miss" if cached is None else "hit")
+        if cached is not None:
+            return cached, True
+
+    if not rate_limiter.acquire(stop_event):
+        return None, False
+    if budget is not None and not budget.reserve("serpapi", 1):
+        return None, False
+
+    start = time.monotonic()
+    try:
+        results = GoogleSearch(params).get_dict()
+    except Exception as e:
+        metrics.inc("provider_requests", provider="serpapi", outcome=_serpapi_fatal_error(e) or "error")
+        raise
+    finally:
+        metrics.observe("provider_latency_seconds", time.monotonic() - start, provider="serpapi")
+    metrics.inc("credits", provider="serpapi")
+    error = results.get("error", "")
+    fatal = _serpapi_fatal_error(error) if error else ""
+    metrics.inc("provider_requests", provider="serpapi", outcome=fatal or ("empty" if error else "ok"))
+    # SerpAPI reports bad keys / exhausted plans in the body rather than raising
+    if fatal:
+        raise RuntimeError(error)
+    # Only cache real answers ("no results" is one); transient errors are retried next time
+    if cache is not None and (not error or "returned any results" in error.lower()):
+        cache.put(params, results)
+    return results, False
+
+
+def discover_via_serpapi(
+    subject: str,
+    roles: list,
+    cities: list,
+    serpapi_key: str,
+    status_container,
+    round_num: int = 0,
+    rate_limiter: TokenBucket | None = None,
+    max_workers: int = SERPAPI_MAX_WORKERS,
+    use_cache: bool = True,
+    planner: QueryPlanner | None = None,
+    known_urls=None,
+    metrics: Metrics | None = None,
+    budget: RunBudget | None = None,
+) -> list:
+    """
+    Execute SerpAPI queries for one round and return a list of unique
+    LinkedIn profile dicts.
+    Queries fan out over a thread pool; the token bucket (not fixed sleeps)
+    governs the request rate. Cached responses skip the bucket entirely.
+    Results are merged in query order, and the round aborts as soon as any
+    query reports an invalid key or exhausted quota.
+    Each query's new slugs (not in `known_urls` — a set or LeadStore — or
+    earlier queries) are reported back to the planner so later rounds favour
+    productive queries.
+    Requests, credits, latency and cache hits are recorded in `metrics`;
+    every uncached query needs a search granted by `budget`.
+    """
+    planner = planner or QueryPlanner(subject, roles, cities)
+    queries = generate_linkedin_queries(subject, roles, cities, round_num, planner)
+    known_urls = known_urls or set()
+    rate_limiter = rate_limiter or _serpapi_bucket
+    cache = get_serp_cache() if use_cache else None
+    stop_event = threading.Event()
+    cache_hits = 0
+
+    all_profiles: list[dict] = []
+    seen_urls: set[str] = set()
+    results_by_index: dict[int, dict] = {}
+    cached_indexes: set[int] = set()
+    fatal = ""
+
+    def _params(query: dict) -> dict:
+        params = {
+            "q": query["q"],
+            "api_key": serpapi_key,
+            "engine": "google",
+            "num": 20,
+            "gl": "in",
+            "hl": "en",
+        }
+        if query["start"]:
+            params["start"] = query["start"]
+        return params
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(queries) or 1)))
+    try:
+        futures = {
+            executor.submit(_run_serpapi_query, _params(q), rate_limiter, stop_event, cache, metrics, budget): i
+            for i, q in enumerate(queries)
+        }
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                results, from_cache = future.result()
+            except Exception as e:
+                fatal = _serpapi_fatal_error(e)
+                if fatal:
+                    stop_event.set()
+                    break
+                status_container.write(f"⚠ï¸ SerpAPI error: {e}")
+                continue
+            if results is None:
+                continue
+            results_by_index[i] = results
+            if from_cache:
+                cached_indexes.add(i)
+                cache_hits += 1
+            status_container.write(
+                f"🔍 Query {i+1}/{len(queries)} → {len(results.get('organic_results', []))} results"
+                + (" (cached)" if from_cache else "")
+            )
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    if fatal == "invalid_key":
+        status_container.write("❌ SerpAPI: Invalid API key.")
+    elif fatal == "quota":
+        status_container.write("⚠ï¸ SerpAPI quota exhausted.")
+
+    for i in sorted(results_by_index):
+        organic = results_by_index[i].get("organic_results", [])
+        new_slugs = 0
+        for item in organic:
+            profile = extract_linkedin_info_from_url(
+                item.get("link", ""),
+                item.get("snippet", ""),
+                item.get("title", ""),
+            )
+            if profile and profile["url"] not in seen_urls:
+                seen_urls.add(profile["url"])
+                all_profiles.append(profile)
+                if profile["url"] not in known_urls:
+                    new_slugs += 1
+        planner.record(
+            queries[i]["arm"], new_slugs, len(organic),
+            credits=0 if i in cached_indexes else 1,
+        )
+
+    if fatal:
+        return all_profiles
+
+    status_container.write(
+        f"📊 Round {round_num} discovery: {len(all_profiles)} unique profiles found "
+        f"({cache_hits}/{len(queries)} queries served from cache)"
+    )
+    return all_profiles
+
+
+# ──────────────────────────────────────────────
+# DEDUPLICATION — Master CSV / Parquet
+# ──────────────────────────────────────────────
+
+class SlugSet:
+    """
+    Compact membership set for normalized slugs / names.
+    Holds a sorted numpy array of 64-bit hashes (8 bytes per entry, no
+    per-string objects). At 64 bits a false positive needs a hash
+    collision, which is negligible at master-list sizes.
+    """
+
+    def __init__(self, hashes=None, normalize=None):
+        self._hashes = np.unique(hashes) if hashes is not None and len(hashes) else np.empty(0, dtype=np.uint64)
+        self._normalize = normalize
+
+    @staticmethod
+    def hash_values(values) -> np.ndarray:
+        """Vectorized, process-stable 64-bit hashes of string values."""
+        import pandas as pd
+
+        return pd.util.hash_array(np.asarray(values, dtype=object))
+
+    def __contains__(self, value) -> bool:
+        if not len(self._hashes):
+            return False
+        key = self._normalize(value) if self._normalize else str(value)
+        h = self.hash_values([key])[0]
+        i = np.searchsorted(self._hashes, h)
+        return bool(i < len(self._hashes) and self._hashes[i] == h)
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+
+def _norm_url_series(values: "pd.Series") -> "pd.Series":
+    """Vectorized `_norm_url` over a column of URLs."""
+    urls = values.astype(str).str.lower().str.strip().str.rstrip("/")
+    ind = urls.str.extract(r'linkedin\.com/in/([a-z0-9_-]+)', expand=False)
+    comp = urls.str.extract(r'linkedin\.com/company/([a-z0-9_-]+)', expand=False)
+    return ("in/" + ind).fillna("company/" + comp).fillna(urls)
+
+
+def _detect_lead_columns(columns) -> tuple[str | None, str | None]:
+    """Pick the LinkedIn URL column and the name column from a header row."""
+    url_col = None
+    for col in columns:
+        if "linkedin" in col.lower() and "url" in col.lower():
+            url_col = col
+            break
+    if url_col is None:
+        for col in columns:
+            if "url" in col.lower() or "link" in col.lower():
+                url_col = col
+                break
+
+    name_col = None
+    for col in columns:
+        if col.lower() in ["name", "full name", "full_name", "fullname"]:
+            name_col = col
+            break
+    return url_col, name_col
+
+
+def _iter_master_chunks(source, chunk_rows: int):
+    """
+    Read a master lead file from an open binary file — CSV, gzip'd CSV or
+    Parquet, sniffed from the magic bytes — and return (url_col, name_col,
+    chunk_iterator). Only the URL / name columns are read, `chunk_rows` rows
+    at a time; the file must stay open until the iterator is exhausted.
+    """
+    import pandas as pd
+
+    magic = source.read(4)
+    source.seek(0)
+
+    if magic == b"PAR1":
+        import pyarrow.parquet as pq
+
+        pf = pq.ParquetFile(source)
+        url_col, name_col = _detect_lead_columns(pf.schema_arrow.names)
+        cols = [c for c in (url_col, name_col) if c]
+        chunks = (
+            batch.to_pandas() for batch in pf.iter_batches(batch_size=chunk_rows, columns=cols)
+        ) if cols else iter(())
+        return url_col, name_col, chunks
+
+    compression = "gzip" if magic[:2] == b"\x1f\x8b" else None
+    header = pd.read_csv(source, nrows=0, compression=compression)
+    source.seek(0)
+    url_col, name_col = _detect_lead_columns(header.columns)
+    cols = [c for c in (url_col, name_col) if c]
+    chunks = pd.read_csv(
+        source, usecols=cols, dtype=str, chunksize=chunk_rows, compression=compression
+    ) if cols else iter(())
+    return url_col, name_col, chunks
+
+
+def load_existing_linkedin_leads(
+    uploaded_file, on_url_chunk=None, chunk_rows: int = MASTER_CSV_CHUNK_ROWS
+) -> tuple[SlugSet, SlugSet, int, str]:
+    """
+    Stream a master lead file (CSV, .csv.gz or Parquet) and return:
+      (existing_urls, existing_names, count, error_message)
+    URLs are normalized to `in/<slug>` / `company/<slug>` like `_norm_url`;
+    both sets are compact SlugSets, so memory stays flat however wide the
+    file is. `on_url_chunk(keys)` receives each chunk's normalized URL keys.
+    """
+    url_hashes: list[np.ndarray] = []
+    name_hashes: list[np.ndarray] = []
+    error_msg = ""
+
+    try:
+        # A path is opened (and closed) here; an uploaded file object stays the caller's
+        if isinstance(uploaded_file, (str, os.PathLike)):
+            opened = open(uploaded_file, "rb")
+        else:
+            opened = nullcontext(uploaded_file)
+        with opened as source:
+            url_col, name_col, chunks = _iter_master_chunks(source, chunk_rows)
+            if not url_col:
+                error_msg = "⚠ï¸ No URL/Link column found in CSV. Dedup by URL skipped."
+
+            for chunk in chunks:
+                if url_col:
+                    keys = _norm_url_series(chunk[url_col].dropna())
+                    if len(keys):
+                        url_hashes.append(SlugSet.hash_values(keys))
+                        if on_url_chunk:
+                            on_url_chunk(keys.tolist())
+                if name_col:
+                    names = chunk[name_col].dropna().astype(str).str.strip().str.lower()
+                    if len(names):
+                        name_hashes.append(SlugSet.hash_values(names))
+
+    except Exception as e:
+        error_msg = f"❌ Error reading CSV: {e}"
+
+    existing_urls = SlugSet(np.concatenate(url_hashes) if url_hashes else None, normalize=_norm_url)
+    existing_names = SlugSet(
+        np.concatenate(name_hashes) if name_hashes else None,
+        normalize=lambda n: str(n).strip().lower(),
+    )
+    return existing_urls, existing_names, len(existing_urls), error_msg
+
+
+# ──────────────────────────────────────────────
+# DEDUPLICATION — Persistent Lead Store
+# ──────────────────────────────────────────────
+
+class LeadStore:
+    """
+    Embedded SQLite lead store indexed by normalized `in/<slug>` / `company/<slug>`.
+    Records every profile the pipeline touches with its latest status
+    (imported, discovered, enriched, rejected, approved) and timestamps, so
+    dedup survives restarts and is shared by every session using DATA_DIR.
+    """
+
+    STATUSES = ("imported", "discovered", "enriched", "rejected", "approved")
+
+    def __init__(self, filename: str = "leads.db"):
+        self._lock = threading.Lock()
+        self._conn = _connect_sqlite(filename)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS leads (
+                    lead_key TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    profile_type TEXT NOT NULL DEFAULT '',
+                    name TEXT NOT NULL DEFAULT '',
+                    status TEXT NOT NULL,
+                    reason TEXT NOT NULL DEFAULT '',
+                    subject TEXT NOT NULL DEFAULT '',
+                    data TEXT,
+                    first_seen REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                ) WITHOUT ROWID
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_leads_status ON leads (status, updated_at)"
+            )
+
+    @staticmethod
+    def key_for(url: str) -> str:
+        """Normalized store key for a LinkedIn URL, or '' if it isn't a profile/company URL."""
+        key = _norm_url(url)
+        return key if key.startswith(("in/", "company/")) else ""
+
+    def __contains__(self, url) -> bool:
+        """True if any run has seen this URL, except for claims that may be taken again."""
+        key = self.key_for(url)
+        if not key:
+            return False
+        stale_before = time.time() - LEAD_CLAIM_TTL_HOURS * 3600
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM leads WHERE lead_key = ? AND NOT (status = 'discovered' AND updated_at < ?)",
+                (key, stale_before),
+            ).fetchone()
+        return row is not None
+
+    def claim_new(self, profiles: list[dict], subject: str = "") -> list[dict]:
+        """
+        Atomically record discovered profiles and return the ones this call
+        claimed, i.e. that no run (in this or another session) has seen before.
+        A 'discovered' claim older than LEAD_CLAIM_TTL_HOURS was abandoned
+        mid-run and may be claimed again.
+        """
+        now = time.time()
+        stale_before = now - LEAD_CLAIM_TTL_HOURS * 3600
+        claimed: list[dict] = []
+        with self._lock, self._conn:
+            for p in profiles:
+                key = self.key_for(p.get("url", ""))
+                if not key:
+                    continue
+                cur = self._conn.execute(
+                    """
+                    INSERT INTO leads (lead_key, url, profile_type, name, status, subject, first_seen, updated_at)
+                    VALUES (?, ?, ?, ?, 'discovered', ?, ?, ?)
+                    ON CONFLICT(lead_key) DO UPDATE SET updated_at = excluded.updated_at
+                    WHERE leads.status = 'discovered' AND leads.updated_at < ?
+                    """,
+                    (key, p["url"], p.get("profile_type", ""), p.get("name", ""),
+                     subject, now, now, stale_before),
+                )
+                if cur.rowcount:
+                    claimed.append(p)
+        return claimed
+
+    def mark(self, profiles: list[dict], status: str, reasons: list[str] | None = None) -> None:
+        """Update the status (and snapshot) of already-claimed profiles."""
+        if status not in self.STATUSES:
+            raise ValueError(f"Unknown lead status: {status}")
+        now = time.time()
+        reasons = reasons or [""] * len(profiles)
+        with self._lock, self._conn:
+            for p, reason in zip(profiles, reasons):
+                key = self.key_for(p.get("url") or p.get("linkedin_url", ""))
+                if not key:
+                    continue
+                self._conn.execute(
+                    """
+                    INSERT INTO leads (lead_key, url, profile_type, name, status, reason, data, first_seen, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(lead_key) DO UPDATE SET
+                        status = excluded.status, reason = excluded.reason,
+                        name = excluded.name, data = excluded.data, updated_at = excluded.updated_at
+                    """,
+                    (key, p.get("url") or p.get("linkedin_url", ""), p.get("profile_type", ""),
+                     p.get("full_name") or p.get("name", ""), status, reason,
+                     json.dumps(p, default=str), now, now),
+                )
+
+    def release(self, profiles: list[dict]) -> None:
+        """
+        Hand back claims on profiles this run will not finish (e.g. its Gemini
+        budget ran out before they were classified), so the next run that
+        discovers them claims them again instead of skipping them for good.
+        """
+        with self._lock, self._conn:
+            for p in profiles:
+                key = self.key_for(p.get("url") or p.get("linkedin_url", ""))
+                if key:
+                    self._conn.execute(
+                        "UPDATE leads SET status = 'discovered', updated_at = 0 "
+                        "WHERE lead_key = ? AND status IN ('discovered', 'enriched')",
+                        (key,),
+                    )
+
+    def import_urls(self, urls) -> int:
+        """Seed the store from an existing master list; returns how many keys were new."""
+        now = time.time()
+        added = 0
+        with self._lock, self._conn:
+            for url in urls:
+                key = self.key_for(str(url))
+                if not key:
+                    continue
+                cur = self._conn.execute(
+                    "INSERT OR IGNORE INTO leads (lead_key, url, status, first_seen, updated_at) "
+                    "VALUES (?, ?, 'imported', ?, ?)",
+                    (key, f"https://www.linkedin.com/{key}", now, now),
+                )
+                added += cur.rowcount
+        return added
+
+    def counts(self) -> dict:
+        """Number of stored leads per status."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM leads GROUP BY status"
+            ).fetchall()
+        return {status: n for status, n in rows}
+
+    def approved_leads(self, limit: int = 1000) -> list[dict]:
+        """Most recently approved leads, newest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM leads WHERE status = 'approved' AND data IS NOT NULL "
+                "ORDER BY updated_at DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+
+_lead_store: LeadStore | None = None
+
+
+def get_lead_store() -> LeadStore:
+    """Return the shared lead store, opening it on first use."""
+    global _lead_store
+    if _lead_store is None:
+        _lead_store = LeadStore()
+    return _lead_store
+
+
+# ──────────────────────────────────────────────
+# IDENTITY INDEX — one lead id per person or page
+# ──────────────────────────────────────────────
+
+_IDENTITY_WORD_RE = re.compile(r"[a-z0-9]+")
+_IDENTITY_HONORIFICS = frozenset({"dr", "mr", "mrs", "ms", "miss", "prof", "er", "ca"})
+
+
+def _identity_name(name: str) -> str:
+    """Lowercased name tokens without honorifics; '' unless at least first and last name remain."""
+    tokens = [t for t in _IDENTITY_WORD_RE.findall((name or "").lower()) if t not in _IDENTITY_HONORIFICS]
+    return " ".join(tokens) if len(tokens) >= 2 else ""
+
+
+class IdentityIndex:
+    """
+    Maps every observed alias of a person or company page to one canonical
+    lead id — the LeadStore key (`in/<slug>`, `company/<slug>`) it was first
+    claimed under. Aliases are:
+
+      strong  URL keys in any form `_norm_url` accepts (www / in. / country
+              hosts, trailing paths) and the actor-reported publicIdentifier,
+              as `in/<id>`; lead ids sharing a strong alias are merged
+      weak    `name:<normalized name>|<normalized company>` for scraped
+              individuals only; SERP titles are too coarse (two teachers of
+              the same name at one school), so a discovered profile has none.
+              First writer wins, and they only resolve when no strong one does
+
+    Discovery therefore drops a profile only when one of its URL forms
+    already belongs to another known lead; enrichment keys its cache and
+    merges scrape results by lead id, using the weak alias as a merge hint
+    for results whose URL changed, so a vanity-slug change or an actor
+    returning a different URL form doesn't send the same person to Apify again.
+    """
+
+    def __init__(self, filename: str = "identity.db"):
+        self.alias_hits = 0
+        self._lock = threading.Lock()
+        self._conn = _connect_sqlite(filename)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS identity_aliases (
+                    alias TEXT PRIMARY KEY,
+                    lead_id TEXT NOT NULL,
+                    strong INTEGER NOT NULL,
+                    created_at REAL NOT NULL
+                ) WITHOUT ROWID
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_identity_lead ON identity_aliases (lead_id)")
+
+    @staticmethod
+    def aliases(profile: dict) -> tuple[list[str], list[str]]:
+        """(strong, weak) aliases of a discovered or scraped profile, strongest first; weak is empty until scraped."""
+        strong: list[str] = []
+        for field in ("url", "linkedin_url"):
+            key = LeadStore.key_for(profile.get(field) or "")
+            if key and key not in strong:
+                strong.append(key)
+        public_id = (profile.get("public_identifier") or profile.get("publicIdentifier") or "").strip().lower()
+        if public_id and f"in/{public_id}" not in strong and profile.get("profile_type", "individual") == "individual":
+            strong.append(f"in/{public_id}")
+
+        weak: list[str] = []
+        if profile.get("profile_type", "individual") == "individual" and profile.get("enrichment_status") == "enriched":
+            name = _identity_name(profile.get("full_name") or profile.get("name") or "")
+            company = " ".join(_IDENTITY_WORD_RE.findall(
+                (profile.get("current_company") or profile.get("organization") or "").lower()
+            ))
+            if name and company:
+                weak.append(f"name:{name}|{company}")
+        return strong, weak
+
+    def _lookup(self, aliases: list[str]) -> dict[str, str]:
+        """{alias: lead_id} for the aliases already indexed. Caller holds the lock."""
+        if not aliases:
+            return {}
+        rows = self._conn.execute(
+            f"SELECT alias, lead_id FROM identity_aliases WHERE alias IN ({','.join('?' * len(aliases))})",
+            aliases,
+        ).fetchall()
+        return dict(rows)
+
+    def resolve(self, profile: dict) -> str | None:
+        """Lead id of a profile's first indexed alias (strong before weak), or None."""
+        strong, weak = self.aliases(profile)
+        with self._lock:
+            found = self._lookup(strong + weak)
+        for alias in strong + weak:
+            if alias in found:
+                return found[alias]
+        return None
+
+    def link(self, profile: dict, lead_id: str | None = None) -> str | None:
+        """
+        Record a profile's aliases under `lead_id` (default: the lead id they
+        already resolve to, else the profile's own URL key), merging any
+        other lead id that holds one of its strong aliases. Returns the
+        lead id, or None if the profile has no usable alias.
+        """
+        strong, weak = self.aliases(profile)
+        if not strong and not weak:
+            return None
+        now = time.time()
+        with self._lock, self._conn:
+            found = self._lookup(strong + weak)
+            if lead_id is None:
+                lead_id = next((found[a] for a in strong + weak if a in found), None) or (strong or weak)[0]
+            for other in {found[a] for a in strong if a in found} - {lead_id}:
+                self._conn.execute(
+                    "UPDATE identity_aliases SET lead_id = ? WHERE lead_id = ?", (lead_id, other)
+                )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO identity_aliases VALUES (?, ?, ?, ?)",
+                [(a, lead_id, 1, now) for a in strong] + [(a, lead_id, 0, now) for a in weak],
+            )
+        return lead_id
+
+    def split_aliases(self, profiles: list[dict], known) -> tuple[list[dict], list[dict]]:
+        """
+        Split discovered profiles into (new, aliases): aliases resolve to a
+        lead other than their own URL key that is in `known` (e.g. the lead
+        store), or share a strong alias with an earlier profile of the list.
+        Only URL forms count here; a shared name and company is not enough.
+        """
+        new: list[dict] = []
+        dupes: list[dict] = []
+        seen: set[str] = set()
+        for p in profiles:
+            strong, _ = self.aliases(p)
+            own = strong[0] if strong else ""
+            lead_id = self.resolve(p)
+            known_elsewhere = lead_id and lead_id != own and f"https://www.linkedin.com/{lead_id}" in known
+            if known_elsewhere or seen.intersection(strong):
+                dupes.append(p)
+                continue
+            seen.update(strong)
+            new.append(p)
+        with self._lock:
+            self.alias_hits += len(dupes)
+        return new, dupes
+
+
+_identity_index: IdentityIndex | None = None
+
+
+def get_identity_index() -> IdentityIndex | None:
+    """Return the shared identity index, or None if its file can't be opened."""
+    global _identity_index
+    if _identity_index is None:
+        try:
+            _identity_index = IdentityIndex()
+        except (OSError, sqlite3.Error):
+            return None
+    return _identity_index
+
+
+# ──────────────────────────────────────────────
+# RUN CHECKPOINTS — resume interrupted runs
+# ──────────────────────────────────────────────
+
+def run_fingerprint(subject: str, roles: list, cities: list, target_count: int, use_serp_gate: bool = True) -> str:
+    """Stable id for a run's parameters; runs with the same fingerprint share a checkpoint."""
+    params = {
+        "subject": subject.strip().lower(),
+        "roles": sorted(roles or []),
+        "cities": sorted(cities or []),
+        "target_count": int(target_count),
+        "use_serp_gate": bool(use_serp_gate),
+    }
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def key_fingerprint(key: str) -> str:
+    """Short hash identifying an API key, so keys are never written to disk."""
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:12]
+
+
+class RunCheckpointStore:
+    """
+    Durable snapshots of in-progress `smart_fetch_linkedin_profiles` runs,
+    keyed by `run_fingerprint`. A run saves its state after every stage
+    transition and clears it on completion; a later run with the same
+    parameters resumes from the snapshot instead of paying for the same
+    searches, scrapes and classifications again. Snapshots older than
+    CHECKPOINT_TTL_HOURS are ignored, since the lead store has released
+    the run's claims by then.
+    """
+
+    def __init__(self, filename: str = "checkpoints.db", ttl_hours: float = CHECKPOINT_TTL_HOURS):
+        self.ttl_secs = ttl_hours * 3600
+        self._lock = threading.Lock()
+        self._active: set[str] = set()
+        self._conn = _connect_sqlite(filename)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS run_checkpoints (
+                    fingerprint TEXT PRIMARY KEY,
+                    subject TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                "DELETE FROM run_checkpoints WHERE updated_at < ?", (time.time() - self.ttl_secs,)
+            )
+
+    def acquire(self, fingerprint: str) -> bool:
+        """Reserve a fingerprint for one run in this process; False if another run holds it."""
+        with self._lock:
+            if fingerprint in self._active:
+                return False
+            self._active.add(fingerprint)
+            return True
+
+    def release(self, fingerprint: str) -> None:
+        with self._lock:
+            self._active.discard(fingerprint)
+
+    def load(self, fingerprint: str) -> dict | None:
+        """The saved state for these run parameters, or None if there is no fresh one."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state, updated_at FROM run_checkpoints WHERE fingerprint = ?", (fingerprint,)
+            ).fetchone()
+        if row is None or time.time() - row[1] > self.ttl_secs:
+            return None
+        state = json.loads(row[0])
+        state["saved_at"] = row[1]
+        return state
+
+    def save(self, fingerprint: str, subject: str, state: dict) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO run_checkpoints VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(fingerprint) DO UPDATE SET
+                    subject = excluded.subject, state = excluded.state, updated_at = excluded.updated_at
+                """,
+                (fingerprint, subject, json.dumps(state, default=str), now, now),
+            )
+
+    def clear(self, fingerprint: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM run_checkpoints WHERE fingerprint = ?", (fingerprint,))
+
+
+_checkpoint_store: RunCheckpointStore | None = None
+
+
+def get_checkpoint_store() -> RunCheckpointStore | None:
+    """Return the shared checkpoint store, or None if the file can't be opened."""
+    global _checkpoint_store
+    if _checkpoint_store is None:
+        try:
+            _checkpoint_store = RunCheckpointStore()
+        except (OSError, sqlite3.Error):
+            return None
+    return _checkpoint_store
+
+
+# ──────────────────────────────────────────────
+# APIFY ACTOR HEALTH — adaptive actor routing
+# ──────────────────────────────────────────────
+
+# Run outcomes that say something about the actor itself; rate limits, quota
+# errors and budget stops are the key's or the run's doing and are not recorded
+ACTOR_OUTCOMES = ("ok", "empty", "timeout", "error")
+
+
+class ActorHealthTracker:
+    """
+    Rolling per-actor run history (the last ACTOR_HEALTH_WINDOW runs), kept in
+    SQLite so it carries across sessions. A run is "ok" if it produced at
+    least one usable profile; "empty", "timeout" and "error" runs count as
+    failures.
+
+    `route(actors)` orders actors by expected cost per usable profile — billed
+    cost per usable profile divided by success rate, since a failed run costs
+    a retry on another actor — with untried actors scored at an optimistic
+    prior so they get explored. ACTOR_BREAKER_FAILURES consecutive failures
+    open an actor's circuit: it is skipped for ACTOR_BREAKER_COOLDOWN_SECS,
+    then a single batch is let through as a trial, which closes the circuit
+    on success or reopens it on failure.
+    """
+
+    def __init__(self, filename: str = "actor_health.db", window: int = ACTOR_HEALTH_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._runs: dict[str, deque] = {}
+        self._trials: dict[str, float] = {}
+        self._conn = _connect_sqlite(filename)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS actor_runs (
+                    actor TEXT NOT NULL,
+                    finished_at REAL NOT NULL,
+                    outcome TEXT NOT NULL,
+                    latency REAL NOT NULL,
+                    requested INTEGER NOT NULL,
+                    items INTEGER NOT NULL,
+                    usable INTEGER NOT NULL,
+                    cost REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS actor_runs_by_actor ON actor_runs (actor, finished_at)")
+            rows = self._conn.execute(
+                "SELECT actor, finished_at, outcome, latency, requested, items, usable, cost "
+                "FROM actor_runs ORDER BY finished_at"
+            ).fetchall()
+            for actor, *run in rows:
+                self._runs.setdefault(actor, deque(maxlen=window)).append(tuple(run))
+            # Drop rows that have rolled out of every actor's window
+            for actor, runs in self._runs.items():
+                self._conn.execute(
+                    "DELETE FROM actor_runs WHERE actor = ? AND finished_at < ?", (actor, runs[0][0])
+                )
+
+    def record(
+        self, actor_id: str, outcome: str, latency: float, requested: int, items: int, usable: int, cost: float
+    ) -> None:
+        """Add one finished run (outcome from ACTOR_OUTCOMES) to the actor's history."""
+        run = (time.time(), outcome, latency, requested, items, usable, cost)
+        with self._lock, self._conn:
+            self._runs.setdefault(actor_id, deque(maxlen=self.window)).append(run)
+            self._trials.pop(actor_id, None)
+            self._conn.execute("INSERT INTO actor_runs VALUES (?, ?, ?, ?, ?, ?, ?, ?)", (actor_id, *run))
+
+    def _stats(self, actor: dict) -> dict:
+        """Health summary of one actor. Caller holds the lock."""
+        runs = list(self._runs.get(actor["id"], ()))
+        price = actor.get("cost_per_1k", APIFY_COST_PER_PROFILE * 1000) / 1000
+        ok = [r for r in runs if r[1] == "ok"]
+        latencies = sorted(r[2] for r in ok)
+
+        def _quantile(q: float) -> float | None:
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else None
+
+        requested = sum(r[3] for r in runs)
+        usable = sum(r[5] for r in runs)
+        success_rate = (len(ok) + ACTOR_PRIOR_RUNS) / (len(runs) + ACTOR_PRIOR_RUNS)
+        cost_per_usable = (sum(r[6] for r in runs) + ACTOR_PRIOR_PROFILES * price) / (
+            usable + ACTOR_PRIOR_PROFILES * ACTOR_PRIOR_USABLE_RATIO
+        )
+
+        failures = 0
+        for run in reversed(runs):
+            if run[1] == "ok":
+                break
+            failures += 1
+        if failures < ACTOR_BREAKER_FAILURES:
+            circuit = "closed"
+        elif time.time() - runs[-1][0] < ACTOR_BREAKER_COOLDOWN_SECS:
+            circuit = "open"
+        else:
+            circuit = "half-open"
+
+        return {
+            "actor": actor["id"],
+            "label": actor["label"],
+            "runs": len(runs),
+            "success_rate": success_rate,
+            "p50_secs": _quantile(0.5),
+            "p95_secs": _quantile(0.95),
+            "usable_ratio": usable / requested if requested else None,
+            "cost_per_usable": cost_per_usable,
+            "expected_cost": cost_per_usable / success_rate,
+            "consecutive_failures": failures,
+            "circuit": circuit,
+            "deadline_secs": self._deadline(latencies),
+        }
+
+    @staticmethod
+    def _deadline(ok_latencies: list[float]) -> float:
+        """Run deadline from the actor's successful-run p95, once there are enough of them."""
+        if len(ok_latencies) < ACTOR_DEADLINE_MIN_RUNS:
+            return APIFY_RUN_DEADLINE_SECS
+        p95 = ok_latencies[min(len(ok_latencies) - 1, int(0.95 * len(ok_latencies)))]
+        return min(APIFY_RUN_DEADLINE_SECS, max(ACTOR_DEADLINE_FLOOR_SECS, ACTOR_DEADLINE_P95_MULTIPLE * p95))
+
+    def route(self, actors: list[dict]) -> list[tuple[dict, float]]:
+        """
+        (actor, deadline_secs) pairs to try for one batch, cheapest expected
+        cost per usable profile first (faster p50 breaks ties). Open circuits
+        are left out; a half-open actor is included for one batch at a time.
+        """
+        now = time.monotonic()
+        ranked = []
+        with self._lock:
+            for actor in actors:
+                s = self._stats(actor)
+                if s["circuit"] == "open":
+                    continue
+                if s["circuit"] == "half-open":
+                    # One trial at a time; a claim lapses if its batch never reached the actor
+                    claimed = self._trials.get(actor["id"])
+                    if claimed is not None and now - claimed < APIFY_RUN_DEADLINE_SECS + 60:
+                        continue
+                    self._trials[actor["id"]] = now
+                ranked.append((s["expected_cost"], s["p50_secs"] or 0.0, actor, s["deadline_secs"]))
+        ranked.sort(key=lambda r: r[:2])
+        return [(actor, deadline) for _, _, actor, deadline in ranked]
+
+    def stats(self, actors: list[dict] | None = None) -> list[dict]:
+        """Health summary per actor, in routing order."""
+        actors = actors if actors is not None else APIFY_PROFILE_ACTORS
+        with self._lock:
+            rows = [self._stats(a) for a in actors]
+        return sorted(rows, key=lambda s: (s["circuit"] == "open", s["expected_cost"]))
+
+
+_actor_health: ActorHealthTracker | None = None
+
+
+def get_actor_health() -> ActorHealthTracker | None:
+    """Return the shared actor health tracker, or None if its file can't be opened."""
+    global _actor_health
+    if _actor_health is None:
+        try:
+            _actor_health = ActorHealthTracker()
+        except (OSError, sqlite3.Error):
+            return None
+    return _actor_health
+
+
+# ──────────────────────────────────────────────
+# APIFY KEY LEDGER — per-key credit and exhaustion
+# ──────────────────────────────────────────────
+
+class ApifyKeyLedger:
+    """
+    Credit state of every Apify key seen, keyed by `key_fingerprint` so raw
+    keys never touch disk: the last balance the Apify API reported (if any),
+    USD billed since then, and when an exhausted key is due to be probed
+    again. Shared by every ApifyKeyManager, so one pool's spend and quota
+    errors are visible to the next.
+    """
+
+    def __init__(self, filename: str = "apify_keys.db"):
+        self._lock = threading.Lock()
+        self._conn = _connect_sqlite(filename)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS apify_keys (
+                    fingerprint TEXT PRIMARY KEY,
+                    source TEXT NOT NULL DEFAULT 'estimated',
+                    limit_usd REAL,
+                    balance_usd REAL,
+                    cycle_end REAL,
+                    probed_at REAL NOT NULL DEFAULT 0,
+                    spent_usd REAL NOT NULL DEFAULT 0,
+                    runs INTEGER NOT NULL DEFAULT 0,
+                    exhausted_at REAL,
+                    retry_at REAL,
+                    strikes INTEGER NOT NULL DEFAULT 0,
+                    updated_at REAL NOT NULL
+                ) WITHOUT ROWID
+                """
+            )
+
+    @staticmethod
+    def headroom(row: dict) -> float:
+        """Estimated USD left on a key: reported balance (or the default credit) minus billing since."""
+        base = row["balance_usd"] if row["source"] == "reported" else APIFY_KEY_DEFAULT_CREDIT_USD
+        return base - row["spent_usd"]
+
+    def rows(self, fingerprints: list[str]) -> dict[str, dict]:
+        if not fingerprints:
+            return {}
+        with self._lock:
+            cursor = self._conn.execute(
+                f"SELECT * FROM apify_keys WHERE fingerprint IN ({','.join('?' * len(fingerprints))})",
+                fingerprints,
+            )
+            columns = [c[0] for c in cursor.description]
+            return {row[0]: dict(zip(columns, row)) for row in cursor.fetchall()}
+
+    def _ensure(self, fingerprint: str) -> None:
+        """Create a key's row if it has none. Caller holds the lock."""
+        self._conn.execute(
+            "INSERT OR IGNORE INTO apify_keys (fingerprint, updated_at) VALUES (?, ?)", (fingerprint, time.time())
+        )
+
+    def charge(self, fingerprint: str, usd: float) -> None:
+        """A run billed `usd` on this key — which also proves the key works."""
+        with self._lock, self._conn:
+            self._ensure(fingerprint)
+            self._conn.execute(
+                "UPDATE apify_keys SET spent_usd = spent_usd + ?, runs = runs + 1, strikes = 0, updated_at = ? "
+                "WHERE fingerprint = ?",
+                (usd, time.time(), fingerprint),
+            )
+
+    def report(self, fingerprint: str, limit_usd: float, balance_usd: float, cycle_end: float | None) -> None:
+        """Store a balance read from the Apify API; billing is counted from here on."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._ensure(fingerprint)
+            self._conn.execute(
+                "UPDATE apify_keys SET source = 'reported', limit_usd = ?, balance_usd = ?, cycle_end = ?, "
+                "probed_at = ?, spent_usd = 0, updated_at = ? WHERE fingerprint = ?",
+                (limit_usd, balance_usd, cycle_end, now, now, fingerprint),
+            )
+
+    def touch(self, fingerprint: str) -> None:
+        """Note a probe that could not read the balance, so it isn't retried right away."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._ensure(fingerprint)
+            self._conn.execute(
+                "UPDATE apify_keys SET probed_at = ?, updated_at = ? WHERE fingerprint = ?", (now, now, fingerprint)
+            )
+
+    def mark_exhausted(self, fingerprint: str) -> None:
+        """
+        Take a key out of service until its billing cycle ends or, if that is
+        unknown, for APIFY_KEY_REPROBE_SECS doubled per failed revival. A no-op
+        while the key is already waiting; once its retry time has passed (a
+        revival probe found no credit) the wait starts again.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._ensure(fingerprint)
+            exhausted_at, retry_at, strikes, cycle_end = self._conn.execute(
+                "SELECT exhausted_at, retry_at, strikes, cycle_end FROM apify_keys WHERE fingerprint = ?",
+                (fingerprint,),
+            ).fetchone()
+            if exhausted_at is not None and (retry_at or 0.0) > now:
+                return
+            if cycle_end and cycle_end > now:
+                retry_at = cycle_end
+            else:
+                retry_at = now + min(APIFY_KEY_REPROBE_MAX_SECS, APIFY_KEY_REPROBE_SECS * 2 ** strikes)
+            self._conn.execute(
+                "UPDATE apify_keys SET exhausted_at = COALESCE(exhausted_at, ?), retry_at = ?, "
+                "strikes = strikes + 1, updated_at = ? WHERE fingerprint = ?",
+                (now, retry_at, now, fingerprint),
+            )
+
+    def revive(self, fingerprint: str) -> None:
+        """Put an exhausted key back in service; an estimated balance starts a fresh cycle."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE apify_keys SET exhausted_at = NULL, retry_at = NULL, updated_at = ?, "
+                "spent_usd = CASE WHEN source = 'estimated' THEN 0 ELSE spent_usd END "
+                "WHERE fingerprint = ? AND exhausted_at IS NOT NULL",
+                (time.time(), fingerprint),
+            )
+
+
+_key_ledger: ApifyKeyLedger | None = None
+
+
+def get_key_ledger() -> ApifyKeyLedger | None:
+    """Return the shared Apify key ledger, or None if its file can't be opened."""
+    global _key_ledger
+    if _key_ledger is None:
+        try:
+            _key_ledger = ApifyKeyLedger()
+        except (OSError, sqlite3.Error):
+            return None
+    return _key_ledger
+
+
+def _probe_apify_balance(key: str) -> dict | None:
+    """
+    The key's monthly usage limit, remaining balance and cycle end from the
+    Apify API, or None if they can't be read.
+    """
+    from apify_client import ApifyClient
+
+    try:
+        info = ApifyClient(key).user().limits() or {}
+        limit_usd = float(info["limits"]["maxMonthlyUsageUsd"])
+        used_usd = float(info["current"]["monthlyUsageUsd"])
+    except Exception:
+        return None
+    cycle_end = None
+    end_at = (info.get("monthlyUsageCycle") or {}).get("endAt")
+    if end_at:
+        try:
+            cycle_end = datetime.fromisoformat(str(end_at).replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            pass
+    return {"limit_usd": limit_usd, "balance_usd": max(0.0, limit_usd - used_usd), "cycle_end": cycle_end}
+
+
+# ──────────────────────────────────────────────
+# APIFY — Profile Scraping (Phase 2)
+# ──────────────────────────────────────────────
+
+def _is_apify_quota_error(err) -> bool:
+    """Check if an error indicates Apify quota/credit exhaustion."""
+    err_str = str(err).lower()
+    return any(kw in err_str for kw in ["quota", "credit", "limit", "402", "payment", "subscription"])
+
+
+def _parse_experience(experience_list: list) -> tuple[str, str, int]:
+    """
+    Parse an Apify experience array.
+    Returns (current_company, current_role, experience_years).
+    """
+    current_company = ""
+    current_role = ""
+    experience_years = 0
+
+    if not experience_list:
+        return current_company, current_role, experience_years
+
+    # Find current role (isCurrent=True or first entry)
+    for exp in experience_list:
+        if isinstance(exp, dict):
+            if exp.get("isCurrent", False):
+                current_company = exp.get("companyName", "") or exp.get("company", "")
+                current_role = exp.get("title", "") or exp.get("role", "")
+                break
+    if not current_company and experience_list:
+        first = experience_list[0] if isinstance(experience_list[0], dict) else {}
+        current_company = first.get("companyName", "") or first.get("company", "")
+        current_role = first.get("title", "") or first.get("role", "")
+
+    # Calculate experience years from earliest date
+    try:
+        years = []
+        for exp in experience_list:
+            if isinstance(exp, dict):
+                start = exp.get("startDate", "") or exp.get("dateRange", "")
+                if start and isinstance(start, str):
+                    for token in start.replace(",", " ").split():
+                        if token.isdigit() and 1970 <= int(token) <= 2030:
+                            years.append(int(token))
+        if years:
+            experience_years = datetime.now().year - min(years)
+    except Exception:
+        pass
+
+    return current_company, current_role, experience_years
+
+
+def _parse_apify_profile_item(item: dict) -> dict:
+    """
+    Parse a single Apify profile result into a standardised dict.
+    Handles multiple output schemas from different Apify actors.
+    """
+    bi = item.get("basic_info", {}) or {}
+
+    loc_raw = item.get("location") or bi.get("location") or ""
+    if isinstance(loc_raw, dict):
+        loc_str = loc_raw.get("city", "") or loc_raw.get("default", "") or loc_raw.get("country", "")
+    else:
+        loc_str = str(loc_raw)
+
+    profile = {
+        "linkedin_url": (
+            item.get("linkedinUrl") or item.get("url") or item.get("profileUrl")
+            or item.get("profile_url") or item.get("linkedInUrl")
+            or bi.get("profile_url") or bi.get("linkedinUrl") or ""
+        ),
+        "public_identifier": (
+            item.get("publicIdentifier") or item.get("public_identifier") or item.get("username")
+            or bi.get("public_identifier") or ""
+        ),
+        "full_name": (
+            item.get("fullName")
+            or item.get("name")
+            or item.get("full_name")
+            or ((item.get("firstName", "") or "") + " " + (item.get("lastName", "") or "")).strip()
+            or bi.get("fullname") or bi.get("full_name") or "Unknown"
+        ),
+        "headline": (
+            item.get("headline") or item.get("jobTitle") or item.get("title")
+            or item.get("position") or bi.get("headline") or ""
+        ),
+        "location": loc_str,
+        "about": (
+            item.get("about") or item.get("summary") or item.get("description")
+            or bi.get("about") or ""
+        )[:500],
+        "followers": item.get("followersCount") or item.get("followers") or item.get("follower_count") or bi.get("follower_count") or 0,
+        "connections": item.get("connectionsCount") or item.get("connections") or item.get("connections_count") or bi.get("connections_count") or 0,
+        "current_company": item.get("companyName") or item.get("current_company") or item.get("jobCompanyName") or bi.get("current_company") or "",
+        "current_role": "",
+        "experience_years": 0,
+        "education": "",
+        "skills": item.get("skills", []) or [],
+        "profile_type": "individual",
+        "raw_experience": item.get("experience", []) or item.get("experiences", []) or [],
+        "raw_education": item.get("education", []) or item.get("educations", []) or [],
+        "enrichment_status": "enriched",
+    }
+
+    experience = profile["raw_experience"]
+    if experience and isinstance(experience, list) and len(experience) > 0:
+        current = experience[0] if isinstance(experience[0], dict) else {}
+        if not profile["current_company"]:
+            profile["current_company"] = (
+                current.get("companyName") or current.get("company")
+                or current.get("company_name") or ""
+            )
+        profile["current_role"] = (
+            current.get("title") or current.get("role")
+            or current.get("position") or ""
+        )
+
+    if profile["raw_experience"]:
+        _, _, exp_years = _parse_experience(profile["raw_experience"])
+        profile["experience_years"] = exp_years
+
+    if profile["raw_education"] and isinstance(profile["raw_education"], list):
+        for edu in profile["raw_education"]:
+            if isinstance(edu, dict):
+                school = edu.get("schoolName", "") or edu.get("school", "") or edu.get("school_name", "")
+                degree = edu.get("degreeName", "") or edu.get("degree", "") or edu.get("degree_name", "")
+                if school:
+                    profile["education"] = f"{degree} - {school}" if degree else school
+                    break
+
+    return profile
+
+
+APIFY_PROFILE_ACTORS = [
+    {
+        "id": "harvestapi/linkedin-profile-scraper",
+        "label": "HarvestAPI (4.8\u2605)",
+        "cost_per_1k": 4.0,
+        "build_input": lambda urls: {
+            "profileScraperMode": "Profile details no email ($4 per 1k)",
+            "queries": urls,
+        },
+    },
+    {
+        "id": "apimaestro/linkedin-profile-detail",
+        "label": "APIMaestro",
+        "cost_per_1k": 5.0,
+        "build_input": lambda urls: {
+            "profileUrls": urls,
+        },
+    },
+    {
+        "id": "supreme_coder/linkedin-profile-scraper",
+        "label": "SupremeCoder",
+        "cost_per_1k": 3.0,
+        "build_input": lambda urls: {
+            "urls": [{"url": u} for u in urls],
+        },
+    },
+]
+
+
+_APIFY_TERMINAL_STATUSES = {"SUCCEEDED", "FAILED", "ABORTED", "TIMED-OUT"}
+
+
+def _run_actor_streaming(
+    client,
+    actor_id: str,
+    run_input: dict,
+    on_items=None,
+    deadline_secs: float | None = None,
+) -> tuple[list[dict], str]:
+    """
+    Start an Actor run without blocking on it, poll its status and stream
+    dataset items as they appear. `on_items(items)` is called with each
+    newly arrived slice. A run still going after `deadline_secs` is aborted.
+    Returns (all_items, final_status).
+    """
+    if deadline_secs is None:
+        deadline_secs = APIFY_RUN_DEADLINE_SECS
+    run = client.actor(actor_id).start(run_input=run_input, timeout_secs=int(deadline_secs) + 30)
+    run_client = client.run(run["id"])
+    dataset = client.dataset(run["defaultDatasetId"])
+    deadline = time.monotonic() + deadline_secs
+
+    items: list[dict] = []
+    status = run.get("status", "")
+    while True:
+        # Read status before draining: once a terminal status is seen, the
+        # drain that follows is guaranteed to include every item.
+        status = (run_client.get() or {}).get("status", status)
+        new_items = list(dataset.iterate_items(offset=len(items)))
+        if new_items:
+            items.extend(new_items)
+            if on_items:
+                on_items(new_items)
+        if status in _APIFY_TERMINAL_STATUSES:
+            return items, status
+        if time.monotonic() >= deadline:
+            try:
+                run_client.abort()
+            except Exception:
+                pass
+            return items, "ABORTED (deadline)"
+        time.sleep(APIFY_POLL_INTERVAL_SECS)
+
+
+def _usable_profiles(items: list[dict]) -> list[dict]:
+    """Parse raw actor items, keeping profiles with a name or headline."""
+    usable = []
+    for item in items:
+        profile = _parse_apify_profile_item(item)
+        if profile["full_name"] != "Unknown" or profile["headline"]:
+            usable.append(profile)
+    return usable
+
+
+def _scrape_profile_batch(
+    batch_no: int,
+    batch_urls: list,
+    apify_manager: ApifyKeyManager,
+    on_profiles=None,
+    metrics: Metrics | None = None,
+    budget: RunBudget | None = None,
+    actor_health: ActorHealthTracker | None = None,
+) -> tuple[list[dict], list[str]]:
+    """
+    Scrape one batch on a leased key, trying actors in the order
+    `actor_health` routes them and rotating to another key on quota errors.
+    Usable profiles are passed to `on_profiles` as the run produces them.
+    Returns (profiles, status_lines). Runs on a worker thread, so status
+    lines are returned rather than written. Every actor run is recorded in
+    `metrics` by actor and key (outcome, latency and the dataset items
+    billed) and in `actor_health`. Each run first reserves its profiles from
+    `budget` at the actor's price; a partial grant shrinks the batch.
+    """
+    from apify_client import ApifyClient
+
+    metrics = metrics or Metrics()
+    log: list[str] = []
+    batch_results: list[dict] = []
+
+    def _run(actor: dict, deadline_secs: float) -> tuple[list[dict], str]:
+        """One actor run; returns (usable profiles, run status)."""
+        nonlocal batch_urls
+        cost = actor.get("cost_per_1k", APIFY_COST_PER_PROFILE * 1000) / 1000
+        reserved = len(batch_urls)
+        if budget is not None:
+            reserved = budget.reserve("apify", len(batch_urls), cost)
+            if not reserved:
+                raise BudgetExhausted("apify")
+            if reserved < len(batch_urls):
+                log.append(f"   Apify budget covers {reserved}/{len(batch_urls)} profiles of this batch")
+                batch_urls = batch_urls[:reserved]
+        labels = {"provider": "apify", "actor": actor["id"], "key": f"#{key_idx + 1}"}
+        start = time.monotonic()
+        try:
+            items, run_status = _run_actor_streaming(
+                ApifyClient(apify_manager.keys[key_idx]), actor["id"], actor["build_input"](batch_urls),
+                on_items=_stream, deadline_secs=deadline_secs,
+            )
+        except Exception as e:
+            latency = time.monotonic() - start
+            if budget is not None:
+                budget.settle("apify", reserved, 0, cost)
+            error_msg = str(e).lower()
+            if any(kw in error_msg for kw in ["429", "rate limit", "too many requests", "rate-limit"]):
+                outcome = "rate_limited"
+            elif _is_apify_quota_error(e):
+                outcome = "quota"
+            else:
+                outcome = "error"
+                if actor_health is not None:
+                    actor_health.record(actor["id"], outcome, latency, len(batch_urls), 0, 0, 0.0)
+            metrics.inc("provider_requests", outcome=outcome, **labels)
+            raise
+        finally:
+            metrics.observe("provider_latency_seconds", time.monotonic() - start, **labels)
+        usable = _usable_profiles(items)
+        if budget is not None:
+            budget.settle("apify", reserved, len(items), cost)
+        apify_manager.charge(key_idx, len(items) * cost)
+        metrics.inc("credits", len(items), provider="apify")
+        metrics.inc("apify_key_spend_usd", len(items) * cost, key=labels["key"])
+        metrics.inc("provider_requests", outcome="ok" if items else "empty", **labels)
+        if actor_health is not None:
+            if usable:
+                outcome = "ok"
+            elif run_status.startswith("ABORTED (deadline)") or run_status == "TIMED-OUT":
+                outcome = "timeout"
+            else:
+                outcome = "empty"
+            actor_health.record(
+                actor["id"], outcome, time.monotonic() - start, len(batch_urls), len(items), len(usable),
+                len(items) * cost,
+            )
+        return usable, run_status
+
+    def _stream(items: list[dict]) -> None:
+        if on_profiles:
+            usable = _usable_profiles(items)
+            if usable:
+                on_profiles(usable)
+
+    if actor_health is not None:
+        route = actor_health.route(APIFY_PROFILE_ACTORS)
+    else:
+        route = [(actor, APIFY_RUN_DEADLINE_SECS) for actor in APIFY_PROFILE_ACTORS]
+    if not route:
+        log.append(f"Batch {batch_no}: every Apify actor is failing (circuit open). Skipping.")
+        return batch_results, log
+
+    key_idx = apify_manager.acquire()
+    if key_idx is None:
+        log.append(f"Batch {batch_no}: all Apify keys exhausted. Skipping.")
+        return batch_results, log
+
+    log.append(f"Scraping batch {batch_no} ({len(batch_urls)} URLs) with key #{key_idx + 1}")
+    try:
+        attempt = 0
+        while attempt < len(route):
+            actor, deadline_secs = route[attempt]
+            attempt += 1
+
+            try:
+                log.append(f"   Trying: {actor['label']} ...")
+
+                batch_results, run_status = _run(actor, deadline_secs)
+                if batch_results:
+                    log.append(
+                        f"   Got {len(batch_results)} enriched profiles via {actor['label']} ({run_status})"
+                    )
+                    return batch_results, log
+                log.append(f"   {actor['label']} returned no usable profiles ({run_status}). Trying next...")
+
+            except BudgetExhausted:
+                log.append("   Apify budget spent — skipping the rest of this batch.")
+                break
+            except Exception as e:
+                error_msg = str(e).lower()
+                # Rate-limit: wait and retry same actor (don't rotate key)
+                if any(kw in error_msg for kw in ["429", "rate limit", "too many requests", "rate-limit"]):
+                    log.append(f"   Rate limited on {actor['label']} — waiting 30s and retrying...")
+                    time.sleep(30)
+                    try:
+                        batch_results, _ = _run(actor, deadline_secs)
+                        if batch_results:
+                            log.append(f"   Retry OK: {len(batch_results)} profiles via {actor['label']}")
+                            return batch_results, log
+                    except BudgetExhausted:
+                        log.append("   Apify budget spent — skipping the rest of this batch.")
+                        break
+                    except Exception:
+                        log.append("   Retry also failed, trying next actor...")
+                elif _is_apify_quota_error(e):
+                    log.append(f"   Key #{key_idx + 1} quota exhausted - rotating")
+                    apify_manager.release(key_idx)
+                    apify_manager.mark_exhausted(key_idx)
+                    key_idx = apify_manager.acquire()
+                    if key_idx is None:
+                        log.append("   All Apify keys exhausted.")
+                        break
+                    # Same actor again on the fresh key
+                    log.append(f"   Continuing on key #{key_idx + 1}")
+                    attempt -= 1
+                elif "not found" in error_msg:
+                    log.append(f"   Actor {actor['label']} not found, trying next...")
+                else:
+                    log.append(f"   {actor['label']} error: {str(e)[:120]}")
+    finally:
+        if key_idx is not None:
+            apify_manager.release(key_idx)
+
+    return batch_results, log
+
+
+def scrape_linkedin_profiles(
+    urls: list,
+    apify_manager: ApifyKeyManager,
+    status_container,
+    on_profiles=None,
+    metrics: Metrics | None = None,
+    budget: RunBudget | None = None,
+) -> list:
+    """
+    Scrape LinkedIn profiles using multiple Apify actors with automatic fallback.
+    Each batch tries the actors in the order the shared ActorHealthTracker
+    routes them (cheapest expected cost per usable profile first, failing
+    actors skipped), falling back to the listed order if its file can't be
+    opened. Batches run concurrently across all non-exhausted keys (up to
+    APIFY_MAX_RUNS_PER_KEY runs per key); results come back in URL order.
+    If given, `on_profiles(profiles)` is called (from worker threads) as
+    parsed profiles stream out of running actors.
+    """
+    batch_size = 20
+    batches = [urls[i : i + batch_size] for i in range(0, len(urls), batch_size)]
+    if not batches:
+        return []
+    if apify_manager.capacity() == 0:
+        status_container.warning("All Apify keys exhausted. Skipping remaining enrichment.")
+        return []
+    if budget is not None and budget.remaining("apify") <= 0:
+        status_container.warning("Apify budget spent. Skipping remaining enrichment.")
+        return []
+
+    actor_health = get_actor_health()
+    results_by_batch: dict[int, list[dict]] = {}
+
+    with ThreadPoolExecutor(max_workers=min(len(batches), apify_manager.capacity())) as executor:
+        futures = {
+            executor.submit(
+                _scrape_profile_batch, n + 1, batch, apify_manager, on_profiles, metrics, budget, actor_health
+            ): n
+            for n, batch in enumerate(batches)
+        }
+        for future in as_completed(futures):
+            n = futures[future]
+            try:
+                profiles, log = future.result()
+            except Exception as e:
+                profiles, log = [], [f"Batch {n + 1} failed: {str(e)[:120]}"]
+            for line in log:
+                status_container.write(line)
+            results_by_batch[n] = profiles
+
+    enriched_profiles: list[dict] = []
+    for n in range(len(batches)):
+        enriched_profiles.extend(results_by_batch.get(n, []))
+    return enriched_profiles
+
+
+def _parse_apify_company_item(item: dict) -> dict:
+    """Parse a single dev_fusion company result into the standard profile dict."""
+    hq = item.get("headquarters", {})
+    if not isinstance(hq, dict):
+        hq = {}
+
+    return {
+        "linkedin_url": item.get("url", ""),
+        "full_name": item.get("name", ""),
+        "company_name": item.get("name", ""),
+        "headline": item.get("description", "")[:200] if item.get("description") else "",
+        "about": (item.get("description", "") or "")[:500],
+        "location": hq.get("city", "") or hq.get("geographicArea", ""),
+        "industry": item.get("industry", ""),
+        "company_size": item.get("employeeCount", "") or item.get("staffCount", ""),
+        "website": item.get("website", ""),
+        "founded": item.get("founded", ""),
+        "specialties": item.get("specialties", []),
+        "followers": item.get("followersCount", 0) or 0,
+        "connections": 0,
+        "current_company": item.get("name", ""),
+        "current_role": "Company Page",
+        "experience_years": 0,
+        "education": "",
+        "skills": [],
+        "profile_type": "company",
+        "raw_experience": [],
+        "raw_education": [],
+        "enrichment_status": "enriched",
+    }
+
+
+def scrape_linkedin_companies(
+    urls: list[str],
+    apify_manager: ApifyKeyManager,
+    status_container,
+    on_profiles=None,
+    metrics: Metrics | None = None,
+    budget: RunBudget | None = None,
+) -> list[dict]:
+    """
+    Scrape LinkedIn company pages via Apify.
+    Returns list of enriched company dicts; `on_profiles` receives them as
+    they stream out of the run. Runs are recorded in `metrics`; each batch
+    reserves its pages from `budget` first.
+    """
+    from apify_client import ApifyClient
+
+    metrics = metrics or Metrics()
+    actor_id = "dev_fusion/linkedin-company-scraper"
+    enriched: list[dict] = []
+    batch_size = 30
+
+    def _stream(items: list[dict]) -> None:
+        if on_profiles:
+            on_profiles([_parse_apify_company_item(item) for item in items])
+
+    for batch_start in range(0, len(urls), batch_size):
+        batch_urls = urls[batch_start : batch_start + batch_size]
+        key_idx = apify_manager.acquire()
+        if key_idx is None:
+            status_container.write("⚠ï¸ All Apify keys exhausted — stopping company scraping.")
+            break
+        reserved = len(batch_urls)
+        if budget is not None:
+            reserved = budget.reserve("apify", len(batch_urls), APIFY_COMPANY_COST_PER_PROFILE)
+            if not reserved:
+                apify_manager.release(key_idx)
+                status_container.write("⚠ï¸ Apify budget spent — stopping company scraping.")
+                break
+            batch_urls = batch_urls[:reserved]
+
+        status_container.write(
+            f"🏢 Scraping companies batch {batch_start // batch_size + 1} "
+            f"({len(batch_urls)} URLs) with key #{key_idx + 1}…"
+        )
+
+        labels = {"provider": "apify", "actor": actor_id, "key": f"#{key_idx + 1}"}
+        start = time.monotonic()
+        try:
+            client = ApifyClient(apify_manager.keys[key_idx])
+            # dev_fusion company scraper (no cookies)
+            items = []
+            try:
+                items, run_status = _run_actor_streaming(
+                    client, actor_id, {"companyUrls": batch_urls}, on_items=_stream,
+                )
+            finally:
+                metrics.observe("provider_latency_seconds", time.monotonic() - start, **labels)
+                if budget is not None:
+                    budget.settle("apify", reserved, len(items), APIFY_COMPANY_COST_PER_PROFILE)
+                apify_manager.release(key_idx)
+            apify_manager.charge(key_idx, len(items) * APIFY_COMPANY_COST_PER_PROFILE)
+            metrics.inc("credits", len(items), provider="apify")
+            metrics.inc("apify_key_spend_usd", len(items) * APIFY_COMPANY_COST_PER_PROFILE, key=labels["key"])
+            metrics.inc("provider_requests", outcome="ok" if items else "empty", **labels)
+            enriched.extend(_parse_apify_company_item(item) for item in items)
+
+            status_container.write(f"   ✅ Got {len(items)} enriched companies from this batch ({run_status})")
+
+        except Exception as e:
+            metrics.inc("provider_requests", outcome="quota" if _is_apify_quota_error(e) else "error", **labels)
+            if _is_apify_quota_error(e):
+                status_container.write(f"⚠ï¸ Apify key #{key_idx + 1} quota exhausted — rotating…")
+                if apify_manager.mark_exhausted(key_idx) is None:
+                    status_container.write("⚠ï¸ All Apify keys exhausted.")
+                    break
+                continue
+            else:
+                status_container.write(f"⚠ï¸ Apify company scrape error: {e}")
+
+    return enriched
+
+
+# ──────────────────────────────────────────────
+# ENRICHMENT CACHE (scraped profiles by canonical slug)
+# ──────────────────────────────────────────────
+
+class EnrichmentCache:
+    """
+    On-disk cache of parsed Apify results (profiles and company pages), keyed
+    on the canonical slug from `_norm_url` (`in/<slug>`, `company/<slug>`).
+    Entries older than `ttl_days` are reported as stale and re-scraped.
+    """
+
+    def __init__(self, filename: str = "enrichment_cache.db", ttl_days: float = ENRICH_CACHE_TTL_DAYS):
+        self.ttl_secs = ttl_days * 86400
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self._lock = threading.Lock()
+        self._conn = _connect_sqlite(filename)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS enrichment_cache (
+                    slug_key TEXT PRIMARY KEY,
+                    profile_type TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    fetched_at REAL NOT NULL
+                ) WITHOUT ROWID
+                """
+            )
+
+    def get_many(self, keys: list[str]) -> tuple[dict[str, dict], set[str]]:
+        """
+        Look up normalized slug keys. Returns ({key: data} for fresh entries,
+        set of keys that exist but are stale).
+        """
+        fresh: dict[str, dict] = {}
+        stale: set[str] = set()
+        if not keys:
+            return fresh, stale
+        cutoff = time.time() - self.ttl_secs
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i : i + 500]
+                rows = self._conn.execute(
+                    "SELECT slug_key, data, fetched_at FROM enrichment_cache "
+                    f"WHERE slug_key IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                for key, data, fetched_at in rows:
+                    if fetched_at < cutoff:
+                        stale.add(key)
+                    else:
+                        fresh[key] = json.loads(data)
+            self.hits += len(fresh)
+            self.stale += len(stale)
+            self.misses += len(set(keys)) - len(fresh) - len(stale)
+        return fresh, stale
+
+    def put_many(self, entries: dict[str, dict]) -> None:
+        """Store parsed results under their normalized slug keys."""
+        if not entries:
+            return
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO enrichment_cache VALUES (?, ?, ?, ?)",
+                [
+                    (key, data.get("profile_type", "individual"), json.dumps(data, default=str), now)
+                    for key, data in entries.items()
+                ],
+            )
+
+    def stats(self) -> dict:
+        """Hit/stale/miss counters for this process plus the current entry count."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM enrichment_cache").fetchone()[0]
+            total = self.hits + self.stale + self.misses
+            return {
+                "hits": self.hits,
+                "stale": self.stale,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "credits_saved": self.hits * APIFY_COST_PER_PROFILE,
+                "entries": entries,
+            }
+
+
+_enrichment_cache: EnrichmentCache | None = None
+
+
+def get_enrichment_cache() -> EnrichmentCache | None:
+    """Return the shared enrichment cache, or None if the cache file can't be opened."""
+    global _enrichment_cache
+    if _enrichment_cache is None:
+        try:
+            _enrichment_cache = EnrichmentCache()
+        except (OSError, sqlite3.Error):
+            return None
+    return _enrichment_cache
+
+
+# ──────────────────────────────────────────────
+# UNIFIED ENRICHMENT (Phase 2)
+# ──────────────────────────────────────────────
+
+def _enriched_url_key(ep: dict) -> str:
+    """Normalized URL key of a scraped profile (actors name the URL field differently)."""
+    ep_url = (
+        ep.get("linkedin_url", "")
+        or ep.get("linkedinUrl", "")
+        or ep.get("url", "")
+        or ep.get("profileUrl", "")
+        or ep.get("profile_url", "")
+        or ep.get("linkedInUrl", "")
+        or ""
+    )
+    return _norm_url(ep_url)
+
+
+def _merge_enriched(p: dict, ep: dict, source: str = "apify") -> dict:
+    """Overlay scraped data on a discovered profile; `source` is "apify" or "cache"."""
+    merged = {**p, **ep}
+    # Preserve the original url field name
+    merged["url"] = p["url"]
+    if not merged.get("full_name") or merged["full_name"] == "Unknown":
+        merged["full_name"] = p.get("name", "")
+    merged["enrichment_status"] = "enriched"
+    merged["enrichment_source"] = source
+    return merged
+
+
+def _apply_serpapi_only_defaults(p: dict) -> dict:
+    """Fill profile fields from SerpAPI data for profiles Apify didn't return."""
+    p["enrichment_status"] = "serpapi_only"
+    p.setdefault("full_name", p.get("name", ""))
+    p.setdefault("location", "")
+    p.setdefault("about", p.get("snippet", ""))
+    p.setdefault("followers", 0)
+    p.setdefault("connections", 0)
+    p.setdefault("current_company", p.get("organization", ""))
+    p.setdefault("current_role", p.get("headline", ""))
+    p.setdefault("experience_years", 0)
+    p.setdefault("education", "")
+    p.setdefault("skills", [])
+    p.setdefault("raw_experience", [])
+    p.setdefault("raw_education", [])
+    return p
+
+
+def enrich_discovered_profiles(
+    discovered: list[dict],
+    apify_manager: ApifyKeyManager,
+    status_container,
+    on_enriched=None,
+    use_cache: bool = True,
+    metrics: Metrics | None = None,
+    budget: RunBudget | None = None,
+) -> list[dict]:
+    """
+    Enrich discovered profiles by scraping full data via Apify.
+    Profiles and scrape results are matched by their IdentityIndex lead id,
+    which is also the enrichment cache key. Fresh cache results are reused;
+    only cache misses and stale entries are sent to Apify. Falls back to
+    SerpAPI-only data if all keys are exhausted.
+    If given, `on_enriched(profiles)` receives merged profiles as soon as
+    they are available — cache hits first, then scrape results as they
+    stream in (from worker threads); the same objects are also part of the
+    returned list. Cache lookups and Apify runs are recorded in `metrics`;
+    Apify spend is reserved from `budget`.
+    """
+    metrics = metrics or Metrics()
+    cache = get_enrichment_cache() if use_cache else None
+    identity = get_identity_index()
+
+    def _lead_id(profile: dict) -> str:
+        """Canonical lead id of a discovered or scraped profile (its URL key without an index)."""
+        lead_id = identity.link(profile) if identity is not None else None
+        return lead_id or _enriched_url_key(profile) or _norm_url(profile.get("url", ""))
+
+    # Stream merged profiles out while runs are still going
+    lead_ids = {id(p): _lead_id(p) for p in discovered}
+    discovered_by_lead = {lead_ids[id(p)]: p for p in discovered}
+    streamed: dict[str, dict] = {}
+    stream_lock = threading.Lock()
+
+    def _on_scraped(eps: list[dict], source: str = "apify") -> None:
+        ready = []
+        with stream_lock:
+            for ep in eps:
+                lead_id = _lead_id(ep)
+                if lead_id in discovered_by_lead and lead_id not in streamed:
+                    streamed[lead_id] = _merge_enriched(discovered_by_lead[lead_id], ep, source)
+                    ready.append(streamed[lead_id])
+        if ready and on_enriched:
+            on_enriched(ready)
+
+    # Serve fresh cache entries without touching Apify
+    to_scrape = discovered
+    if cache is not None:
+        cached, stale = cache.get_many(list(discovered_by_lead))
+        metrics.inc("cache_lookups", len(cached), cache="enrichment", result="hit")
+        metrics.inc("cache_lookups", len(stale), cache="enrichment", result="stale")
+        metrics.inc(
+            "cache_lookups", len(discovered_by_lead) - len(cached) - len(stale), cache="enrichment", result="miss"
+        )
+        if cached:
+            # Keyed by lead id already, so hits map straight onto discovered profiles
+            with stream_lock:
+                for lead_id, ep in cached.items():
+                    streamed[lead_id] = _merge_enriched(discovered_by_lead[lead_id], ep, "cache")
+            if on_enriched:
+                on_enriched([streamed[lead_id] for lead_id in cached])
+        to_scrape = [p for p in discovered if lead_ids[id(p)] not in cached]
+        lookups = len(discovered_by_lead)
+        status_container.write(
+            f"Enrichment cache: {len(cached)}/{lookups} hits "
+            f"({len(cached) / lookups:.0%}), {len(stale)} stale, "
+            f"~${len(cached) * APIFY_COST_PER_PROFILE:.2f} Apify credits saved"
+            if lookups else "Enrichment cache: nothing to look up"
+        )
+
+    enriched_profiles: list[dict] = []
+    enriched_companies: list[dict] = []
+    if not to_scrape:
+        pass
+    elif not apify_manager.has_keys() or apify_manager.is_exhausted():
+        status_container.write("No Apify keys available - returning SerpAPI-only data.")
+    else:
+        # Separate individual vs company URLs
+        individual_urls = [p["url"] for p in to_scrape if p.get("profile_type") == "individual"]
+        company_urls = [p["url"] for p in to_scrape if p.get("profile_type") == "company"]
+
+        status_container.write(
+            f"Enrichment targets: {len(individual_urls)} individuals, {len(company_urls)} companies"
+        )
+
+        on_scraped = _on_scraped if on_enriched else None
+
+        # Scrape
+        enriched_profiles = scrape_linkedin_profiles(
+            individual_urls, apify_manager, status_container, on_profiles=on_scraped, metrics=metrics,
+            budget=budget,
+        )
+        enriched_companies = scrape_linkedin_companies(
+            company_urls, apify_manager, status_container, on_profiles=on_scraped, metrics=metrics,
+            budget=budget,
+        )
+
+    # Lead id -> enriched data; the identity index matches results whose URL
+    # differs from the discovered one (URN links, renamed vanity slugs) by
+    # their publicIdentifier or name and company
+    enriched_map: dict[str, dict] = {}
+    unmatched: list[dict] = []
+    for ep in enriched_profiles + enriched_companies:
+        lead_id = _lead_id(ep)
+        if lead_id in discovered_by_lead:
+            enriched_map[lead_id] = ep
+        elif lead_id:
+            unmatched.append(ep)
+
+    # Leftover results whose aliases are all new (e.g. a renamed slug): pair
+    # them with the profiles still waiting by name, or one-to-one if a single
+    # pair is left, and record the pairing so the new aliases resolve next time
+    waiting = {
+        lead_id: p for lead_id, p in discovered_by_lead.items()
+        if lead_id not in enriched_map and lead_id not in streamed
+    }
+    for ep in list(unmatched):
+        name = _identity_name(ep.get("full_name", ""))
+        candidates = [
+            lead_id for lead_id, p in waiting.items()
+            if name and p.get("profile_type") == ep.get("profile_type") and _identity_name(p.get("name", "")) == name
+        ]
+        if not candidates and len(unmatched) == 1 and len(waiting) == 1:
+            candidates = list(waiting)
+        if len(candidates) == 1:
+            lead_id = candidates[0]
+            if identity is not None:
+                identity.link(ep, lead_id)
+            enriched_map[lead_id] = ep
+            del waiting[lead_id]
+            unmatched.remove(ep)
+
+    if enriched_map:
+        status_container.write(
+            f"Enrichment map built: {len(enriched_map)} profiles matched from scraping"
+            + (f", {len(unmatched)} results matched no discovered profile" if unmatched else "")
+        )
+    if cache is not None:
+        cache.put_many(enriched_map)
+
+    # Debug: show sample URLs from both sides to diagnose matching issues
+    if enriched_profiles and not enriched_map:
+        # Enriched profiles exist but none mapped - log the raw URL fields
+        sample_ep = enriched_profiles[0]
+        status_container.write(
+            f"DEBUG: Sample enriched profile keys: {list(sample_ep.keys())[:15]}"
+        )
+        status_container.write(
+            f"DEBUG: Enriched URL fields -> "
+            f"linkedin_url='{sample_ep.get('linkedin_url', 'N/A')}' | "
+            f"public_identifier='{sample_ep.get('public_identifier', 'N/A')}' | "
+            f"full_name='{sample_ep.get('full_name', 'N/A')}'"
+        )
+    if enriched_map:
+        sample_keys = list(enriched_map.keys())[:3]
+        status_container.write(f"DEBUG: Enriched map sample keys: {sample_keys}")
+    if discovered:
+        sample_disc = [lead_ids[id(p)] for p in discovered[:3]]
+        status_container.write(f"DEBUG: Discovered sample lead ids: {sample_disc}")
+
+    # Merge enriched data back into discovered list
+    result: list[dict] = []
+    enriched_count = 0
+    for p in discovered:
+        lead_id = lead_ids[id(p)]
+        if lead_id in streamed:
+            result.append(streamed[lead_id])
+            enriched_count += 1
+        elif lead_id in enriched_map:
+            result.append(_merge_enriched(p, enriched_map[lead_id]))
+            enriched_count += 1
+        else:
+            # Fallback to SerpAPI-only data
+            result.append(_apply_serpapi_only_defaults(p))
+
+    serpapi_only = len(result) - enriched_count
+    status_container.write(
+        f"Enrichment done: {enriched_count} enriched, {serpapi_only} SerpAPI-only"
+    )
+
+    return result
+
+
+
+# ──────────────────────────────────────────────
+
+class KeywordMatcher:
+    """
+    A keyword list compiled once for repeated substring checks against
+    lowercased text. Keywords are lowercased and deduplicated up front;
+    lookups run in list order and stop as soon as the caller has what it
+    needs. Matches are returned in their original spelling.
+    """
+
+    def __init__(self, keywords: list[str]):
+        pairs: dict[str, str] = {}
+        for kw in keywords:
+            pairs.setdefault(kw.lower(), kw)
+        self._pairs = tuple(pairs.items())
+        self._lowered = tuple(pairs)
+
+    def iter_matches(self, text: str):
+        """Lazily yield keywords found in `text`, in list order."""
+        for kw, original in self._pairs:
+            if kw in text:
+                yield original
+
+    def first(self, text: str) -> str | None:
+        for kw, original in self._pairs:
+            if kw in text:
+                return original
+        return None
+
+    def any(self, text: str) -> bool:
+        for kw in self._lowered:
+            if kw in text:
+                return True
+        return False
+
+    def matches(self, text: str) -> list[str]:
+        return [original for kw, original in self._pairs if kw in text]
+
+
+_EDUCATION_MATCHER = KeywordMatcher(EDUCATION_KEYWORDS)
+_NON_EDUCATION_MATCHER = KeywordMatcher(NON_EDUCATION_KEYWORDS)
+_LEADERSHIP_MATCHER = KeywordMatcher(LEADERSHIP_KEYWORDS)
+_EDU_CONTEXT_MATCHER = KeywordMatcher(EDU_CONTEXT_KEYWORDS)
+_BRAND_MATCHER = KeywordMatcher(BRAND_BLACKLIST)
+_INDIA_MATCHER = KeywordMatcher(INDIA_INDICATORS)
+_LEADERSHIP_SET = frozenset(LEADERSHIP_KEYWORDS)
+
+
+class ProfileText:
+    """
+    Lowercased profile fields and the combined strings the hard filters
+    search, built once per profile. The long combined strings are only
+    built when a filter first asks for them.
+    """
+
+    __slots__ = ("profile", "headline", "about", "company", "location", "_india_text", "_education_text")
+
+    def __init__(self, profile: dict):
+        self.profile = profile
+        self.headline = (profile.get("headline") or "").lower()
+        self.about = (profile.get("about") or profile.get("snippet") or "").lower()
+        self.company = (profile.get("current_company") or profile.get("organization") or "").lower()
+        self.location = (profile.get("location") or "").lower()
+        self._india_text: str | None = None
+        self._education_text: str | None = None
+
+    @property
+    def brand_text(self) -> str:
+        p = self.profile
+        name = (p.get("full_name") or p.get("name") or "").lower()
+        company_name = (p.get("company_name") or "").lower()
+        return f"{name} ||| {self.headline} ||| {self.company} ||| {company_name}"
+
+    @property
+    def india_text(self) -> str:
+        if self._india_text is None:
+            self._india_text = f"{self.headline} {self.about}"
+        return self._india_text
+
+    @property
+    def education_text(self) -> str:
+        if self._education_text is None:
+            p = self.profile
+            role = (p.get("current_role") or "").lower()
+            skills = " ".join(s.lower() if isinstance(s, str) else "" for s in (p.get("skills") or []))
+            self._education_text = f"{self.headline} {self.about} {role} {self.company} {skills}"
+        return self._education_text
+
+
+def is_complete_profile(profile: dict) -> tuple[bool, str]:
+    """
+    Reject profiles that are too sparse to be useful.
+    Must have at least: name AND (headline OR current_role).
+    SerpAPI-only profiles need education keyword in snippet.
+    """
+    name = (profile.get("full_name") or profile.get("name") or "").strip()
+    if not name:
+        return False, "Missing name"
+
+    headline = (profile.get("headline") or "").strip()
+    current_role = (profile.get("current_role") or "").strip()
+
+    if not headline and not current_role:
+        return False, "Missing both headline and role"
+
+    # SerpAPI-only profiles need extra check
+    if profile.get("enrichment_status") == "serpapi_only":
+        snippet = (profile.get("snippet") or "").lower()
+        combined = f"{name} {headline} {current_role} {snippet}".lower()
+        if not _EDUCATION_MATCHER.any(combined):
+            return False, "SerpAPI-only profile with no education signal"
+
+    return True, "Complete"
+
+
+def is_blacklisted_brand(profile: dict, text: ProfileText | None = None) -> tuple[bool, str]:
+    """
+    Check if profile belongs to a blacklisted brand (Big EdTech / Big Corp).
+    Returns (True, reason) if blacklisted — i.e. should be REJECTED.
+    """
+    text = text or ProfileText(profile)
+    brand = _BRAND_MATCHER.first(text.brand_text)
+    if brand is not None:
+        return True, f"Blacklisted brand: {brand}"
+
+    return False, "Not blacklisted"
+
+
+def is_india_based(profile: dict, text: ProfileText | None = None) -> tuple[bool, str]:
+    """
+    Check if profile is India-based.
+    If location is empty, check headline + about for India indicators.
+    If still unclear → PASS (benefit of doubt).
+    """
+    text = text or ProfileText(profile)
+    location = text.location
+
+    # Check location field first
+    if location:
+        if _INDIA_MATCHER.any(location):
+            return True, f"India location: {location}"
+        # Location is present but doesn't match India
+        return False, f"Non-India location: {location}"
+
+    # Location missing — check headline + about for India clues
+    indicator = _INDIA_MATCHER.first(text.india_text)
+    if indicator is not None:
+        return True, f"India indicator in text: {indicator}"
+
+    # No location data, no India clues — benefit of doubt
+    return True, "Location unknown — passing (benefit of doubt)"
+
+
+def is_connection_in_range(profile: dict) -> tuple[bool, str]:
+    """
+    Check if connections/followers are within acceptable range.
+    Zero or missing values → PASS (benefit of doubt).
+    """
+    profile_type = profile.get("profile_type", "individual")
+    connections = profile.get("connections", 0) or 0
+    followers = profile.get("followers", 0) or 0
+
+    if profile_type == "company":
+        # Company pages use followers
+        if followers == 0:
+            return True, "Company followers unknown — passing"
+        if followers < MIN_COMPANY_FOLLOWERS:
+            return False, f"Too few company followers: {followers} (min {MIN_COMPANY_FOLLOWERS})"
+        if followers > MAX_COMPANY_FOLLOWERS:
+            return False, f"Too many company followers: {followers} (max {MAX_COMPANY_FOLLOWERS})"
+        return True, f"Company followers OK: {followers}"
+    else:
+        # Individual profiles use connections
+        if connections == 0:
+            return True, "Connections unknown — passing"
+        if connections < MIN_CONNECTIONS:
+            return False, f"Too few connections: {connections} (min {MIN_CONNECTIONS})"
+        if connections > MAX_CONNECTIONS:
+            return False, f"Too many connections: {connections} (max {MAX_CONNECTIONS})"
+        return True, f"Connections OK: {connections}"
+
+
+def is_education_relevant(profile: dict, text: ProfileText | None = None) -> tuple[bool, str]:
+    """
+    Check if the profile is education-relevant.
+    Combines headline + about + current_role + current_company + skills.
+    Founder/CEO/Director profiles need additional education context.
+    """
+    text = text or ProfileText(profile)
+    combined = text.education_text
+
+    # If combined text is basically empty, pass (benefit of doubt)
+    if len(combined.strip()) < 5:
+        return True, "Insufficient text to evaluate — passing"
+
+    # Check for education keywords. Only the first three (for the reason) and
+    # whether any non-leadership keyword matched are needed, so stop there.
+    edu_matches: list[str] = []
+    has_non_leadership = False
+    for kw in _EDUCATION_MATCHER.iter_matches(combined):
+        edu_matches.append(kw)
+        has_non_leadership = has_non_leadership or kw not in _LEADERSHIP_SET
+        if len(edu_matches) >= 3 and has_non_leadership:
+            break
+
+    if not edu_matches:
+        return False, f"No education keywords found"
+
+    if not has_non_leadership:
+        non_edu_matches = _NON_EDUCATION_MATCHER.matches(combined)
+        if non_edu_matches:
+            # Only leadership keywords matched + non-education keywords present
+            return False, f"Leadership role without education context (non-edu: {', '.join(non_edu_matches[:3])})"
+
+    if _LEADERSHIP_MATCHER.any(combined):
+        # Leadership profiles need at least one non-leadership education keyword
+        if not _EDU_CONTEXT_MATCHER.any(combined):
+            return False, "Leadership role without education context"
+
+    return True, f"Education relevant ({', '.join(edu_matches[:3])})"
+
+
+def apply_hard_filters(
+    profiles: list[dict], status_container, on_reject=None, metrics: Metrics | None = None
+) -> tuple[list[dict], dict]:
+    """
+    Apply hard filters in order (cheapest first):
+    1. Completeness  2. Brand blacklist  3. Location  4. Connections  5. Education relevance
+    Returns (filtered_profiles, rejection_stats).
+    If given, `on_reject(profile, stat_key, reason)` is called for every rejected profile,
+    and `metrics` counts rejections by stat key.
+    """
+    stats = {
+        "input": len(profiles),
+        "incomplete": 0,
+        "blacklisted": 0,
+        "non_india": 0,
+        "connection_range": 0,
+        "non_education": 0,
+        "passed": 0,
+    }
+    passed: list[dict] = []
+
+    for p in profiles:
+        text = ProfileText(p)
+
+        # 1. Completeness
+        ok, reason = is_complete_profile(p)
+        if not ok:
+            stats["incomplete"] += 1
+            if on_reject:
+                on_reject(p, "incomplete", reason)
+            continue
+
+        # 2. Brand blacklist
+        blacklisted, reason = is_blacklisted_brand(p, text)
+        if blacklisted:
+            stats["blacklisted"] += 1
+            if on_reject:
+                on_reject(p, "blacklisted", reason)
+            continue
+
+        # 3. Location (India-based)
+        india, reason = is_india_based(p, text)
+        if not india:
+            stats["non_india"] += 1
+            if on_reject:
+                on_reject(p, "non_india", reason)
+            continue
+
+        # 4. Connection / follower range
+        in_range, reason = is_connection_in_range(p)
+        if not in_range:
+            stats["connection_range"] += 1
+            if on_reject:
+                on_reject(p, "connection_range", reason)
+            continue
+
+        # 5. Education relevance
+        edu_ok, reason = is_education_relevant(p, text)
+        if not edu_ok:
+            stats["non_education"] += 1
+            if on_reject:
+                on_reject(p, "non_education", reason)
+            continue
+
+        passed.append(p)
+
+    stats["passed"] = len(passed)
+    rejected = stats["input"] - stats["passed"]
+    if metrics is not None:
+        for key in ("incomplete", "blacklisted", "non_india", "connection_range", "non_education"):
+            if stats[key]:
+                metrics.inc("filter_rejections", stats[key], stage="hard_filter", reason=key)
+
+    status_container.write(
+        f"🔍 **Hard Filters Applied:**\n"
+        f"   Input: {stats['input']} | ✅ Passed: {stats['passed']} | ❌ Rejected: {rejected}"
+    )
+    status_container.write(
+        f"   📋 Rejections: "
+        f"Incomplete: {stats['incomplete']} | "
+        f"Blacklisted: {stats['blacklisted']} | "
+        f"Non-India: {stats['non_india']} | "
+        f"Connection range: {stats['connection_range']} | "
+        f"Non-education: {stats['non_education']}"
+    )
+
+    return passed, stats
+
+
+# ──────────────────────────────────────────────
+# PRE-ENRICHMENT GATE (SERP-only data)
+# ──────────────────────────────────────────────
+
+_BRAND_WORD_RE = re.compile(
+    r"\b(" + "|".join(re.escape(b) for b in sorted(BRAND_BLACKLIST, key=len, reverse=True)) + r")\b",
+    re.IGNORECASE,
+)
+_SERP_LOCATION_RE = re.compile(r"location:\s*([^·|\n]+)", re.IGNORECASE)
+
+
+def serp_gate_verdict(profile: dict) -> tuple[str | None, str]:
+    """
+    Check a discovered (not yet enriched) profile against the blacklist,
+    India and education filters using only its SerpAPI title and snippet.
+    Rejects only on strong evidence — a brand named as a whole word, an
+    explicit non-India "Location:" line, or a non-education headline with no
+    education keyword anywhere. Returns (stat_key, reason) or (None, "").
+    """
+    name = profile.get("name", "") or ""
+    headline = profile.get("headline", "") or ""
+    organization = profile.get("organization", "") or ""
+    snippet = profile.get("snippet", "") or ""
+
+    brand = _BRAND_WORD_RE.search(f"{name} | {headline} | {organization}")
+    if brand:
+        return "blacklisted", f"Blacklisted brand in search result: {brand.group(1)}"
+
+    location = _SERP_LOCATION_RE.search(snippet)
+    if location:
+        place = location.group(1).strip().lower()
+        if place and not _INDIA_MATCHER.any(place):
+            return "non_india", f"Non-India location in search result: {place}"
+
+    headline_lower = headline.lower()
+    if _NON_EDUCATION_MATCHER.any(headline_lower):
+        serp_text = f"{name} {headline} {organization} {snippet}".lower()
+        if not _EDUCATION_MATCHER.any(serp_text):
+            non_edu = _NON_EDUCATION_MATCHER.first(headline_lower)
+            return "non_education", f"Non-education headline in search result: {non_edu}"
+
+    return None, ""
+
+
+def serp_pass_score(profile: dict) -> float:
+    """
+    Rough probability (0–1) that a discovered profile will pass the hard
+    filters once enriched, from its SerpAPI title and snippet.
+    """
+    headline = (profile.get("headline", "") or "").lower()
+    serp_text = (
+        f"{profile.get('name', '')} {headline} {profile.get('organization', '')} {profile.get('snippet', '')}"
+    ).lower()
+
+    score = 0.0
+    score += 1.0 * min(len(_EDUCATION_MATCHER.matches(headline)), 3)
+    score += 0.4 * min(len(_EDUCATION_MATCHER.matches(serp_text)), 5)
+    score -= 0.8 * len(_NON_EDUCATION_MATCHER.matches(serp_text))
+    if _INDIA_MATCHER.any(serp_text):
+        score += 0.5
+    if _LEADERSHIP_MATCHER.any(serp_text) and not _EDU_CONTEXT_MATCHER.any(serp_text):
+        score -= 1.0
+    return 1.0 / (1.0 + math.exp(-(score - 1.0)))
+
+
+def gate_serp_profiles(profiles: list[dict]) -> tuple[list[dict], list[tuple[dict, str, str]]]:
+    """
+    Pre-enrichment gate: drop profiles the hard filters would certainly
+    reject, and order the rest by predicted pass probability (best first,
+    stable for ties). Returns (survivors, [(profile, stat_key, reason), …]).
+    """
+    survivors: list[tuple[float, int, dict]] = []
+    rejected: list[tuple[dict, str, str]] = []
+    for i, p in enumerate(profiles):
+        stat_key, reason = serp_gate_verdict(p)
+        if stat_key:
+            rejected.append((p, stat_key, reason))
+        else:
+            survivors.append((-serp_pass_score(p), i, p))
+    survivors.sort(key=lambda t: (t[0], t[1]))
+    return [p for _, _, p in survivors], rejected
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# GEMINI EXECUTOR (concurrent, RPM/TPM-limited)
+# ──────────────────────────────────────────────────────────────────────────────
+
+class GeminiThrottled(Exception):
+    """Gemini kept rate limiting a request through every retry."""
+
+
+def _is_gemini_rate_limit(err) -> bool:
+    """True if the error is Gemini signalling rate limiting (HTTP 429 / ResourceExhausted)."""
+    if type(err).__name__ in ("ResourceExhausted", "TooManyRequests"):
+        return True
+    msg = str(err).lower()
+    return "429" in msg or "resource exhausted" in msg or "rate limit" in msg or "quota" in msg
+
+
+def _estimate_tokens(text: str) -> int:
+    return len(text) // GEMINI_CHARS_PER_TOKEN + 1
+
+
+class GeminiExecutor:
+    """
+    Runs Gemini requests concurrently within requests-per-minute and
+    tokens-per-minute budgets (tokens estimated from prompt length).
+    A rate-limit response halves the effective rate and pauses every worker
+    before retrying; each success restores the rate a step at a time.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        model_name: str = GEMINI_MODEL,
+        rpm: float = GEMINI_RPM,
+        tpm: float = GEMINI_TPM,
+        max_workers: int = GEMINI_MAX_WORKERS,
+    ):
+        self.api_key = api_key
+        self.model_name = model_name
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_workers = max_workers
+        self._requests = TokenBucket(rpm / 60)
+        self._tokens = TokenBucket(tpm / 60, capacity=max(int(tpm) // 4, 1))
+        self._scale = 1.0
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "rate_limited": 0, "throttled": 0, "tokens": 0}
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        self._genai = genai
+
+    def _set_scale(self, scale: float) -> None:
+        self._scale = scale
+        self._requests.set_rate(self.rpm / 60 * scale)
+        self._tokens.set_rate(self.tpm / 60 * scale)
+
+    def _on_rate_limited(self, attempt: int) -> None:
+        with self._lock:
+            self._stats["rate_limited"] += 1
+            self._set_scale(max(self._scale / 2, 0.05))
+            self._paused_until = max(
+                self._paused_until, time.monotonic() + GEMINI_BACKOFF_SECS * 2 ** attempt
+            )
+
+    def _on_success(self) -> None:
+        with self._lock:
+            if self._scale < 1.0:
+                self._set_scale(min(self._scale + 0.1, 1.0))
+
+    def _wait_for_pause(self) -> None:
+        while True:
+            with self._lock:
+                wait = self._paused_until - time.monotonic()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def generate(self, prompt: str) -> str:
+        """
+        Send one prompt, waiting for budget first. Rate-limited attempts are
+        retried with backoff; raises GeminiThrottled once retries run out.
+        Other API errors propagate unchanged.
+        """
+        tokens = _estimate_tokens(prompt)
+        for attempt in range(GEMINI_MAX_RETRIES + 1):
+            self._wait_for_pause()
+            self._requests.acquire()
+            self._tokens.acquire(amount=tokens)
+            with self._lock:
+                self._stats["requests"] += 1
+                self._stats["tokens"] += tokens
+            try:
+                response = self._genai.GenerativeModel(self.model_name).generate_content(prompt)
+            except Exception as e:
+                if not _is_gemini_rate_limit(e):
+                    raise
+                self._on_rate_limited(attempt)
+                continue
+            self._on_success()
+            return response.text
+        with self._lock:
+            self._stats["throttled"] += 1
+        raise GeminiThrottled(f"Gemini still rate limited after {GEMINI_MAX_RETRIES} retries")
+
+    def map(self, fn, items: list) -> list:
+        """Apply `fn` to each item on the worker pool; results come back in input order."""
+        if len(items) <= 1 or self.max_workers <= 1:
+            return [fn(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(items))) as pool:
+            return list(pool.map(fn, items))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "effective_rpm": round(self.rpm * self._scale, 1)}
+
+
+_gemini_executors: dict[str, GeminiExecutor] = {}
+_gemini_executors_lock = threading.Lock()
+
+
+def get_gemini_executor(api_key: str) -> GeminiExecutor:
+    """Shared executor per API key, so every caller draws on the same budget."""
+    with _gemini_executors_lock:
+        if api_key not in _gemini_executors:
+            _gemini_executors[api_key] = GeminiExecutor(api_key)
+        return _gemini_executors[api_key]
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# CLASSIFICATION CACHE (content-addressed)
+# ──────────────────────────────────────────────────────────────────────────────
+
+def _normalize_field(value: str) -> str:
+    return " ".join(value.split()).casefold()
+
+
+class ClassificationCache:
+    """
+    On-disk memo of Gemini classifications, keyed by a sha256 of the
+    normalized prompt fields plus the prompt/model fingerprint, so an edit to
+    the prompt template or GEMINI_MODEL stops old entries from matching.
+    The prompt fields are stored alongside each result.
+    """
+
+    def __init__(self, filename: str = "classification_cache.db"):
+        self.version = _classify_prompt_version()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = _connect_sqlite(filename)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS classification_cache (
+                    key TEXT PRIMARY KEY,
+                    prompt_version TEXT NOT NULL,
+                    fields TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                ) WITHOUT ROWID
+                """
+            )
+
+    def key_for(self, profile: dict) -> str:
+        fields = [(label, _normalize_field(value)) for label, value in _classification_fields(profile)]
+        payload = json.dumps([self.version, fields], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, profile: dict) -> dict | None:
+        """Cached classification for this profile's prompt fields, or None."""
+        key = self.key_for(profile)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM classification_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, profile: dict, result: dict) -> None:
+        """Store a validated classification under this profile's prompt fields."""
+        fields = dict(_classification_fields(profile))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO classification_cache VALUES (?, ?, ?, ?, ?)",
+                (self.key_for(profile), self.version, json.dumps(fields, ensure_ascii=False),
+                 json.dumps(result), time.time()),
+            )
+
+    def labeled_examples(self) -> list[tuple[dict, dict]]:
+        """All stored (prompt fields, classification) pairs, across prompt versions."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT fields, result FROM classification_cache ORDER BY created_at"
+            ).fetchall()
+        return [(json.loads(f), json.loads(r)) for f, r in rows]
+
+    def stats(self) -> dict:
+        """Hit/miss counters for this process plus entries valid for the current prompt."""
+        with self._lock:
+            entries = self._conn.execute(
+                "SELECT COUNT(*) FROM classification_cache WHERE prompt_version = ?", (self.version,)
+            ).fetchone()[0]
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": entries,
+            }
+
+
+_classification_cache: ClassificationCache | None = None
+
+
+def get_classification_cache() -> ClassificationCache | None:
+    """Return the shared classification cache, or None if the cache file can't be opened."""
+    global _classification_cache
+    if _classification_cache is None:
+        try:
+            _classification_cache = ClassificationCache()
+        except (OSError, sqlite3.Error):
+            return None
+    return _classification_cache
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# LOCAL CLASSIFIER (hashed n-grams + logistic regression, trained on Gemini labels)
+# ──────────────────────────────────────────────────────────────────────────────
+
+LOCAL_MODEL_FEATURE_VERSION = 1
+_LOCAL_MODEL_PREFIX = "persona_v"
+_LOCAL_FIELD_CODES = {
+    "Headline": "h", "Location": "l", "About": "a", "Current Company": "c",
+    "Current Role": "r", "Experience": "x", "Education": "e", "Skills": "s",
+}
+_LOCAL_TOKEN_RE = re.compile(r"[a-z0-9+#]+")
+_LOCAL_HEADS = {
+    "persona_type": PERSONA_TYPES,
+    "seniority": [""] + SENIORITY_LEVELS,
+    "collaboration_potential": [""] + COLLABORATION_LEVELS,
+    "is_relevant": [False, True],
+}
+# Heads whose confidence decides whether a prediction may skip Gemini
+_LOCAL_GATING_HEADS = ("persona_type", "seniority", "is_relevant")
+
+
+def _local_tokens(fields: dict) -> list[str]:
+    """Per-field word unigrams/bigrams plus field-agnostic unigrams for one set of prompt fields."""
+    feats = []
+    for label, code in _LOCAL_FIELD_CODES.items():
+        tokens = _LOCAL_TOKEN_RE.findall(str(fields.get(label, "")).lower())
+        feats.extend(f"{code}:{t}" for t in tokens)
+        feats.extend(f"{code}:{a}_{b}" for a, b in zip(tokens, tokens[1:]))
+        feats.extend(f"*:{t}" for t in tokens)
+    return feats
+
+
+def _local_design(rows: list[dict], dim: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Hashed, L2-normalized log-count features for a batch of prompt-field
+    dicts, as CSR arrays (indices, values, indptr). Column 0 is a bias.
+    """
+    import pandas as pd
+
+    token_lists = [_local_tokens(f) for f in rows]
+    lengths = np.fromiter((len(t) for t in token_lists), dtype=np.int64, count=len(rows))
+    flat = np.array([t for tokens in token_lists for t in tokens], dtype=object)
+    cols = (pd.util.hash_array(flat) % np.uint64(dim - 1)).astype(np.int64) + 1 if len(flat) else np.zeros(0, np.int64)
+    # Bias column for every row, then count (row, column) pairs in one pass
+    row_ids = np.concatenate((np.arange(len(rows)), np.repeat(np.arange(len(rows)), lengths)))
+    cols = np.concatenate((np.zeros(len(rows), dtype=np.int64), cols))
+    keys, counts = np.unique(row_ids * dim + cols, return_counts=True)
+    key_rows, indices = np.divmod(keys, dim)
+    values = np.where(indices == 0, 0.0, np.log1p(counts)).astype(np.float32)
+    norms = np.sqrt(np.bincount(key_rows, weights=values ** 2, minlength=len(rows)))
+    values /= np.maximum(norms[key_rows], 1e-6).astype(np.float32)
+    values[indices == 0] = 1.0
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(key_rows, minlength=len(rows)))
+    return indices, values, indptr
+
+
+def _sparse_logits(weights: np.ndarray, indices, values, indptr) -> np.ndarray:
+    # Every row holds at least the bias feature, so no reduceat segment is empty
+    return np.add.reduceat(weights[indices] * values[:, None], indptr[:-1], axis=0)
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    z = logits - logits.max(axis=1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=1, keepdims=True)
+
+
+class LocalClassifier:
+    """
+    Multinomial logistic regression heads (persona, seniority, collaboration
+    potential, relevance) over hashed n-gram features, with a per-head
+    temperature fitted on held-out Gemini labels. Saved as versioned
+    `persona_vNNNN.npz` + `.json` files under DATA_DIR/models.
+    """
+
+    def __init__(self, weights: dict[str, np.ndarray], temperatures: dict[str, float], meta: dict):
+        self.weights = weights
+        self.temperatures = temperatures
+        self.meta = meta
+        self.dim = int(meta.get("dim", LOCAL_MODEL_DIM))
+
+    @property
+    def version(self) -> int:
+        return int(self.meta.get("version", 0))
+
+    def _probabilities(self, design) -> dict[str, np.ndarray]:
+        return {
+            head: _softmax(_sparse_logits(w, *design) / self.temperatures.get(head, 1.0))
+            for head, w in self.weights.items()
+        }
+
+    def predict_fields(self, rows: list[dict]) -> list[tuple[dict, float]]:
+        """
+        Classify prompt-field dicts. Returns (classification, confidence) per
+        row; confidence is the lowest calibrated probability of the heads that
+        affect tiering. The model has no subject/grade/board heads, so those
+        come from keyword extraction (`_teaching_scope`).
+        """
+        if not rows:
+            return []
+        probs = self._probabilities(_local_design(rows, self.dim))
+        best = {head: p.argmax(axis=1) for head, p in probs.items()}
+        confidence = np.min([probs[h].max(axis=1) for h in _LOCAL_GATING_HEADS], axis=0)
+        results = []
+        for i in range(len(rows)):
+            result: dict = _teaching_scope(rows[i])
+            for head, labels in _LOCAL_HEADS.items():
+                result[head] = labels[int(best[head][i])]
+            result["reason"] = f"Local model v{self.version} (confidence {confidence[i]:.2f})"
+            results.append((result, float(confidence[i])))
+        return results
+
+    def classify_many(self, profiles: list[dict]) -> list[tuple[dict, float]]:
+        return self.predict_fields([dict(_classification_fields(p)) for p in profiles])
+
+    def save(self, directory: str) -> str:
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, f"{_LOCAL_MODEL_PREFIX}{self.version:04d}")
+        np.savez_compressed(base + ".npz", **{head: w.astype(np.float32) for head, w in self.weights.items()})
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump({**self.meta, "temperatures": self.temperatures}, f, indent=2)
+        return base
+
+    @classmethod
+    def load(cls, base: str) -> "LocalClassifier":
+        with open(base + ".json", encoding="utf-8") as f:
+            meta = json.load(f)
+        with np.load(base + ".npz") as data:
+            weights = {head: data[head] for head in data.files}
+        return cls(weights, meta.pop("temperatures", {}), meta)
+
+
+def _local_model_dir() -> str:
+    return os.path.join(DATA_DIR, "models")
+
+
+def list_local_models(directory: str | None = None) -> list[dict]:
+    """Metadata of every saved model, oldest version first."""
+    directory = directory or _local_model_dir()
+    if not os.path.isdir(directory):
+        return []
+    metas = []
+    for name in sorted(os.listdir(directory)):
+        if name.startswith(_LOCAL_MODEL_PREFIX) and name.endswith(".json"):
+            try:
+                with open(os.path.join(directory, name), encoding="utf-8") as f:
+                    metas.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+    return sorted(metas, key=lambda m: m.get("version", 0))
+
+
+def _fit_head(design, y: np.ndarray, n_classes: int, dim: int, epochs: int, l2: float, seed: int) -> np.ndarray:
+    """Mini-batch AdaGrad on the softmax cross-entropy of one head."""
+    indices, values, indptr = design
+    n = len(indptr) - 1
+    rng = np.random.default_rng(seed)
+    w = np.zeros((dim, n_classes), dtype=np.float32)
+    g2 = np.full((dim, n_classes), 1e-6, dtype=np.float32)
+    lr = 0.5
+    for _ in range(epochs):
+        order = rng.permutation(n)
+        for start in range(0, n, 128):
+            rows = order[start : start + 128]
+            starts, ends = indptr[rows], indptr[rows + 1]
+            lengths = ends - starts
+            flat = np.concatenate([np.arange(a, b) for a, b in zip(starts, ends)])
+            owner = np.repeat(np.arange(len(rows)), lengths)
+            sub_indptr = np.concatenate(([0], np.cumsum(lengths)))
+            logits = _sparse_logits(w, indices[flat], values[flat], sub_indptr)
+            err = _softmax(logits)
+            err[np.arange(len(rows)), y[rows]] -= 1.0
+            feat = indices[flat]
+            grad_rows = values[flat, None] * err[owner] / len(rows)
+            uniq, inverse = np.unique(feat, return_inverse=True)
+            grad = np.zeros((len(uniq), n_classes), dtype=np.float32)
+            np.add.at(grad, inverse, grad_rows)
+            grad += l2 * w[uniq]
+            g2[uniq] += grad ** 2
+            w[uniq] -= lr * grad / np.sqrt(g2[uniq])
+    return w
+
+
+def _fit_temperature(logits: np.ndarray, y: np.ndarray) -> float:
+    """Temperature minimizing calibration-set negative log-likelihood (grid search)."""
+    best_t, best_nll = 1.0, float("inf")
+    for t in np.geomspace(0.25, 4.0, 41):
+        p = _softmax(logits / t)[np.arange(len(y)), y]
+        nll = float(-np.log(np.clip(p, 1e-9, 1.0)).mean())
+        if nll < best_nll:
+            best_t, best_nll = float(t), nll
+    return best_t
+
+
+def train_local_classifier(
+    examples: list[tuple[dict, dict]],
+    directory: str | None = None,
+    holdout_fraction: float = 0.2,
+    epochs: int = 8,
+    l2: float = 1e-4,
+    save: bool = True,
+) -> LocalClassifier | None:
+    """
+    Train a new model version on (prompt fields, Gemini classification)
+    pairs. A deterministic slice of examples (by content hash) is held out
+    and split in two: the first half calibrates the temperatures, the second
+    is used only for evaluation. The metrics, including accuracy and coverage
+    at LOCAL_MODEL_MIN_CONFIDENCE, go into the model metadata, with
+    `deployable` set when confident evaluation predictions are at least
+    LOCAL_MODEL_MIN_ACCURACY accurate.
+    Returns None if there are fewer than LOCAL_MODEL_MIN_EXAMPLES examples.
+    """
+    directory = directory or _local_model_dir()
+    examples = [(f, r) for f, r in examples if r.get("persona_type") in PERSONA_TYPES]
+    if len(examples) < LOCAL_MODEL_MIN_EXAMPLES:
+        return None
+
+    def _label(head: str, result: dict) -> int:
+        labels = _LOCAL_HEADS[head]
+        value = result.get(head, labels[0] if head != "is_relevant" else True)
+        return labels.index(value) if value in labels else 0
+
+    buckets = np.array([
+        zlib.crc32(json.dumps(f, sort_keys=True).encode("utf-8")) % 1000 for f, _ in examples
+    ])
+    cut = int(holdout_fraction * 1000)
+    calib, held = buckets < cut // 2, (buckets >= cut // 2) & (buckets < cut)
+    if not calib.any() or not held.any() or (calib | held).all():
+        position = np.arange(len(examples)) % 10
+        calib, held = position == 0, position == 5
+    train = ~(calib | held)
+
+    def _split(mask: np.ndarray) -> list[dict]:
+        return [f for (f, _), m in zip(examples, mask) if m]
+
+    def _labels(head: str, mask: np.ndarray) -> np.ndarray:
+        return np.array([_label(head, r) for (_, r), m in zip(examples, mask) if m])
+
+    train_rows, calib_rows, test_rows = _split(train), _split(calib), _split(held)
+    train_design = _local_design(train_rows, LOCAL_MODEL_DIM)
+    calib_design = _local_design(calib_rows, LOCAL_MODEL_DIM)
+    test_design = _local_design(test_rows, LOCAL_MODEL_DIM)
+
+    weights: dict[str, np.ndarray] = {}
+    temperatures: dict[str, float] = {}
+    metrics: dict = {"heads": {}}
+    test_probs: dict[str, np.ndarray] = {}
+    test_y: dict[str, np.ndarray] = {}
+    for head, labels in _LOCAL_HEADS.items():
+        y = _labels(head, train)
+        weights[head] = _fit_head(train_design, y, len(labels), LOCAL_MODEL_DIM, epochs, l2, seed=len(examples))
+        temperatures[head] = _fit_temperature(_sparse_logits(weights[head], *calib_design), _labels(head, calib))
+        test_y[head] = _labels(head, held)
+        test_probs[head] = _softmax(_sparse_logits(weights[head], *test_design) / temperatures[head])
+        metrics["heads"][head] = {
+            "accuracy": float((test_probs[head].argmax(axis=1) == test_y[head]).mean())
+        }
+
+    confidence = np.min([test_probs[h].max(axis=1) for h in _LOCAL_GATING_HEADS], axis=0)
+    all_correct = np.all([test_probs[h].argmax(axis=1) == test_y[h] for h in _LOCAL_GATING_HEADS], axis=0)
+    confident = confidence >= LOCAL_MODEL_MIN_CONFIDENCE
+    metrics["coverage"] = float(confident.mean())
+    metrics["confident_accuracy"] = float(all_correct[confident].mean()) if confident.any() else 0.0
+    metrics["overall_accuracy"] = float(all_correct.mean())
+
+    previous = list_local_models(directory)
+    meta = {
+        "version": (previous[-1]["version"] + 1) if previous else 1,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "feature_version": LOCAL_MODEL_FEATURE_VERSION,
+        "dim": LOCAL_MODEL_DIM,
+        "n_train": len(train_rows),
+        "n_calibration": len(calib_rows),
+        "n_holdout": len(test_rows),
+        "min_confidence": LOCAL_MODEL_MIN_CONFIDENCE,
+        "metrics": metrics,
+        "deployable": bool(confident.any() and metrics["confident_accuracy"] >= LOCAL_MODEL_MIN_ACCURACY),
+    }
+    model = LocalClassifier(weights, temperatures, meta)
+    if save:
+        model.save(directory)
+    return model
+
+
+_local_model: LocalClassifier | None = None
+
+
+def get_local_classifier() -> LocalClassifier | None:
+    """Newest deployable model on disk (reloaded when a newer one appears), or None."""
+    global _local_model
+    candidates = [
+        m for m in list_local_models()
+        if m.get("deployable") and m.get("feature_version") == LOCAL_MODEL_FEATURE_VERSION
+    ]
+    if not candidates:
+        return None
+    newest = candidates[-1]["version"]
+    if _local_model is None or _local_model.version != newest:
+        try:
+            _local_model = LocalClassifier.load(
+                os.path.join(_local_model_dir(), f"{_LOCAL_MODEL_PREFIX}{newest:04d}")
+            )
+        except (OSError, ValueError, KeyError):
+            return None
+    return _local_model
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# PHASE 4: GEMINI AI CLASSIFICATION
+# ──────────────────────────────────────────────────────────────────────────────
+
+CLASSIFY_BATCH_PROMPT_TEMPLATE = """Analyze these LinkedIn profiles for an education platform collaboration. Return ONLY valid JSON.
+
+{profile_blocks}
+
+        Classify each profile into ONE persona type:
+        - "Individual Tutor": Single teacher/tutor
+        - "Institute Leader": Principal, VP, Director of school/coaching
+        - "EdTech Decision-Maker": Founder/CEO/COO of edtech
+        - "School Administrator": HOD, Academic Head, Coordinator
+        - "Coaching Institute Owner": Owner of coaching center
+        - "Irrelevant": Not education related or Big Corp employee
+
+        Also detect for each profile:
+        - subjects: [Mathematics, Physics, Chemistry, Biology, English, etc]
+        - grades: [6,7,8,9,10,11,12]
+        - boards: [CBSE, ICSE, IB, IGCSE, Cambridge]
+        - seniority: "Owner/Founder", "C-Level", "Director", "Principal", "HOD", "Teacher"
+        - collaboration_potential: "High" (decision-maker), "Medium", "Low"
+
+        Return ONLY a JSON array with one object per profile, in any order:
+        [{{"id": "p0", "persona_type": "...", "subjects": [...], "grades": [...], "boards": [...], "seniority": "...", "collaboration_potential": "...", "is_relevant": true, "reason": "..."}}]
+        """
+
+
+def _classify_prompt_version() -> str:
+    """Fingerprint of the classification prompt and model; changing either invalidates cached results."""
+    return hashlib.sha256(
+        "\x00".join([GEMINI_MODEL, CLASSIFY_BATCH_PROMPT_TEMPLATE]).encode("utf-8")
+    ).hexdigest()[:16]
+
+
+def _keyword_pattern(keywords: list[str]) -> re.Pattern:
+    return re.compile(r"\b(?:" + "|".join(re.escape(kw) for kw in keywords) + r")\b")
+
+
+_SUBJECT_PATTERNS = [(label, _keyword_pattern(kws)) for label, kws in SUBJECT_KEYWORDS.items()]
+_BOARD_PATTERNS = [(label, _keyword_pattern(kws)) for label, kws in BOARD_KEYWORDS.items()]
+# "class 9-12", "grades 6 to 8", "std 10", "11th & 12th"
+_GRADE_RANGE_RE = re.compile(
+    r"\b(?:class(?:es)?|grades?|std|standard)\s*(\d{1,2})(?:\s*(?:-|–|to|&|and)\s*(\d{1,2}))?\b"
+)
+_GRADE_ORDINAL_RE = re.compile(r"\b(\d{1,2})(?:st|nd|rd|th)\b")
+_SENIOR_EXAM_RE = re.compile(r"\b(?:jee|neet|iit)\b")
+_SCOPE_FIELDS = ("Headline", "About", "Current Company", "Current Role", "Experience", "Education", "Skills")
+
+
+def _teaching_scope(fields: dict) -> dict:
+    """
+    Subjects, grades and boards named in a profile's prompt fields (see
+    `_classification_fields`), by keyword. Grades are ints between 1 and 12;
+    JEE/NEET coaching implies 11 and 12.
+    """
+    text = " ".join(str(fields.get(label, "")) for label in _SCOPE_FIELDS).lower()
+    grades: set[int] = set()
+    for low, high in _GRADE_RANGE_RE.findall(text):
+        low = int(low)
+        high = int(high) if high else low
+        if 1 <= low <= high <= 12:
+            grades.update(range(low, high + 1))
+    grades.update(g for g in map(int, _GRADE_ORDINAL_RE.findall(text)) if 6 <= g <= 12)
+    if _SENIOR_EXAM_RE.search(text):
+        grades.update((11, 12))
+    return {
+        "subjects": [label for label, pattern in _SUBJECT_PATTERNS if pattern.search(text)],
+        "grades": sorted(grades),
+        "boards": [label for label, pattern in _BOARD_PATTERNS if pattern.search(text)],
+    }
+
+
+def fallback_classify(profile: dict) -> dict:
+    """Keyword-based classification when Gemini is unavailable."""
+    headline = (profile.get("headline", "") or "").lower()
+    company = (profile.get("current_company", "") or "").lower()
+    scope = _teaching_scope(dict(_classification_fields(profile)))
+    
+    # Check for institute keywords
+    if any(kw.lower() in company for kw in INSTITUTE_KEYWORDS):
+        return {
+            "persona_type": "Coaching Institute Owner",
+            **scope,
+            "is_relevant": True,
+            "reason": "Institute keyword match"
+        }
+    
+    # Check for school roles
+    if any(role in headline for role in ["principal", "vice principal", "headmaster", "director"]):
+        return {
+            "persona_type": "Institute Leader",
+            **scope,
+            "is_relevant": True,
+            "reason": "School leadership role match"
+        }
+    
+    # Check for founder/CEO
+    if any(role in headline for role in ["founder", "ceo", "co-founder"]):
+        if any(kw in headline + company for kw in ["education", "edtech", "learn", "school", "academy"]):
+            return {
+                "persona_type": "EdTech Decision-Maker",
+                **scope,
+                "is_relevant": True,
+                "reason": "EdTech founder match"
+            }
+    
+    # Default
+    return {
+        "persona_type": "Individual Tutor",
+        **scope,
+        "is_relevant": True,
+        "reason": "Fallback default"
+    }
+
+def _classification_fields(profile: dict) -> list[tuple[str, str]]:
+    """The profile fields interpolated into the classification prompts, as (label, value)."""
+    return [
+        ("Name", str(profile.get('full_name', ''))),
+        ("Headline", str(profile.get('headline', ''))),
+        ("Location", str(profile.get('location', ''))),
+        ("About", (profile.get('about', '') or '')[:500]),
+        ("Current Company", str(profile.get('current_company', ''))),
+        ("Current Role", str(profile.get('current_role', ''))),
+        ("Experience", str(profile.get('raw_experience', []))[:500]),
+        ("Education", str(profile.get('raw_education', []))[:300]),
+        ("Skills", str(profile.get('skills', []))[:200]),
+    ]
+
+
+def _profile_prompt_block(profile: dict, indent: str = "        ") -> str:
+    """Profile fields as listed in the classification prompts."""
+    return "\n".join(f"{indent}- {label}: {value}" for label, value in _classification_fields(profile))
+
+
+def _strip_json_fences(text: str) -> str:
+    """Remove a markdown code fence wrapped around a JSON reply."""
+    text = text.strip()
+    if text.startswith("```json"):
+        text = text[7:]
+    elif text.startswith("```"):
+        text = text[3:]
+    if text.endswith("```"):
+        text = text[:-3]
+    return text.strip()
+
+
+def _validate_classification(item) -> dict | None:
+    """
+    Check one classification result against the persona schema.
+    Returns a normalized copy, or None if it doesn't fit.
+    """
+    if not isinstance(item, dict) or item.get("persona_type") not in PERSONA_TYPES:
+        return None
+    result = {"persona_type": item["persona_type"]}
+    for field in ("subjects", "grades", "boards"):
+        value = item.get(field, [])
+        if not isinstance(value, list):
+            return None
+        result[field] = value
+    for field, allowed in (("seniority", SENIORITY_LEVELS), ("collaboration_potential", COLLABORATION_LEVELS)):
+        value = item.get(field) or ""
+        if value and value not in allowed:
+            return None
+        result[field] = value
+    is_relevant = item.get("is_relevant", item["persona_type"] != "Irrelevant")
+    if not isinstance(is_relevant, bool):
+        return None
+    result["is_relevant"] = is_relevant
+    result["reason"] = str(item.get("reason", ""))
+    return result
+
+
+def _build_batch_prompt(profiles: list[dict]) -> str:
+    """Batch classification prompt for `profiles`, identified as p0, p1, …"""
+    blocks = "\n\n".join(
+        f"        Profile id \"p{i}\":\n{_profile_prompt_block(p)}"
+        for i, p in enumerate(profiles)
+    )
+    return CLASSIFY_BATCH_PROMPT_TEMPLATE.format(profile_blocks=blocks)
+
+
+def _plan_classification_batches(
+    profiles: list[dict], batch_size: int, max_input_tokens: int
+) -> list[list[int]]:
+    """Group profile indexes into batches bounded by count and estimated prompt tokens."""
+    overhead = _estimate_tokens(_build_batch_prompt([]))
+    batches: list[list[int]] = []
+    current: list[int] = []
+    tokens = overhead
+    for i, p in enumerate(profiles):
+        cost = _estimate_tokens(_profile_prompt_block(p)) + 8
+        if current and (len(current) >= batch_size or tokens + cost > max_input_tokens):
+            batches.append(current)
+            current, tokens = [], overhead
+        current.append(i)
+        tokens += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def classify_linkedin_profiles_batch(
+    profiles: list[dict],
+    api_key: str,
+    batch_size: int | None = None,
+    max_input_tokens: int | None = None,
+    stats: dict | None = None,
+    executor: GeminiExecutor | None = None,
+    use_cache: bool = True,
+    local_model: LocalClassifier | None = None,
+    metrics: Metrics | None = None,
+    budget: RunBudget | None = None,
+) -> list[dict]:
+    """
+    Classify many profiles with one Gemini request per batch; batches run
+    concurrently through the (shared) GeminiExecutor.
+    Each prompt packs up to `batch_size` profiles (and at most
+    `max_input_tokens` estimated prompt tokens); the reply is a JSON array
+    keyed by profile id. Elements that are missing or fail schema validation
+    fall back to `fallback_classify` for that profile alone.
+    Profiles already in the classification cache are answered from it and
+    never sent; fresh valid results are written back. With a `local_model`,
+    the remaining profiles it classifies at LOCAL_MODEL_MIN_CONFIDENCE or
+    better skip Gemini too. Without an API key the less confident ones get
+    `fallback_classify`, like any profile Gemini couldn't answer.
+    Returns one classification per profile, in input order. If `stats` is
+    given, counts are added to it: "requests", "cached", "local", "parsed" and "fallbacks", with
+    fallbacks split into "throttled" (gave up on rate limiting),
+    "parse_failures" (bad or incomplete replies), "errors" (other API errors)
+    and "over_budget" (`budget` granted no request for the batch).
+    `metrics` gets the same counts by source, plus Gemini request outcomes,
+    latency and credits.
+    """
+    metrics = metrics or Metrics()
+    batch_size = batch_size or GEMINI_BATCH_SIZE
+    max_input_tokens = max_input_tokens or GEMINI_BATCH_MAX_INPUT_TOKENS
+    stats = stats if stats is not None else {}
+    for key in (
+        "requests", "cached", "local", "parsed", "fallbacks", "throttled", "parse_failures", "errors", "over_budget",
+    ):
+        stats.setdefault(key, 0)
+
+    results: list[dict | None] = [None] * len(profiles)
+    # Why each profile fell back; anything unset is a parse failure
+    failure_kind: dict[int, str] = {}
+
+    def _classify_chunk(indexes: list[int]) -> None:
+        prompt = _build_batch_prompt([profiles[i] for i in indexes])
+        if budget is not None and not budget.reserve(
+            "gemini", 1, gemini_cost(_estimate_tokens(prompt), GEMINI_OUTPUT_TOKENS_PER_PROFILE * len(indexes))
+        ):
+            failure_kind.update((i, "over_budget") for i in indexes)
+            return
+        metrics.inc("credits", provider="gemini")
+        start = time.monotonic()
+        try:
+            text = executor.generate(prompt)
+        except GeminiThrottled:
+            metrics.inc("provider_requests", provider="gemini", op="classify", outcome="throttled")
+            failure_kind.update((i, "throttled") for i in indexes)
+            return
+        except Exception:
+            metrics.inc("provider_requests", provider="gemini", op="classify", outcome="error")
+            failure_kind.update((i, "errors") for i in indexes)
+            return
+        finally:
+            metrics.observe("provider_latency_seconds", time.monotonic() - start, provider="gemini", op="classify")
+        metrics.inc("provider_requests", provider="gemini", op="classify", outcome="ok")
+        try:
+            parsed = json.loads(_strip_json_fences(text))
+        except ValueError:
+            return
+        if isinstance(parsed, dict):
+            parsed = parsed.get("results") or parsed.get("profiles") or []
+        if not isinstance(parsed, list):
+            return
+        for item in parsed:
+            if not isinstance(item, dict):
+                continue
+            pid = str(item.get("id", ""))
+            if not pid.startswith("p") or not pid[1:].isdigit() or int(pid[1:]) >= len(indexes):
+                continue
+            slot = indexes[int(pid[1:])]
+            if results[slot] is None:
+                results[slot] = _validate_classification(item)
+
+    cache = get_classification_cache() if use_cache and api_key else None
+    pending = list(range(len(profiles)))
+    if cache is not None:
+        for i in range(len(profiles)):
+            results[i] = cache.get(profiles[i])
+        pending = [i for i in pending if results[i] is None]
+        metrics.inc("cache_lookups", len(profiles) - len(pending), cache="classification", result="hit")
+        metrics.inc("cache_lookups", len(pending), cache="classification", result="miss")
+    stats["cached"] += len(profiles) - len(pending)
+    metrics.inc("classifications", len(profiles) - len(pending), source="cache")
+
+    if local_model is not None and pending:
+        predictions = local_model.classify_many([profiles[i] for i in pending])
+        still_pending = []
+        for i, (result, confidence) in zip(pending, predictions):
+            if confidence >= LOCAL_MODEL_MIN_CONFIDENCE:
+                results[i] = result
+                stats["local"] += 1
+            else:
+                still_pending.append(i)
+        metrics.inc("classifications", len(pending) - len(still_pending), source="local")
+        pending = still_pending
+
+    if api_key and pending:
+        executor = executor or get_gemini_executor(api_key)
+        chunks = [
+            [pending[j] for j in chunk]
+            for chunk in _plan_classification_batches(
+                [profiles[i] for i in pending], batch_size, max_input_tokens
+            )
+        ]
+        stats["requests"] += len(chunks)
+        executor.map(_classify_chunk, chunks)
+        if cache is not None:
+            for i in pending:
+                if results[i] is not None:
+                    cache.put(profiles[i], results[i])
+
+    for i in pending:
+        if results[i] is None:
+            results[i] = fallback_classify(profiles[i])
+            stats["fallbacks"] += 1
+            metrics.inc("classifications", source="fallback")
+            if api_key:
+                stats[failure_kind.get(i, "parse_failures")] += 1
+        else:
+            stats["parsed"] += 1
+            metrics.inc("classifications", source="gemini")
+    return results
+
+# ──────────────────────────────────────────────────────────────────────────────
+# PHASE 5: CONTACT EXTRACTION + TIER SCORING
+# ──────────────────────────────────────────────────────────────────────────────
+
+def extract_linkedin_contacts(profile: dict) -> dict:
+    """Extract email, phone, and social links from text fields."""
+    text_blob = (
+        f"{profile.get('about', '')} {profile.get('headline', '')} "
+        f"{profile.get('website', '')}"
+    ).lower()
+
+    contacts = {
+        "email": "", "phone": "", "website": "", "twitter": "",
+        "facebook": "", "instagram": "", "youtube": "", "whatsapp": ""
+    }
+
+    # Email
+    email_match = re.search(r'[\w\.-]+@[\w\.-]+\.\w+', text_blob)
+    if email_match:
+        contacts["email"] = email_match.group(0)
+
+    # Phone (Indian format mostly)
+    phone_match = re.search(r'(?:\+91[\s-]?)?(?:0)?[6-9]\d{9}', text_blob)
+    if phone_match:
+        contacts["phone"] = phone_match.group(0)
+    
+    # Socials
+    if "wa.me" in text_blob or "chat.whatsapp" in text_blob:
+        contacts["whatsapp"] = "Yes"
+    if "instagram.com" in text_blob:
+        contacts["instagram"] = "Yes"
+    if "youtube.com" in text_blob or "youtu.be" in text_blob:
+        contacts["youtube"] = "Yes"
+    
+    # External Website from Apify
+    if profile.get("website"):
+        contacts["website"] = profile.get("website")
+
+    return contacts
+
+def calculate_contact_confidence(contacts: dict) -> str:
+    if contacts["email"] and contacts["phone"]: return "High"
+    if contacts["email"] or contacts["phone"]: return "Medium"
+    if contacts["website"] or contacts["whatsapp"]: return "Medium-Low"
+    return "LinkedIn Only"
+
+def calculate_linkedin_tier(profile: dict, contacts: dict, classification: dict) -> str:
+    """
+    Tier A: Decision Maker + High Potential + Contact Info
+    Tier B: Relevant + Senior Role + Contact Info
+    Tier C: Relevant + LinkedIn Only
+    Tier D: Low priority
+    """
+    persona = classification.get("persona_type", "")
+    seniority = classification.get("seniority", "")
+    is_relevant = classification.get("is_relevant", True)
+    has_contact = bool(contacts["email"] or contacts["phone"] or contacts["website"])
+    
+    if not is_relevant:
+        return "D"
+
+    # Tier A: Decision Makers with Contact
+    if has_contact and (
+        "Founder" in seniority or "Owner" in seniority or 
+        "Principal" in seniority or "Director" in seniority or "C-Level" in seniority
+    ):
+        return "A"
+    
+    # Tier B: HODs/Teachers with Contact OR Decision Makers without contact
+    if has_contact or "Founder" in seniority or "Principal" in seniority:
+        return "B"
+        
+    # Tier C: Teachers/Tutors (LinkedIn reachout)
+    if persona in ["Individual Tutor", "Teacher"]:
+        return "C"
+        
+    return "D"
+
+def generate_linkedin_fit_summary(
+    profile: dict, api_key: str, executor: GeminiExecutor | None = None, metrics: Metrics | None = None,
+    budget: RunBudget | None = None,
+) -> str:
+    """Generate 2-sentence fit summary for Tier A/B (a stock line if `budget` grants no request)."""
+    if not api_key: return "Fit summary unavailable (no key)."
+    metrics = metrics or Metrics()
+    prompt = f"""Write a 2-sentence summary of why this LinkedIn professional is a good B2B lead for an online tutoring platform.
+        Profile: {profile.get('full_name')} | {profile.get('headline')} | {profile.get('persona_type')}
+        Return ONLY the summary."""
+    if budget is not None and not budget.reserve(
+        "gemini", 1, gemini_cost(_estimate_tokens(prompt), GEMINI_OUTPUT_TOKENS_PER_PROFILE)
+    ):
+        return f"{profile.get('persona_type')} based in {profile.get('location')}."
+    start = time.monotonic()
+    try:
+        executor = executor or get_gemini_executor(api_key)
+        metrics.inc("credits", provider="gemini")
+        summary = executor.generate(prompt).strip()
+        metrics.inc("provider_requests", provider="gemini", op="summary", outcome="ok")
+        return summary
+    except Exception as e:
+        outcome = "throttled" if isinstance(e, GeminiThrottled) else "error"
+        metrics.inc("provider_requests", provider="gemini", op="summary", outcome=outcome)
+        return f"{profile.get('persona_type')} based in {profile.get('location')}."
+    finally:
+        metrics.observe("provider_latency_seconds", time.monotonic() - start, provider="gemini", op="summary")
+
+# ──────────────────────────────────────────────────────────────────────────────
+# PHASE 6: DEEP FILTERING ORCHESTRATOR
+# ──────────────────────────────────────────────────────────────────────────────
+
+_PIPELINE_DONE = object()  # end-of-stream marker passed between pipeline stages
+
+
+class _StatusRelay:
+    """
+    Thread-safe stand-in for a Streamlit status container.
+    Pipeline stage threads write here; the calling thread replays the
+    messages into the real container (Streamlit elements can only be
+    updated from the script thread).
+    """
+
+    def __init__(self):
+        self._messages: queue.Queue = queue.Queue()
+
+    def write(self, msg) -> None:
+        self._messages.put(("write", msg))
+
+    def warning(self, msg) -> None:
+        self._messages.put(("warning", msg))
+
+    def drain(self, container) -> None:
+        while True:
+            try:
+                kind, msg = self._messages.get_nowait()
+            except queue.Empty:
+                return
+            getattr(container, kind)(msg)
+
+
+PIPELINE_STAGES = ("discovery", "enrichment", "filter", "classification")
+
+
+def _fmt_bound(seconds: float | None) -> str:
+    """A histogram bucket bound as display text ("≤2.5s")."""
+    if seconds is None:
+        return "–"
+    if seconds == math.inf:
+        return f">{METRICS_LATENCY_BUCKETS[-1]:g}s"
+    return f"≤{seconds:g}s"
+
+
+def metrics_stage_rows(metrics: Metrics) -> list[dict]:
+    """Per-stage table rows (items, batches, batch latency) for the status panel."""
+    rows = []
+    for stage in PIPELINE_STAGES:
+        lat = metrics.latency("stage_batch_seconds", stage=stage)
+        rows.append({
+            "stage": stage,
+            "items": int(metrics.total("stage_items", stage=stage)),
+            "batches": lat["count"],
+            "p50": _fmt_bound(lat["p50"]),
+            "p95": _fmt_bound(lat["p95"]),
+        })
+    return rows
+
+
+def metrics_provider_rows(metrics: Metrics) -> list[dict]:
+    """Per provider / actor / Gemini operation table rows for the status panel."""
+    rows = []
+    series = [("serpapi", {})]
+    series += [("apify", {"actor": a}) for a in metrics.breakdown("provider_requests", "actor", provider="apify")]
+    series += [("gemini", {"op": op}) for op in metrics.breakdown("provider_requests", "op", provider="gemini")]
+    for provider, labels in series:
+        requests = metrics.total("provider_requests", provider=provider, **labels)
+        if not requests:
+            continue
+        outcomes = metrics.breakdown("provider_requests", "outcome", provider=provider, **labels)
+        lat = metrics.latency("provider_latency_seconds", provider=provider, **labels)
+        rows.append({
+            "provider": " · ".join([provider, *labels.values()]),
+            "requests": int(requests),
+            "ok": int(outcomes.get("ok", 0) + outcomes.get("empty", 0)),
+            "failed": int(requests - outcomes.get("ok", 0) - outcomes.get("empty", 0)),
+            "p50": _fmt_bound(lat["p50"]),
+            "p95": _fmt_bound(lat["p95"]),
+        })
+    return rows
+
+
+def metrics_budget_line(metrics: Metrics) -> str:
+    """Estimated spend, projected spend and units used against the run caps ("" until published)."""
+    spend = metrics.gauge("spend_usd")
+    if spend is None:
+        return ""
+    projected = metrics.gauge("spend_projected_usd")
+    parts = []
+    for provider, name in (("serpapi", "SerpAPI"), ("apify", "Apify"), ("gemini", "Gemini")):
+        used = metrics.gauge("budget_used", provider=provider) or 0
+        cap = metrics.gauge("budget_cap", provider=provider)
+        parts.append(f"{name} {used:g}" + (f"/{cap:g}" if cap is not None else ""))
+    return (
+        f"💵 Spend ~${spend:.2f} (projected ~${spend if projected is None else projected:.2f} for the target) — "
+        + " · ".join(parts)
+    )
+
+
+def summarize_run_metrics(metrics: Metrics) -> list[str]:
+    """End-of-run summary lines, rendered from the run's metrics."""
+    lines: list[str] = []
+
+    serp_requests = metrics.total("provider_requests", provider="serpapi")
+    serp_hits = metrics.total("cache_lookups", cache="serp", result="hit")
+    if serp_requests or serp_hits:
+        failed = metrics.total("provider_requests", provider="serpapi") - sum(
+            metrics.total("provider_requests", provider="serpapi", outcome=o) for o in ("ok", "empty")
+        )
+        lines.append(
+            f"📡 SerpAPI: {metrics.total('credits', provider='serpapi'):g} credits, "
+            f"{serp_hits:g} queries served from cache, {failed:g} failed "
+            f"(p95 {_fmt_bound(metrics.latency('provider_latency_seconds', provider='serpapi')['p95'])})"
+        )
+
+    gate = metrics.breakdown("filter_rejections", "reason", stage="serp_gate")
+    if gate:
+        skipped = sum(gate.values())
+        lines.append(
+            f"🚧 SERP gate skipped {skipped:g} profiles before enrichment "
+            f"(~${skipped * APIFY_COST_PER_PROFILE:.2f} Apify credits): "
+            + ", ".join(f"{k} {v:g}" for k, v in sorted(gate.items()))
+        )
+
+    apify_credits = metrics.total("credits", provider="apify")
+    if apify_credits:
+        wasted_by_reason = metrics.breakdown("wasted_credits", "reason", provider="apify")
+        wasted = sum(wasted_by_reason.values())
+        lines.append(
+            f"💸 Apify credits on profiles later rejected by hard filters: {wasted:g}/{apify_credits:g} "
+            f"(~${wasted * APIFY_COST_PER_PROFILE:.2f})"
+            + (": " + ", ".join(f"{k} {v:g}" for k, v in sorted(wasted_by_reason.items())) if wasted else "")
+        )
+
+    key_runs = metrics.breakdown("provider_requests", "key", provider="apify")
+    if key_runs:
+        key_spend = metrics.breakdown("apify_key_spend_usd", "key")
+        parts = []
+        for key in sorted(key_runs):
+            headroom = metrics.gauge("apify_key_headroom_usd", key=key)
+            parts.append(
+                f"{key} {key_runs[key]:g} runs (${key_spend.get(key, 0):.2f}"
+                + (f", ~${headroom:.2f} left)" if headroom is not None else ")")
+            )
+        lines.append("🔑 Apify load by key: " + ", ".join(parts))
+
+    enrichment = metrics.breakdown("cache_lookups", "result", cache="enrichment")
+    lookups = sum(enrichment.values())
+    if lookups:
+        hits = enrichment.get("hit", 0)
+        lines.append(
+            f"💾 Enrichment cache this run: {hits:g}/{lookups:g} hits ({hits / lookups:.0%}), "
+            f"~${hits * APIFY_COST_PER_PROFILE:.2f} Apify credits saved"
+        )
+
+    aliases = metrics.total("identity_aliases")
+    if aliases:
+        lines.append(
+            f"🪪 Identity index: {aliases:g} discovered profiles were aliases of known leads "
+            f"(~${aliases * APIFY_COST_PER_PROFILE:.2f} Apify credits not spent)"
+        )
+
+    classification = metrics.breakdown("cache_lookups", "result", cache="classification")
+    lookups = sum(classification.values())
+    if lookups:
+        hits = classification.get("hit", 0)
+        entries = metrics.gauge("classification_cache_entries")
+        lines.append(
+            f"🧠 Classification cache this run: {hits:g}/{lookups:g} hits ({hits / lookups:.0%})"
+            + (f", {entries:g} classifications stored for the current prompt" if entries is not None else "")
+        )
+
+    local_version = metrics.gauge("local_model_version")
+    if local_version is not None:
+        lines.append(
+            f"🧠 Local model v{local_version:g} classified "
+            f"{metrics.total('classifications', source='local'):g} profiles without Gemini"
+        )
+
+    budget_line = metrics_budget_line(metrics)
+    if budget_line:
+        lines.append(budget_line)
+
+    rpm = metrics.gauge("gemini_effective_rpm")
+    if rpm is not None:
+        lines.append(
+            f"🤖 Gemini: {metrics.total('provider_requests', provider='gemini'):g} requests, "
+            f"{metrics.total('provider_rate_limited', provider='gemini'):g} rate-limited "
+            f"({metrics.total('provider_requests', provider='gemini', outcome='throttled'):g} gave up), "
+            f"now pacing at {rpm:g} RPM"
+        )
+    return lines
+
+
+def smart_fetch_linkedin_profiles(
+    subject, roles, cities, target_count,
+    serpapi_key, apify_manager, google_api_key,
+    status_container, lead_store: LeadStore | None = None,
+    use_serp_gate: bool = True,
+    metrics: Metrics | None = None,
+    on_metrics=None,
+    on_approved=None,
+    cancel_event: threading.Event | None = None,
+    resume: bool = True,
+    checkpoints: RunCheckpointStore | None = None,
+    budget: BudgetScheduler | None = None,
+) -> list:
+    """
+    Deep filtering loop, run as a producer/consumer pipeline:
+    discovery → enrichment → hard filters → classification.
+    Each stage runs on its own thread with bounded queues between them, so
+    SerpAPI, Apify and Gemini work overlaps instead of waiting on each other.
+    Stops when the target count is reached, when the Gemini budget runs
+    out, or when discovery finds nothing new for 4 consecutive rounds.
+    Dedup and lead status history go through the persistent LeadStore.
+    With `use_serp_gate`, discovered profiles pass a pre-enrichment gate on
+    their SERP data first, and survivors go to Apify best-first.
+    Per-stage and per-provider counters and latencies go to `metrics` (a
+    fresh Metrics if not given); `on_metrics(metrics)` is called from the
+    calling thread about once a second while the run is going, and the
+    closing summary written to `status_container` is rendered from it.
+    `on_approved(profile)` is called (from the classification thread) for
+    each lead as it is approved; setting `cancel_event` winds the run down
+    early, returning what was approved so far.
+    State (round counter, approved leads, profiles in flight between
+    stages, Gemini calls used, exhausted Apify keys) is checkpointed to
+    `checkpoints` after every stage transition. With `resume`, a run with
+    the same parameters as an interrupted or cancelled one picks up from
+    its checkpoint; the checkpoint is cleared once a run completes.
+    Every paid call is reserved from `budget` (a BudgetScheduler, possibly
+    shared with other runs; by default a private one holding only the
+    per-run caps), so spend never passes its hard caps. Discovery stops
+    once no SerpAPI search or Apify profile can be granted. Spend and
+    projected spend are published as metrics gauges.
+    """
+    approved_leads = []
+    lead_store = lead_store or get_lead_store()
+    identity = get_identity_index()
+    metrics = metrics if metrics is not None else Metrics()
+    run_budget = (budget if budget is not None else BudgetScheduler()).attach(target_count, subject)
+    max_rounds = 15
+    planner = QueryPlanner(subject, roles, cities)
+    classification_cache = get_classification_cache() if google_api_key else None
+
+    checkpoints = checkpoints if checkpoints is not None else get_checkpoint_store()
+    fingerprint = run_fingerprint(subject, roles, cities, target_count, use_serp_gate)
+    if checkpoints is not None and not checkpoints.acquire(fingerprint):
+        status_container.warning(
+            "⚠️ An identical search is already running here — this run won't resume or checkpoint."
+        )
+        checkpoints = None
+    progress = {"round": 0, "consecutive_empty": 0}
+    # Profiles between stages, by lead key: (next stage, profile snapshot)
+    in_flight: dict[str, tuple[str, dict]] = {}
+    backlog: dict[str, list[list[dict]]] = {"enrich": [], "filter": [], "classify": []}
+    failed_stages: list[str] = []
+
+    relay = _StatusRelay()
+    stop = threading.Event()
+    lock = threading.Lock()
+    to_enrich: queue.Queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    to_filter: queue.Queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    to_classify: queue.Queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+
+    def _put(q: queue.Queue, item) -> bool:
+        """Blocking put that gives up once the pipeline is stopping."""
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(q: queue.Queue):
+        """Blocking get; returns _PIPELINE_DONE once the pipeline is stopping."""
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+        return _PIPELINE_DONE
+
+    def _gemini_calls_left() -> int:
+        return run_budget.remaining("gemini")
+
+    def _publish_budget() -> None:
+        metrics.set("spend_usd", round(run_budget.usd, 4))
+        metrics.set("spend_projected_usd", round(run_budget.projected_usd(), 4))
+        for provider, b in run_budget.snapshot()["providers"].items():
+            metrics.set("budget_used", b["used"], provider=provider)
+            if b["limit"] is not None:
+                metrics.set("budget_cap", b["limit"], provider=provider)
+        for key in apify_manager.utilization():
+            metrics.set("apify_key_headroom_usd", round(key["headroom_usd"], 4), key=key["key"])
+
+    def _target_reached() -> bool:
+        with lock:
+            return len(approved_leads) >= target_count or _gemini_calls_left() <= 0
+
+    def _claim(profiles: list[dict]) -> list[dict]:
+        """Claim profiles in the lead store and index their aliases under the claimed keys."""
+        claimed = lead_store.claim_new(profiles, subject)
+        if identity is not None:
+            for p in claimed:
+                identity.link(p, LeadStore.key_for(p["url"]))
+        return claimed
+
+    checkpoint_lock = threading.Lock()
+
+    def _checkpoint(stage: str | None = None, profiles: list[dict] = (), done: list[dict] = ()) -> None:
+        """Record a stage transition: `profiles` now wait for `stage`, `done` left the pipeline."""
+        with lock:
+            for p in done:
+                in_flight.pop(LeadStore.key_for(p.get("url", "")) or p.get("url", ""), None)
+            for p in profiles:
+                in_flight[LeadStore.key_for(p.get("url", "")) or p.get("url", "")] = (stage, p)
+        if checkpoints is None:
+            return
+        with checkpoint_lock:
+            with lock:
+                state = {
+                    "round": progress["round"],
+                    "consecutive_empty": progress["consecutive_empty"],
+                    "approved": list(approved_leads),
+                    "in_flight": [[s, p] for s, p in in_flight.values()],
+                    "spent": {"used": dict(run_budget.used), "usd": run_budget.usd},
+                    "planner": planner.paging_state(),
+                }
+            try:
+                checkpoints.save(fingerprint, subject, state)
+            except sqlite3.Error as e:
+                relay.warning(f"⚠️ Could not save checkpoint: {str(e)[:200]}")
+
+    saved = checkpoints.load(fingerprint) if checkpoints is not None and resume else None
+    if saved:
+        progress["round"] = saved.get("round", 0)
+        progress["consecutive_empty"] = saved.get("consecutive_empty", 0)
+        approved_leads.extend(saved.get("approved", []))
+        run_budget.note_approved(len(approved_leads))
+        spent = saved.get("spent", {})
+        run_budget.preload(spent.get("used", {}), spent.get("usd", 0.0))
+        planner.restore_paging(saved.get("planner", {}))
+        for stage, p in saved.get("in_flight", []):
+            if stage in backlog:
+                in_flight[LeadStore.key_for(p.get("url", "")) or p.get("url", "")] = (stage, p)
+        for stage in backlog:
+            waiting = [p for s, p in in_flight.values() if s == stage]
+            backlog[stage] = [waiting[i : i + 40] for i in range(0, len(waiting), 40)]
+        if on_approved:
+            for profile in approved_leads:
+                on_approved(profile)
+        status_container.write(
+            f"♻️ Resuming from checkpoint ({datetime.fromtimestamp(saved['saved_at']):%H:%M}): "
+            f"round {progress['round']}, {len(approved_leads)} leads approved, "
+            f"{len(in_flight)} profiles in flight, ~${run_budget.usd:.2f} already spent"
+        )
+    elif checkpoints is not None:
+        checkpoints.clear(fingerprint)
+
+    if len(approved_leads) >= target_count:
+        # The interrupted run had already reached its target
+        if checkpoints is not None:
+            checkpoints.clear(fingerprint)
+            checkpoints.release(fingerprint)
+        run_budget.finish()
+        return approved_leads[:target_count]
+
+    def _next_batch(stage: str, q: queue.Queue):
+        """Resumed batches for `stage` first, then the upstream queue."""
+        if backlog[stage] and not stop.is_set():
+            return backlog[stage].pop(0)
+        return _get(q)
+
+    # 1. DISCOVERY
+    # ------------------------------------------------------------------
+    def _discovery_stage():
+        try:
+            while not stop.is_set() and progress["round"] < max_rounds:
+                progress["round"] += 1
+                search_round = progress["round"]
+
+                if progress["consecutive_empty"] >= 4:
+                    relay.warning("⚠️ Stopping: No new profiles found in last 4 rounds.")
+                    break
+                if planner.is_exhausted():
+                    relay.warning("⚠️ Stopping: Every query for this search has stopped yielding new profiles.")
+                    break
+                spent = [p for p in ("serpapi", "apify") if run_budget.remaining(p) <= 0]
+                if spent:
+                    relay.warning(f"⚠️ Stopping discovery: no {' or '.join(spent)} budget left for this run.")
+                    break
+
+                with metrics.timer("stage_batch_seconds", stage="discovery"):
+                    discovered = discover_via_serpapi(
+                        subject, roles, cities, serpapi_key, relay, round_num=search_round-1,
+                        planner=planner, known_urls=lead_store, metrics=metrics, budget=run_budget,
+                    )
+                metrics.inc("stage_items", len(discovered), stage="discovery")
+
+                # Dedup (indexed lookup in the lead store, then aliases of known leads)
+                new_profiles = [p for p in discovered if p["url"] not in lead_store]
+                if identity is not None and new_profiles:
+                    new_profiles, aliases = identity.split_aliases(new_profiles, lead_store)
+                    if aliases:
+                        metrics.inc("identity_aliases", len(aliases), stage="discovery")
+                        relay.write(f"   🪪 {len(aliases)} profiles are aliases of known leads — skipped")
+                if not new_profiles:
+                    progress["consecutive_empty"] += 1
+                    relay.write(f"   Round {search_round}: All duplicates. Retrying...")
+                    _checkpoint()
+                    continue
+                progress["consecutive_empty"] = 0
+
+                # Pre-enrichment gate: drop certain rejects, best candidates first
+                if use_serp_gate:
+                    new_profiles, gated = gate_serp_profiles(new_profiles)
+                    if gated:
+                        claimed = {id(p) for p in _claim([p for p, _, _ in gated])}
+                        gated = [g for g in gated if id(g[0]) in claimed]
+                        lead_store.mark(
+                            [p for p, _, _ in gated], "rejected",
+                            [f"serp_gate/{key}: {reason}" for _, key, reason in gated],
+                        )
+                        for _, key, _ in gated:
+                            metrics.inc("filter_rejections", stage="serp_gate", reason=key)
+                        relay.write(
+                            f"   🚧 SERP gate: skipped {len(gated)} profiles before enrichment, "
+                            f"{len(new_profiles)} left"
+                        )
+                    if not new_profiles:
+                        _checkpoint()
+                        continue
+
+                with lock:
+                    needed = target_count - len(approved_leads)
+                batch_size = min(max(needed, 1) * 2, 40, len(new_profiles))
+                # Claim atomically — another session may have taken some meanwhile.
+                # Profiles beyond this batch stay unclaimed for a later round.
+                batch = _claim(new_profiles[:batch_size])
+                _checkpoint("enrich", batch)
+                if batch and not _put(to_enrich, batch):
+                    break
+        finally:
+            _put(to_enrich, _PIPELINE_DONE)
+
+    # 2. ENRICHMENT (Batch logic)
+    # ------------------------------------------------------------------
+    def _enrichment_stage():
+        try:
+            while True:
+                batch = _next_batch("enrich", to_enrich)
+                if batch is _PIPELINE_DONE:
+                    break
+                # Profiles scraped early flow on to filtering while the run continues
+                streamed_ids: set[int] = set()
+
+                def _forward(profiles: list[dict]) -> None:
+                    streamed_ids.update(id(p) for p in profiles)
+                    lead_store.mark(profiles, "enriched")
+                    _checkpoint("filter", profiles)
+                    _put(to_filter, profiles)
+
+                metrics.inc("stage_items", len(batch), stage="enrichment")
+                with metrics.timer("stage_batch_seconds", stage="enrichment"):
+                    enriched = enrich_discovered_profiles(
+                        batch, apify_manager, relay, on_enriched=_forward, metrics=metrics, budget=run_budget,
+                    )
+                remaining = [p for p in enriched if id(p) not in streamed_ids]
+                lead_store.mark(remaining, "enriched")
+                _checkpoint("filter", remaining)
+                if remaining and not _put(to_filter, remaining):
+                    break
+        finally:
+            _put(to_filter, _PIPELINE_DONE)
+
+    # 3. HARD FILTERS
+    # ------------------------------------------------------------------
+    def _filter_stage():
+        try:
+            while True:
+                batch = _next_batch("filter", to_filter)
+                if batch is _PIPELINE_DONE:
+                    break
+                rejected: list[tuple[dict, str]] = []
+                metrics.inc("stage_items", len(batch), stage="filter")
+                with metrics.timer("stage_batch_seconds", stage="filter"):
+                    filtered, _ = apply_hard_filters(
+                        batch, relay, metrics=metrics,
+                        on_reject=lambda p, key, reason: rejected.append((p, f"{key}: {reason}")),
+                    )
+                if rejected:
+                    lead_store.mark([p for p, _ in rejected], "rejected", [r for _, r in rejected])
+                    for p, r in rejected:
+                        if p.get("enrichment_source") == "apify":
+                            metrics.inc("wasted_credits", provider="apify", reason=r.split(":", 1)[0])
+                _checkpoint("classify", filtered, done=[p for p, _ in rejected])
+                if filtered and not _put(to_classify, filtered):
+                    break
+        finally:
+            _put(to_classify, _PIPELINE_DONE)
+
+    # 4. CLASSIFICATION & SCORING
+    # ------------------------------------------------------------------
+    def _classification_stage():
+        gemini = get_gemini_executor(google_api_key) if google_api_key else None
+        gemini_stats_before = gemini.stats() if gemini else None
+        local_model = get_local_classifier()
+        try:
+            while not _target_reached():
+                batch = _next_batch("classify", to_classify)
+                if batch is _PIPELINE_DONE:
+                    break
+                batch_started = time.monotonic()
+                # Profiles past the Gemini budget stay in flight: they are checkpointed
+                # for a resume, or handed back to the lead store when the run ends
+                batch = batch[: max(_gemini_calls_left(), 0) * GEMINI_BATCH_SIZE]
+                metrics.inc("stage_items", len(batch), stage="classification")
+
+                # AI Classify — packed batches, sent concurrently under the RPM/TPM budget
+                batch_stats: dict = {}
+                classifications = classify_linkedin_profiles_batch(
+                    batch, google_api_key, stats=batch_stats, executor=gemini, local_model=local_model,
+                    metrics=metrics, budget=run_budget,
+                )
+                if batch_stats["fallbacks"]:
+                    relay.write(
+                        f"   ⚠️ {batch_stats['fallbacks']}/{len(batch)} classifications fell back to keyword rules "
+                        f"(throttled: {batch_stats['throttled']}, unparseable: {batch_stats['parse_failures']}, "
+                        f"API errors: {batch_stats['errors']}, over budget: {batch_stats['over_budget']})"
+                    )
+
+                candidates = []
+                for profile, classification in zip(batch, classifications):
+                    # Merge classification data
+                    profile.update(classification)
+
+                    # Check relevance from AI
+                    if not profile.get("is_relevant", True):
+                        lead_store.mark([profile], "rejected", [f"ai_irrelevant: {profile.get('reason', '')}"])
+                        continue
+
+                    # Extract Contact
+                    contacts = extract_linkedin_contacts(profile)
+                    profile.update(contacts)
+                    profile["contact_confidence"] = calculate_contact_confidence(contacts)
+
+                    # Tier Scoring
+                    profile["tier"] = calculate_linkedin_tier(profile, contacts, classification)
+
+                    # Strings for display
+                    profile["subjects_str"] = ", ".join(profile.get("subjects", []))
+                    candidates.append(profile)
+
+                with lock:
+                    surplus = candidates[max(target_count - len(approved_leads), 0) :]
+                    candidates = candidates[: len(candidates) - len(surplus)]
+
+                # AI Summary (Only for high value to save credits), run concurrently
+                high_value = [p for p in candidates if p["tier"] in ["A", "B"]][: max(_gemini_calls_left(), 0)]
+                if high_value:
+                    if gemini:
+                        summaries = gemini.map(
+                            lambda p: generate_linkedin_fit_summary(
+                                p, google_api_key, executor=gemini, metrics=metrics, budget=run_budget
+                            ),
+                            high_value,
+                        )
+                    else:
+                        summaries = [
+                            generate_linkedin_fit_summary(p, google_api_key, budget=run_budget) for p in high_value
+                        ]
+                    for profile, summary in zip(high_value, summaries):
+                        profile["ai_summary"] = summary
+
+                for profile in candidates:
+                    if "ai_summary" not in profile:
+                        profile["ai_summary"] = f"{profile.get('headline', '')}"
+                    with lock:
+                        approved_leads.append(profile)
+                    lead_store.mark([profile], "approved")
+                    run_budget.note_approved()
+                    metrics.inc("leads_approved", tier=profile["tier"])
+                    if on_approved:
+                        on_approved(profile)
+                    relay.write(f"   ✨ Approved: {profile['full_name']} ({profile['persona_type']}) - Tier {profile['tier']}")
+
+                surplus_ids = {id(p) for p in surplus}
+                _checkpoint(done=[p for p in batch if id(p) not in surplus_ids])
+                metrics.observe("stage_batch_seconds", time.monotonic() - batch_started, stage="classification")
+                relay.write(f"📊 **Progress:** {len(approved_leads)} / {target_count} leads found")
+        finally:
+            if local_model is not None:
+                metrics.set("local_model_version", local_model.version)
+            if gemini:
+                g = gemini.stats()
+                metrics.inc("provider_rate_limited", g["rate_limited"] - gemini_stats_before["rate_limited"], provider="gemini")
+                metrics.set("gemini_effective_rpm", g["effective_rpm"])
+            # Nothing downstream is consuming any more — wind the other stages down
+            stop.set()
+
+    def _run_stage(fn, name):
+        try:
+            fn()
+        except Exception as e:
+            failed_stages.append(name)
+            relay.warning(f"⚠️ {name} stage failed: {str(e)[:200]}")
+            stop.set()
+
+    threads = [
+        threading.Thread(target=_run_stage, args=(fn, name), name=f"pipeline-{name}", daemon=True)
+        for fn, name in [
+            (_discovery_stage, "discovery"),
+            (_enrichment_stage, "enrichment"),
+            (_filter_stage, "filter"),
+            (_classification_stage, "classification"),
+        ]
+    ]
+    for t in threads:
+        t.start()
+    last_metrics = 0.0
+    try:
+        while any(t.is_alive() for t in threads):
+            if cancel_event is not None and cancel_event.is_set() and not stop.is_set():
+                relay.warning("⏹ Run cancelled — finishing the batches in flight.")
+                stop.set()
+            relay.drain(status_container)
+            if time.monotonic() - last_metrics >= 1.0:
+                _publish_budget()
+                if on_metrics:
+                    on_metrics(metrics)
+                last_metrics = time.monotonic()
+            time.sleep(0.2)
+        relay.drain(status_container)
+
+        with lock:
+            leftover = [p for _, p in in_flight.values()]
+        interrupted = failed_stages or (cancel_event is not None and cancel_event.is_set())
+        if checkpoints is not None and (interrupted or leftover) and len(approved_leads) < target_count:
+            _checkpoint()
+            status_container.write(
+                f"💾 Progress checkpointed ({len(leftover)} profiles in flight) — "
+                "run the same search again to resume."
+            )
+        else:
+            if checkpoints is not None:
+                checkpoints.clear(fingerprint)
+            # Nothing will resume these, so let later runs claim them again
+            lead_store.release(leftover)
+    finally:
+        # The last stage-transition checkpoint stays on disk if we got here by an exception
+        stop.set()
+        run_budget.finish()
+        _publish_budget()
+        if checkpoints is not None:
+            checkpoints.release(fingerprint)
+
+    if classification_cache is not None:
+        metrics.set("classification_cache_entries", classification_cache.stats()["entries"])
+    for line in summarize_run_metrics(metrics):
+        status_container.write(line)
+    if on_metrics:
+        on_metrics(metrics)
+
+    return approved_leads[:target_count]
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# BACKGROUND JOBS
+# ──────────────────────────────────────────────────────────────────────────────
+
+class Job:
+    """
+    One discovery run executing on its own thread. Progress (status log,
+    leads approved so far, metrics) is readable at any time from any
+    thread, so a UI can poll it incrementally and a run is not tied to the
+    browser session that started it.
+    """
+
+    ACTIVE = ("queued", "running")
+
+    def __init__(self, job_id: str, params: dict, campaign: str = ""):
+        self.id = job_id
+        self.campaign = campaign
+        self.subject = params.get("subject", "")
+        self.target_count = params.get("target_count", 0)
+        self.metrics = Metrics()
+        self.cancel_event = threading.Event()
+        self.status = "queued"
+        self.error = ""
+        self.created_at = time.time()
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self._params = params
+        self._lock = threading.Lock()
+        self._log: list[tuple[str, str]] = []
+        self._log_start = 0       # absolute index of _log[0] once old lines are dropped
+        self._leads: list[dict] = []
+
+    # Status-container interface, so the job can be passed as `status_container`
+    def write(self, msg) -> None:
+        self._append("write", str(msg))
+
+    def warning(self, msg) -> None:
+        self._append("warning", str(msg))
+
+    def _append(self, kind: str, msg: str) -> None:
+        with self._lock:
+            self._log.append((kind, msg))
+            if len(self._log) > JOB_LOG_MAX_LINES:
+                drop = len(self._log) - JOB_LOG_MAX_LINES // 2
+                del self._log[:drop]
+                self._log_start += drop
+
+    def _on_approved(self, profile: dict) -> None:
+        with self._lock:
+            self._leads.append(profile)
+
+    @property
+    def is_active(self) -> bool:
+        return self.status in self.ACTIVE
+
+    def messages(self, since: int = 0) -> tuple[list[tuple[str, str]], int]:
+        """Log lines (kind, text) from absolute index `since` on, and the index to poll from next."""
+        with self._lock:
+            start = max(since - self._log_start, 0)
+            return self._log[start:], self._log_start + len(self._log)
+
+    def leads(self) -> list[dict]:
+        """Leads approved so far (the final, trimmed list once the job is done)."""
+        with self._lock:
+            return list(self._leads)
+
+    def snapshot(self) -> dict:
+        """Plain-data summary of the job; never includes the API keys it was given."""
+        with self._lock:
+            approved = len(self._leads)
+        return {
+            "id": self.id,
+            "campaign": self.campaign,
+            "subject": self.subject,
+            "target_count": self.target_count,
+            "status": self.status,
+            "approved": approved,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+    def run(self) -> None:
+        self.status = "running"
+        self.started_at = time.time()
+        try:
+            results = smart_fetch_linkedin_profiles(
+                status_container=self, metrics=self.metrics, on_approved=self._on_approved,
+                cancel_event=self.cancel_event, **self._params,
+            )
+            with self._lock:
+                self._leads = list(results)
+            self.status = "cancelled" if self.cancel_event.is_set() else "done"
+        except Exception as e:
+            self.error = str(e)[:500]
+            self.warning(f"❌ Job failed: {self.error}")
+            self.status = "failed"
+        finally:
+            self.finished_at = time.time()
+            self._params = {}     # drop the API keys as soon as the run is over
+
+
+class Campaign:
+    """
+    A group of jobs, one per search, submitted together. They share the
+    lead store (so a profile found by two searches is claimed, enriched and
+    classified once) and one BudgetScheduler.
+    """
+
+    def __init__(self, campaign_id: str, budget: BudgetScheduler):
+        self.id = campaign_id
+        self.budget = budget
+        self.jobs: list[Job] = []
+        self.created_at = time.time()
+
+    @property
+    def is_active(self) -> bool:
+        return any(j.is_active for j in self.jobs)
+
+    @property
+    def status(self) -> str:
+        if self.is_active:
+            return "running"
+        statuses = {j.status for j in self.jobs}
+        return "done" if statuses <= {"done"} else "cancelled" if "cancelled" in statuses else "failed"
+
+    def leads(self) -> list[dict]:
+        """Leads approved so far by every search, each tagged with its `campaign_subject`."""
+        return [{**p, "campaign_subject": j.subject} for j in self.jobs for p in j.leads()]
+
+    def snapshot(self) -> dict:
+        jobs = [j.snapshot() for j in self.jobs]
+        return {
+            "id": self.id,
+            "status": self.status,
+            "jobs": jobs,
+            "approved": sum(j["approved"] for j in jobs),
+            "target_count": sum(j["target_count"] for j in jobs),
+            "budget": self.budget.snapshot(),
+            "created_at": self.created_at,
+        }
+
+
+class JobManager:
+    """
+    Runs discovery jobs on background threads, at most `max_concurrent` at
+    a time (later submissions wait as "queued"). Jobs live in the process,
+    not in a browser session, so they keep going after a disconnect and any
+    session can look one up by id. The most recent `history` finished jobs
+    are kept.
+    """
+
+    def __init__(self, max_concurrent: int = JOB_MAX_CONCURRENT, history: int = JOB_HISTORY):
+        self.history = history
+        self._slots = threading.Semaphore(max(int(max_concurrent), 1))
+        self._lock = threading.Lock()
+        self._jobs: dict[str, Job] = {}
+        self._campaigns: dict[str, Campaign] = {}
+
+    def submit(
+        self, subject, roles, cities, target_count,
+        serpapi_key, apify_manager, google_api_key, campaign: str = "", **options,
+    ) -> str:
+        """
+        Queue a `smart_fetch_linkedin_profiles` run and return its job id.
+        `options` are passed through (lead_store, use_serp_gate, ...).
+        """
+        job = self._new_job(
+            subject, roles, cities, target_count, serpapi_key, apify_manager, google_api_key,
+            campaign=campaign, **options,
+        )
+        with self._lock:
+            self._jobs[job.id] = job
+            if campaign in self._campaigns:
+                self._campaigns[campaign].jobs.append(job)
+            self._prune()
+        self._start(job)
+        return job.id
+
+    def submit_campaign(
+        self, searches: list[tuple[str, int]], roles, cities,
+        serpapi_key, apify_manager, google_api_key,
+        limits: dict[str, float] | None = None, **options,
+    ) -> str:
+        """
+        Queue one job per (subject, target_count) in `searches`, all drawing
+        on one BudgetScheduler (`limits`, default CAMPAIGN_BUDGET), and
+        return the campaign id. Each job still keeps to the per-run caps.
+        Jobs run up to `max_concurrent` at a time.
+        """
+        campaign = Campaign(uuid.uuid4().hex[:12], BudgetScheduler(limits or CAMPAIGN_BUDGET))
+        campaign.jobs = [
+            self._new_job(
+                subject, roles, cities, target_count, serpapi_key, apify_manager, google_api_key,
+                campaign=campaign.id, budget=campaign.budget, **options,
+            )
+            for subject, target_count in searches
+        ]
+        # Register the campaign together with its jobs, so no prune sees it empty
+        with self._lock:
+            for job in campaign.jobs:
+                self._jobs[job.id] = job
+            self._campaigns[campaign.id] = campaign
+            self._prune()
+        for job in campaign.jobs:
+            self._start(job)
+        return campaign.id
+
+    @staticmethod
+    def _new_job(
+        subject, roles, cities, target_count,
+        serpapi_key, apify_manager, google_api_key, campaign: str = "", **options,
+    ) -> Job:
+        return Job(uuid.uuid4().hex[:12], dict(
+            subject=subject, roles=roles, cities=cities, target_count=target_count,
+            serpapi_key=serpapi_key, apify_manager=apify_manager, google_api_key=google_api_key,
+            **options,
+        ), campaign=campaign)
+
+    def _start(self, job: Job) -> None:
+        threading.Thread(target=self._run, args=(job,), name=f"job-{job.id}", daemon=True).start()
+
+    def _run(self, job: Job) -> None:
+        with self._slots:
+            if job.cancel_event.is_set():
+                job.status = "cancelled"
+                job.finished_at = time.time()
+                return
+            job.run()
+
+    def _prune(self) -> None:
+        finished = sorted(
+            (j for j in self._jobs.values() if not j.is_active), key=lambda j: j.finished_at or j.created_at
+        )
+        for job in finished[: max(len(finished) - self.history, 0)]:
+            del self._jobs[job.id]
+        for campaign in list(self._campaigns.values()):
+            campaign.jobs = [j for j in campaign.jobs if j.id in self._jobs]
+            if not campaign.jobs:
+                del self._campaigns[campaign.id]
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> list[Job]:
+        """All known jobs, newest first."""
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda j: j.created_at, reverse=True)
+
+    def cancel(self, job_id: str) -> bool:
+        """Ask a queued or running job to stop; returns False if there is no such active job."""
+        job = self.get(job_id)
+        if job is None or not job.is_active:
+            return False
+        job.cancel_event.set()
+        return True
+
+    def get_campaign(self, campaign_id: str) -> Campaign | None:
+        with self._lock:
+            return self._campaigns.get(campaign_id)
+
+    def campaigns(self) -> list[Campaign]:
+        """All known campaigns, newest first."""
+        with self._lock:
+            return sorted(self._campaigns.values(), key=lambda c: c.created_at, reverse=True)
+
+    def cancel_campaign(self, campaign_id: str) -> int:
+        """Cancel every active job of a campaign; returns how many were asked to stop."""
+        campaign = self.get_campaign(campaign_id)
+        if campaign is None:
+            return 0
+        return sum(self.cancel(j.id) for j in list(campaign.jobs))
+
+
+_job_manager: JobManager | None = None
+
+
+def get_job_manager() -> JobManager:
+    """Return the process-wide job manager shared by every session."""
+    global _job_manager
+    if _job_manager is None:
+        _job_manager = JobManager()
+    return _job_manager
@@ -0,0 +1,29 @@
+"""
+Shared fixtures for the pipeline tests. Everything runs offline; SQLite
+stores are opened under a per-test DATA_DIR so tests never see each other's
+(or a real run's) state.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pipeline  # noqa: E402
+
+# Lazily opened module-level stores; each test gets its own
+_STORE_SINGLETONS = (
+    "_serp_cache", "_lead_store", "_identity_index", "_checkpoint_store", "_actor_health",
+    "_key_ledger", "_enrichment_cache", "_classification_cache", "_local_model",
+)
+
+
+@pytest.fixture(autouse=True)
+def data_dir(tmp_path, monkeypatch):
+    """Point DATA_DIR at a fresh directory and drop the shared store singletons."""
+    monkeypatch.setattr(pipeline, "DATA_DIR", str(tmp_path))
+    for name in _STORE_SINGLETONS:
+        monkeypatch.setattr(pipeline, name, None)
+    return tmp_path
@@ -0,0 +1,194 @@
+"""RunCheckpointStore round-trips and resuming smart_fetch_linkedin_profiles from a checkpoint."""
+
+import time
+
+import pipeline
+from pipeline import (
+    GEMINI_BATCH_SIZE,
+    ApifyKeyManager,
+    BudgetScheduler,
+    LeadStore,
+    QueryPlanner,
+    RunCheckpointStore,
+    run_fingerprint,
+    smart_fetch_linkedin_profiles,
+)
+
+SUBJECT, ROLES, CITIES = "physics teacher", ["Tutor/Teacher"], ["Delhi", "Kota"]
+
+
+class _Log:
+    def __init__(self):
+        self.lines: list[str] = []
+
+    def write(self, message, *_):
+        self.lines.append(str(message))
+
+    warning = info = success = error = write
+
+
+def _lead(slug: str, tier: str = "A") -> dict:
+    return {
+        "url": f"https://www.linkedin.com/in/{slug}",
+        "full_name": slug.replace("-", " ").title(),
+        "tier": tier,
+        "subjects": ["Physics"],
+        "grades": [11, 12],
+        "raw_experience": [{"title": "Teacher", "company": "Kota Classes", "years": 4.5}],
+        "is_relevant": True,
+    }
+
+
+def _state(approved: list[dict], in_flight=(), planner: QueryPlanner | None = None) -> dict:
+    return {
+        "round": 3,
+        "consecutive_empty": 1,
+        "approved": approved,
+        "in_flight": [list(x) for x in in_flight],
+        "spent": {"used": {"serpapi": 12, "apify": 40, "gemini": 5}, "usd": 0.41},
+        "planner": planner.paging_state() if planner else {"next_start": {}, "done": []},
+    }
+
+
+def test_save_load_round_trip():
+    store = RunCheckpointStore()
+    fp = run_fingerprint(SUBJECT, ROLES, CITIES, 5)
+    state = _state([_lead("priya-iyer")], in_flight=[("classify", _lead("rohit-das", tier=""))])
+
+    store.save(fp, SUBJECT, state)
+    loaded = RunCheckpointStore().load(fp)
+
+    saved_at = loaded.pop("saved_at")
+    assert loaded == state
+    assert time.time() - saved_at < 60
+
+
+def test_planner_paging_survives_the_round_trip():
+    planner = QueryPlanner(SUBJECT, ROLES, CITIES)
+    for query in planner.next_queries(1):
+        planner.record(query["arm"], new_slugs=3, organic_count=10)
+    store = RunCheckpointStore()
+    store.save("fp", SUBJECT, _state([], planner=planner))
+
+    resumed = QueryPlanner(SUBJECT, ROLES, CITIES)
+    resumed.restore_paging(store.load("fp")["planner"])
+    assert resumed.paging_state() == planner.paging_state()
+
+
+def test_stale_checkpoints_are_ignored_and_pruned():
+    store = RunCheckpointStore(ttl_hours=1)
+    store.save("fp", SUBJECT, _state([]))
+    store._conn.execute("UPDATE run_checkpoints SET updated_at = ?", (time.time() - 7200,))
+    store._conn.commit()
+    assert store.load("fp") is None
+    RunCheckpointStore(ttl_hours=1)
+    assert store._conn.execute("SELECT COUNT(*) FROM run_checkpoints").fetchone()[0] == 0
+
+
+def test_clear_and_single_holder():
+    store = RunCheckpointStore()
+    store.save("fp", SUBJECT, _state([]))
+    store.clear("fp")
+    assert store.load("fp") is None
+    assert store.acquire("fp")
+    assert not store.acquire("fp")
+    store.release("fp")
+    assert store.acquire("fp")
+
+
+def test_fingerprint_ignores_order_and_case():
+    assert run_fingerprint("Physics Teacher ", ["b", "a"], CITIES, 5) == run_fingerprint(
+        "physics teacher", ["a", "b"], list(reversed(CITIES)), 5
+    )
+    assert run_fingerprint(SUBJECT, ROLES, CITIES, 5) != run_fingerprint(SUBJECT, ROLES, CITIES, 6)
+    assert run_fingerprint(SUBJECT, ROLES, CITIES, 5) != run_fingerprint(SUBJECT, ROLES, CITIES, 5, False)
+
+
+def test_resumed_run_that_had_reached_its_target_returns_saved_leads():
+    store = RunCheckpointStore()
+    approved = [_lead("priya-iyer"), _lead("rohit-das", "B")]
+    store.save(run_fingerprint(SUBJECT, ROLES, CITIES, 2), SUBJECT, _state(approved))
+    budget = BudgetScheduler(run_caps={})
+    delivered: list[dict] = []
+    log = _Log()
+
+    leads = smart_fetch_linkedin_profiles(
+        SUBJECT, ROLES, CITIES, 2, "", ApifyKeyManager(["key-1", "key-2"], ledger=None), "", log,
+        on_approved=delivered.append, checkpoints=store, budget=budget,
+    )
+
+    assert leads == approved
+    assert delivered == approved
+    assert any("Resuming from checkpoint" in line for line in log.lines)
+    assert budget.used("serpapi") == 12 and budget.used("apify") == 40
+    assert store.load(run_fingerprint(SUBJECT, ROLES, CITIES, 2)) is None
+    assert store.acquire(run_fingerprint(SUBJECT, ROLES, CITIES, 2))
+
+
+def test_key_exhaustion_is_left_to_the_ledger():
+    store = RunCheckpointStore()
+    fp = run_fingerprint(SUBJECT, ROLES, CITIES, 1)
+    # A checkpoint written before key state moved to the ledger
+    store.save(fp, SUBJECT, {**_state([_lead("priya-iyer")]), "exhausted_keys": [pipeline.key_fingerprint("key-1")]})
+    keys = ApifyKeyManager(["key-1"], ledger=None)
+
+    smart_fetch_linkedin_profiles(SUBJECT, ROLES, CITIES, 1, "", keys, "", _Log(), checkpoints=store)
+
+    assert keys.exhausted_keys == set()
+
+
+def _resume_with_classify_backlog(store, target_count: int, profiles: list[dict], gemini_calls: int, lead_store):
+    """Resume a run whose only work left is classifying `profiles`, with no search or scrape budget."""
+    fp = run_fingerprint(SUBJECT, ROLES, CITIES, target_count)
+    state = {**_state([], in_flight=[("classify", p) for p in profiles]), "spent": {"used": {}, "usd": 0.0}}
+    store.save(fp, SUBJECT, state)
+    budget = BudgetScheduler(run_caps={"serpapi": 0, "apify": 0, "gemini": gemini_calls})
+    leads = smart_fetch_linkedin_profiles(
+        SUBJECT, ROLES, CITIES, target_count, "", ApifyKeyManager(["key-1"], ledger=None), "", _Log(),
+        lead_store=lead_store, checkpoints=store, budget=budget,
+    )
+    return leads, fp
+
+
+def test_profiles_past_the_gemini_budget_stay_checkpointed():
+    store, lead_store = RunCheckpointStore(), LeadStore()
+    profiles = [_lead(f"teacher-{i}", tier="") for i in range(GEMINI_BATCH_SIZE + 5)]
+
+    _resume_with_classify_backlog(store, 100, profiles, gemini_calls=1, lead_store=lead_store)
+
+    saved = store.load(run_fingerprint(SUBJECT, ROLES, CITIES, 100))
+    waiting = [p["url"] for stage, p in saved["in_flight"] if stage == "classify"]
+    assert waiting == [p["url"] for p in profiles[GEMINI_BATCH_SIZE:]]
+
+
+def test_surplus_candidates_are_handed_back_to_the_lead_store(monkeypatch):
+    store, lead_store = RunCheckpointStore(), LeadStore()
+    profiles = [_lead(f"teacher-{i}", tier="") for i in range(5)]
+    lead_store.claim_new(profiles, SUBJECT)
+    lead_store.mark(profiles, "enriched")
+    monkeypatch.setattr(
+        pipeline, "classify_linkedin_profiles_batch",
+        lambda batch, *_, stats, **__: stats.update(fallbacks=0) or [pipeline.fallback_classify(p) for p in batch],
+    )
+
+    leads, fp = _resume_with_classify_backlog(store, 2, profiles, gemini_calls=10, lead_store=lead_store)
+
+    assert [p["url"] for p in leads] == [p["url"] for p in profiles[:2]]
+    assert store.load(fp) is None
+    assert all(p["url"] in lead_store for p in profiles[:2])
+    assert not any(p["url"] in lead_store for p in profiles[2:])
+    assert lead_store.claim_new(profiles, SUBJECT) == profiles[2:]
+
+
+def test_released_claims_can_be_claimed_again():
+    lead_store = LeadStore()
+    a, b, c = (_lead(slug) for slug in ("priya-iyer", "rohit-das", "meera-nair"))
+    lead_store.claim_new([a, b, c], SUBJECT)
+    lead_store.mark([b], "enriched")
+    lead_store.mark([c], "approved")
+
+    lead_store.release([a, b, c])
+
+    assert a["url"] not in lead_store and b["url"] not in lead_store
+    assert c["url"] in lead_store
+    assert lead_store.claim_new([a, b, c], SUBJECT) == [a, b]
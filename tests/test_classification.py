@@ -0,0 +1,167 @@
+"""Batch classification: reply parsing and validation, keyword scope, fallbacks and the local model gate."""
+
+import json
+
+import numpy as np
+
+import pipeline
+from pipeline import LocalClassifier, classify_linkedin_profiles_batch, fallback_classify
+
+DIM = 64
+
+
+class FakeGemini:
+    """Stands in for GeminiExecutor: answers prompts from `replies` in order, raising any exception found there."""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.prompts: list[str] = []
+
+    def generate(self, prompt: str) -> str:
+        self.prompts.append(prompt)
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    def map(self, fn, items: list) -> list:
+        return [fn(item) for item in items]
+
+
+def _item(pid: str, **overrides) -> dict:
+    item = {
+        "id": pid, "persona_type": "Individual Tutor", "subjects": ["Physics"], "grades": [11, 12],
+        "boards": [], "seniority": "Teacher", "collaboration_potential": "Medium", "is_relevant": True,
+        "reason": "teaches physics",
+    }
+    return {**item, **overrides}
+
+
+def _batch(profiles, executor, **kwargs):
+    stats: dict = {}
+    results = classify_linkedin_profiles_batch(profiles, "key", executor=executor, stats=stats, **kwargs)
+    return results, stats
+
+
+def _local_model(bias: float) -> LocalClassifier:
+    """A model that predicts the first label of every head, more confidently the larger `bias` is."""
+    weights = {}
+    for head, labels in pipeline._LOCAL_HEADS.items():
+        w = np.zeros((DIM, len(labels)), dtype=np.float32)
+        w[0, 0 if head != "is_relevant" else 1] = bias
+        weights[head] = w
+    return LocalClassifier(weights, {}, {"dim": DIM, "version": 3})
+
+
+def _profile(headline: str, company: str = "", about: str = "") -> dict:
+    return {"full_name": "Meera Nair", "headline": headline, "current_company": company, "about": about}
+
+
+PROFILES = [
+    _profile("Physics & Maths Faculty | JEE/NEET", "Kota Classes"),
+    _profile("CBSE English teacher, class 6 to 8", "Delhi Public School", "Also IGCSE tutoring"),
+]
+
+
+def test_teaching_scope_from_keywords():
+    scope = pipeline._teaching_scope(dict(pipeline._classification_fields(PROFILES[1])))
+    assert scope == {"subjects": ["English"], "grades": [6, 7, 8], "boards": ["CBSE", "IGCSE"]}
+
+
+def test_teaching_scope_matches_whole_words_only():
+    scope = pipeline._teaching_scope({"Headline": "Aftermath consultant at Ibis hotels, 1st rank"})
+    assert scope == {"subjects": [], "grades": [], "boards": []}
+
+
+def test_fallback_classify_fills_scope():
+    result = fallback_classify(PROFILES[0])
+    assert result["persona_type"] == "Coaching Institute Owner"
+    assert result["subjects"] == ["Mathematics", "Physics"]
+    assert result["grades"] == [11, 12]
+
+
+def test_local_predictions_carry_scope():
+    (result, confidence), _ = _local_model(bias=20.0).classify_many(PROFILES)
+    assert confidence > pipeline.LOCAL_MODEL_MIN_CONFIDENCE
+    assert result["persona_type"] == pipeline.PERSONA_TYPES[0]
+    assert result["subjects"] == ["Mathematics", "Physics"]
+    assert result["grades"] == [11, 12]
+
+
+def test_confident_local_predictions_skip_fallback_without_key():
+    stats: dict = {}
+    results = classify_linkedin_profiles_batch(PROFILES, api_key="", local_model=_local_model(20.0), stats=stats)
+    assert stats["local"] == 2 and stats["fallbacks"] == 0
+    assert all(r["reason"].startswith("Local model v3") for r in results)
+
+
+def test_unsure_local_predictions_fall_back_without_key():
+    stats: dict = {}
+    results = classify_linkedin_profiles_batch(PROFILES, api_key="", local_model=_local_model(0.0), stats=stats)
+    assert stats["local"] == 0 and stats["fallbacks"] == 2
+    assert results == [fallback_classify(p) for p in PROFILES]
+    assert stats["parse_failures"] == 0
+
+
+def test_temperature_is_calibrated_apart_from_the_evaluation_rows(monkeypatch):
+    examples = [
+        ({"Headline": f"{subject} teacher #{i}"}, _item(str(i), persona_type=persona))
+        for i in range(400)
+        for subject, persona in [("Physics", "Individual Tutor") if i % 2 else ("Sales", "Irrelevant")]
+    ]
+    fitted_on: list[int] = []
+    real_fit = pipeline._fit_temperature
+
+    def _fit(logits, y):
+        fitted_on.append(len(y))
+        return real_fit(logits, y)
+
+    monkeypatch.setattr(pipeline, "_fit_temperature", _fit)
+    model = pipeline.train_local_classifier(examples, save=False, epochs=2)
+
+    meta = model.meta
+    assert meta["n_calibration"] > 0 and meta["n_holdout"] > 0
+    assert meta["n_train"] + meta["n_calibration"] + meta["n_holdout"] == len(examples)
+    assert set(fitted_on) == {meta["n_calibration"]}
+
+
+def test_batch_reply_is_parsed_and_cached():
+    reply = "```json\n" + json.dumps([_item("p1", persona_type="Institute Leader"), _item("p0")]) + "\n```"
+    results, stats = _batch(PROFILES, FakeGemini(reply))
+    assert [r["persona_type"] for r in results] == ["Individual Tutor", "Institute Leader"]
+    assert (stats["requests"], stats["parsed"], stats["fallbacks"]) == (1, 2, 0)
+
+    again, stats = _batch(PROFILES, FakeGemini())
+    assert again == results
+    assert (stats["cached"], stats["requests"]) == (2, 0)
+
+
+def test_invalid_element_falls_back_alone():
+    reply = json.dumps({"results": [_item("p0", seniority="Wizard"), _item("p1"), _item("p7"), "junk"]})
+    results, stats = _batch(PROFILES, FakeGemini(reply))
+    assert results[0] == fallback_classify(PROFILES[0])
+    assert results[1]["reason"] == "teaches physics"
+    assert (stats["parsed"], stats["fallbacks"], stats["parse_failures"]) == (1, 1, 1)
+
+
+def test_missing_list_fields_and_bad_types_are_rejected():
+    assert pipeline._validate_classification(_item("p0", subjects="Physics")) is None
+    assert pipeline._validate_classification(_item("p0", is_relevant="yes")) is None
+    assert pipeline._validate_classification(_item("p0", persona_type="Astronaut")) is None
+    valid = pipeline._validate_classification({"persona_type": "Irrelevant"})
+    assert valid["is_relevant"] is False
+    assert valid["subjects"] == []
+
+
+def test_unparseable_reply_falls_back_for_the_whole_batch():
+    results, stats = _batch(PROFILES, FakeGemini("Sorry, I can't help with that."))
+    assert results == [fallback_classify(p) for p in PROFILES]
+    assert (stats["parse_failures"], stats["fallbacks"]) == (2, 2)
+
+
+def test_throttled_and_failed_requests_are_counted_apart():
+    results, stats = _batch(
+        PROFILES, FakeGemini(pipeline.GeminiThrottled("slow down"), RuntimeError("500")), batch_size=1
+    )
+    assert results == [fallback_classify(p) for p in PROFILES]
+    assert (stats["requests"], stats["throttled"], stats["errors"], stats["parse_failures"]) == (2, 1, 1, 0)
@@ -0,0 +1,232 @@
+"""
+Hard filters: the compiled KeywordMatcher/ProfileText versions must give
+the same verdicts and reasons as the plain list-scanning functions they
+replaced, which are kept here verbatim as the reference.
+"""
+
+import random
+
+import pytest
+
+import pipeline
+from pipeline import (
+    BRAND_BLACKLIST,
+    EDUCATION_KEYWORDS,
+    INDIA_INDICATORS,
+    MAX_COMPANY_FOLLOWERS,
+    MAX_CONNECTIONS,
+    MIN_COMPANY_FOLLOWERS,
+    MIN_CONNECTIONS,
+    NON_EDUCATION_KEYWORDS,
+)
+
+
+# ──────────────────────────────────────────────
+# REFERENCE — the filters before keyword compilation
+# ──────────────────────────────────────────────
+
+def ref_is_complete_profile(profile: dict) -> tuple[bool, str]:
+    name = (profile.get("full_name") or profile.get("name") or "").strip()
+    if not name:
+        return False, "Missing name"
+    headline = (profile.get("headline") or "").strip()
+    current_role = (profile.get("current_role") or "").strip()
+    if not headline and not current_role:
+        return False, "Missing both headline and role"
+    if profile.get("enrichment_status") == "serpapi_only":
+        snippet = (profile.get("snippet") or "").lower()
+        combined = f"{name} {headline} {current_role} {snippet}".lower()
+        if not any(kw in combined for kw in EDUCATION_KEYWORDS):
+            return False, "SerpAPI-only profile with no education signal"
+    return True, "Complete"
+
+
+def ref_is_blacklisted_brand(profile: dict) -> tuple[bool, str]:
+    name = (profile.get("full_name") or profile.get("name") or "").lower()
+    headline = (profile.get("headline") or "").lower()
+    company = (profile.get("current_company") or profile.get("organization") or "").lower()
+    company_name = (profile.get("company_name") or "").lower()
+    text_to_check = f"{name} ||| {headline} ||| {company} ||| {company_name}"
+    for brand in BRAND_BLACKLIST:
+        if brand.lower() in text_to_check:
+            return True, f"Blacklisted brand: {brand}"
+    return False, "Not blacklisted"
+
+
+def ref_is_india_based(profile: dict) -> tuple[bool, str]:
+    location = (profile.get("location") or "").lower()
+    if location:
+        for indicator in INDIA_INDICATORS:
+            if indicator in location:
+                return True, f"India location: {location}"
+        return False, f"Non-India location: {location}"
+    headline = (profile.get("headline") or "").lower()
+    about = (profile.get("about") or profile.get("snippet") or "").lower()
+    combined = f"{headline} {about}"
+    for indicator in INDIA_INDICATORS:
+        if indicator in combined:
+            return True, f"India indicator in text: {indicator}"
+    return True, "Location unknown — passing (benefit of doubt)"
+
+
+def ref_is_connection_in_range(profile: dict) -> tuple[bool, str]:
+    connections = profile.get("connections", 0) or 0
+    followers = profile.get("followers", 0) or 0
+    if profile.get("profile_type", "individual") == "company":
+        if followers == 0:
+            return True, "Company followers unknown — passing"
+        if followers < MIN_COMPANY_FOLLOWERS:
+            return False, f"Too few company followers: {followers} (min {MIN_COMPANY_FOLLOWERS})"
+        if followers > MAX_COMPANY_FOLLOWERS:
+            return False, f"Too many company followers: {followers} (max {MAX_COMPANY_FOLLOWERS})"
+        return True, f"Company followers OK: {followers}"
+    if connections == 0:
+        return True, "Connections unknown — passing"
+    if connections < MIN_CONNECTIONS:
+        return False, f"Too few connections: {connections} (min {MIN_CONNECTIONS})"
+    if connections > MAX_CONNECTIONS:
+        return False, f"Too many connections: {connections} (max {MAX_CONNECTIONS})"
+    return True, f"Connections OK: {connections}"
+
+
+def ref_is_education_relevant(profile: dict) -> tuple[bool, str]:
+    headline = (profile.get("headline") or "").lower()
+    about = (profile.get("about") or profile.get("snippet") or "").lower()
+    role = (profile.get("current_role") or "").lower()
+    company = (profile.get("current_company") or profile.get("organization") or "").lower()
+    skills = " ".join(s.lower() if isinstance(s, str) else "" for s in (profile.get("skills") or []))
+    combined = f"{headline} {about} {role} {company} {skills}"
+    if len(combined.strip()) < 5:
+        return True, "Insufficient text to evaluate — passing"
+    edu_matches = [kw for kw in EDUCATION_KEYWORDS if kw in combined]
+    non_edu_matches = [kw for kw in NON_EDUCATION_KEYWORDS if kw in combined]
+    leadership_keywords = ['founder', 'ceo', 'coo', 'managing director', 'director']
+    is_leadership = any(lk in combined for lk in leadership_keywords)
+    if not edu_matches:
+        return False, "No education keywords found"
+    if non_edu_matches and not any(kw for kw in edu_matches if kw not in leadership_keywords):
+        return False, f"Leadership role without education context (non-edu: {', '.join(non_edu_matches[:3])})"
+    if is_leadership:
+        edu_context_keywords = [
+            'school', 'academy', 'institute', 'college', 'university',
+            'coaching', 'classes', 'education', 'edtech', 'teaching',
+            'cbse', 'icse', 'igcse', 'ib', 'neet', 'jee', 'tuition',
+            'curriculum', 'pedagogy', 'learning', 'training'
+        ]
+        if not any(ck in combined for ck in edu_context_keywords):
+            return False, "Leadership role without education context"
+    return True, f"Education relevant ({', '.join(edu_matches[:3])})"
+
+
+REF_FILTERS = [
+    ("incomplete", ref_is_complete_profile, False),
+    ("blacklisted", ref_is_blacklisted_brand, True),
+    ("non_india", ref_is_india_based, False),
+    ("connection_range", ref_is_connection_in_range, False),
+    ("non_education", ref_is_education_relevant, False),
+]
+
+
+def ref_apply_hard_filters(profiles: list[dict]) -> tuple[list[dict], dict]:
+    stats = dict.fromkeys(["incomplete", "blacklisted", "non_india", "connection_range", "non_education"], 0)
+    stats["input"] = len(profiles)
+    passed = []
+    for p in profiles:
+        for key, check, reject_when in REF_FILTERS:
+            if check(p)[0] == reject_when:
+                stats[key] += 1
+                break
+        else:
+            passed.append(p)
+    stats["passed"] = len(passed)
+    return passed, stats
+
+
+# ──────────────────────────────────────────────
+# CORPUS
+# ──────────────────────────────────────────────
+
+_VOCAB = (
+    EDUCATION_KEYWORDS + NON_EDUCATION_KEYWORDS + INDIA_INDICATORS + [b.lower() for b in BRAND_BLACKLIST]
+    + ["vice", "principal", "managing", "director", "co-founder", "hub", "london", "dubai", "new york", "x", ""]
+)
+
+
+def _text(rng: random.Random, n: int) -> str:
+    words = [rng.choice(_VOCAB) for _ in range(rng.randint(0, n))]
+    if rng.random() < 0.3:
+        words = [w.title() for w in words]
+    return " ".join(words)
+
+
+def _profile(rng: random.Random) -> dict:
+    profile = {
+        "full_name": _text(rng, 2) if rng.random() < 0.9 else "",
+        "headline": _text(rng, 5),
+        "about": _text(rng, 12) if rng.random() < 0.7 else None,
+        "snippet": _text(rng, 8),
+        "current_role": _text(rng, 3),
+        "current_company": _text(rng, 2),
+        "organization": _text(rng, 2),
+        "company_name": _text(rng, 2) if rng.random() < 0.2 else "",
+        "location": _text(rng, 2) if rng.random() < 0.6 else "",
+        "skills": [_text(rng, 2), 7, None][: rng.randint(0, 3)],
+        "connections": rng.choice([0, None, 50, 100, 500, 30000, 30001]),
+        "followers": rng.choice([0, 10, 50, 1000, 500001]),
+        "profile_type": rng.choice(["individual", "individual", "company"]),
+        "enrichment_status": rng.choice(["enriched", "serpapi_only"]),
+    }
+    # Some profiles only carry the SERP-side fields
+    for field in ("full_name", "current_company", "about"):
+        if rng.random() < 0.1:
+            profile.pop(field)
+    return profile
+
+
+EDGE_CASES = [
+    {"full_name": "A", "headline": "vice", "about": "principal at x", "location": ""},
+    {"full_name": "B", "headline": "Founder", "current_role": "sales executive", "location": "India"},
+    {"full_name": "C", "headline": "CEO", "about": "", "current_company": "x", "location": "delhi"},
+    {"full_name": "PW", "headline": "x"},
+    {"name": "z", "headline": "ib tutor", "skills": [1, "Physics"]},
+    {"full_name": "D", "headline": "Director", "about": "edtech founder", "current_role": "marketing"},
+    {"name": "Kota", "headline": "Teacher", "enrichment_status": "serpapi_only", "snippet": ""},
+]
+
+
+@pytest.fixture(scope="module")
+def corpus() -> list[dict]:
+    rng = random.Random(13)
+    return [_profile(rng) for _ in range(5000)] + EDGE_CASES
+
+
+@pytest.mark.parametrize("name", [
+    "is_complete_profile", "is_blacklisted_brand", "is_india_based", "is_connection_in_range",
+    "is_education_relevant",
+])
+def test_filter_matches_reference(corpus, name):
+    new, ref = getattr(pipeline, name), globals()[f"ref_{name}"]
+    mismatches = [(p, new(p), ref(p)) for p in corpus if new(p) != ref(p)]
+    assert mismatches == []
+
+
+def test_shared_profile_text_matches_reference(corpus):
+    for p in corpus:
+        text = pipeline.ProfileText(p)
+        assert pipeline.is_blacklisted_brand(p, text) == ref_is_blacklisted_brand(p)
+        assert pipeline.is_india_based(p, text) == ref_is_india_based(p)
+        assert pipeline.is_education_relevant(p, text) == ref_is_education_relevant(p)
+
+
+class _Quiet:
+    def write(self, *_):
+        pass
+
+
+def test_apply_hard_filters_matches_reference(corpus):
+    rejected = []
+    passed, stats = pipeline.apply_hard_filters(corpus, _Quiet(), on_reject=lambda p, key, reason: rejected.append(key))
+    ref_passed, ref_stats = ref_apply_hard_filters(corpus)
+    assert [id(p) for p in passed] == [id(p) for p in ref_passed]
+    assert stats == ref_stats
+    assert len(rejected) == len(corpus) - len(passed)
@@ -0,0 +1,101 @@
+"""IdentityIndex: alias extraction, linking/merging and discovery dedup."""
+
+import pipeline
+from pipeline import IdentityIndex, LeadStore
+
+
+def _serp_hit(url: str, name: str, org: str) -> dict:
+    """A discovered profile as the SERP stage builds it from a result title."""
+    return {"url": url, "name": name, "organization": org, "profile_type": "individual"}
+
+
+def _scraped(url: str, name: str, company: str, public_id: str = "") -> dict:
+    return {
+        "url": url,
+        "linkedin_url": url,
+        "full_name": name,
+        "current_company": company,
+        "public_identifier": public_id,
+        "profile_type": "individual",
+        "enrichment_status": "enriched",
+    }
+
+
+class _Known(set):
+    """Stand-in for the lead store's `in` check on full profile URLs."""
+
+    def __init__(self, *lead_ids):
+        super().__init__(f"https://www.linkedin.com/{lead_id}" for lead_id in lead_ids)
+
+
+def test_aliases_url_forms_collapse_to_one_strong_alias():
+    strong, weak = IdentityIndex.aliases(
+        {"url": "https://in.linkedin.com/in/Priya-Iyer/details/", "profile_type": "individual"}
+    )
+    assert strong == ["in/priya-iyer"]
+    assert weak == []
+
+
+def test_weak_alias_only_for_scraped_profiles():
+    _, serp_weak = IdentityIndex.aliases(
+        _serp_hit("https://www.linkedin.com/in/a-1", "Dr. Priya Iyer", "Kota Classes")
+    )
+    _, scraped_weak = IdentityIndex.aliases(
+        _scraped("https://www.linkedin.com/in/a-1", "Dr. Priya Iyer", "Kota Classes")
+    )
+    assert serp_weak == []
+    assert scraped_weak == ["name:priya iyer|kota classes"]
+
+
+def test_link_merges_lead_ids_sharing_a_strong_alias():
+    index = IdentityIndex()
+    assert index.link(_scraped("https://www.linkedin.com/in/old-slug", "A B", "X")) == "in/old-slug"
+    assert index.link({"url": "https://www.linkedin.com/in/new-slug", "profile_type": "individual"}) == "in/new-slug"
+    # A scrape reporting the new slug with the old URL ties both ids together
+    merged = index.link(_scraped("https://www.linkedin.com/in/old-slug", "A B", "X", public_id="new-slug"))
+    assert merged == "in/old-slug"
+    assert index.resolve({"url": "https://uk.linkedin.com/in/new-slug", "profile_type": "individual"}) == "in/old-slug"
+
+
+def test_scraped_weak_alias_resolves_renamed_profile():
+    index = IdentityIndex()
+    index.link(_scraped("https://www.linkedin.com/in/priya-iyer-1", "Priya Iyer", "Kota Classes"))
+    renamed = _scraped("https://www.linkedin.com/in/priya-iyer-physics", "Priya Iyer", "Kota Classes")
+    assert index.resolve(renamed) == "in/priya-iyer-1"
+
+
+def test_split_aliases_drops_url_variant_of_known_lead():
+    index = IdentityIndex()
+    index.link(_serp_hit("https://www.linkedin.com/in/priya-iyer-1", "Priya Iyer", "Kota Classes"))
+    index.link({"url": "https://www.linkedin.com/in/priya-iyer-1", "public_identifier": "priya-iyer-phy",
+                "profile_type": "individual"}, "in/priya-iyer-1")
+    hit = _serp_hit("https://in.linkedin.com/in/priya-iyer-phy", "Priya Iyer", "Kota Classes")
+    new, dupes = index.split_aliases([hit], _Known("in/priya-iyer-1"))
+    assert (new, dupes) == ([], [hit])
+    assert index.alias_hits == 1
+
+
+def test_split_aliases_keeps_namesake_at_same_org():
+    """Two teachers called Rahul Sharma at one school are two leads."""
+    index = IdentityIndex()
+    first = _scraped("https://www.linkedin.com/in/rahul-sharma-1a2b", "Rahul Sharma", "Delhi Public School")
+    index.link(first, "in/rahul-sharma-1a2b")
+    known = _Known("in/rahul-sharma-1a2b")
+
+    hit = pipeline.extract_linkedin_info_from_url(
+        "https://in.linkedin.com/in/rahul-sharma-99zz", "", "Rahul Sharma - Physics Teacher - Delhi Public School"
+    )
+    assert (hit["name"], hit["organization"]) == ("Rahul Sharma", "Delhi Public School")
+    new, dupes = index.split_aliases([hit], known)
+    assert new == [hit]
+    assert dupes == []
+    assert index.link(hit, LeadStore.key_for(hit["url"])) == "in/rahul-sharma-99zz"
+
+
+def test_split_aliases_drops_repeat_within_batch():
+    index = IdentityIndex()
+    a = _serp_hit("https://www.linkedin.com/in/neha-das", "Neha Das", "Infosys")
+    b = _serp_hit("https://m.linkedin.com/in/neha-das/", "Neha Das", "Infosys")
+    new, dupes = index.split_aliases([a, b], _Known())
+    assert new == [a]
+    assert dupes == [b]
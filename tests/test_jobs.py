@@ -0,0 +1,54 @@
+"""JobManager: campaigns stay tracked with all their jobs while other sessions submit."""
+
+import time
+
+import pytest
+
+import pipeline
+from pipeline import JobManager
+
+
+@pytest.fixture(autouse=True)
+def instant_runs(monkeypatch):
+    monkeypatch.setattr(pipeline, "smart_fetch_linkedin_profiles", lambda **params: [])
+
+
+def _wait(manager: JobManager) -> None:
+    deadline = time.monotonic() + 5
+    while any(j.is_active for j in manager.jobs()) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_submit_during_campaign_setup_keeps_the_campaign(monkeypatch):
+    manager = JobManager(max_concurrent=2)
+    interleaved: list[str] = []
+
+    class _Job(pipeline.Job):
+        def __init__(self, job_id, params, campaign=""):
+            super().__init__(job_id, params, campaign)
+            if campaign and not interleaved:
+                # Another session submits while the campaign's jobs are being created
+                interleaved.append(manager.submit("maths", [], [], 1, "", None, ""))
+
+    monkeypatch.setattr(pipeline, "Job", _Job)
+
+    campaign_id = manager.submit_campaign([("physics", 2), ("chemistry", 3)], [], [], "", None, "")
+    _wait(manager)
+
+    campaign = manager.get_campaign(campaign_id)
+    assert campaign is not None
+    assert [j.subject for j in campaign.jobs] == ["physics", "chemistry"]
+    assert all(manager.get(j.id) is j for j in campaign.jobs)
+    assert campaign.status == "done"
+    assert manager.get(interleaved[0]).status == "done"
+
+
+def test_campaign_jobs_share_its_budget():
+    manager = JobManager()
+    campaign = manager.get_campaign(
+        manager.submit_campaign([("physics", 2), ("chemistry", 3)], [], [], "", None, "", limits={"usd": 1.0})
+    )
+    _wait(manager)
+    assert campaign.budget.limits == {"usd": 1.0}
+    assert [j.target_count for j in campaign.jobs] == [2, 3]
+    assert {j.campaign for j in campaign.jobs} == {campaign.id}
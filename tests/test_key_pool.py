@@ -0,0 +1,144 @@
+"""ApifyKeyManager leasing, headroom weighting, ledger sharing and revival."""
+
+import threading
+import time
+
+import pytest
+
+import pipeline
+from pipeline import ApifyKeyLedger, ApifyKeyManager, key_fingerprint
+
+
+@pytest.fixture
+def probes(monkeypatch):
+    """Replace the Apify balance call; tests set `balances[key]` (None = unreadable)."""
+    balances: dict = {}
+    calls: list = []
+
+    def _probe(key):
+        calls.append(key)
+        usd = balances.get(key)
+        return None if usd is None else {"limit_usd": 25.0, "balance_usd": usd, "cycle_end": None}
+
+    monkeypatch.setattr(pipeline, "_probe_apify_balance", _probe)
+    _probe.balances, _probe.calls = balances, calls
+    return _probe
+
+
+def _ledger_with(balances: dict) -> ApifyKeyLedger:
+    """A ledger holding fresh reported balances, so no probe is due."""
+    ledger = ApifyKeyLedger()
+    for key, usd in balances.items():
+        ledger.report(key_fingerprint(key), limit_usd=usd, balance_usd=usd, cycle_end=None)
+    return ledger
+
+
+def _wait_for_probes(pool: ApifyKeyManager, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while pool._probing and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not pool._probing
+
+
+def test_every_free_slot_is_leased_under_skewed_headroom(probes):
+    keys = ["k1", "k2", "k3", "k4"]
+    pool = ApifyKeyManager(keys, max_runs_per_key=2, ledger=_ledger_with(dict(zip(keys, [100, 5, 5, 5]))))
+    leases: list[int] = []
+    lock = threading.Lock()
+
+    def _lease():
+        idx = pool.acquire()
+        with lock:
+            leases.append(idx)
+
+    threads = [threading.Thread(target=_lease, daemon=True) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=2)
+    assert sorted(leases) == [0, 0, 1, 1, 2, 2, 3, 3]
+    assert probes.calls == []
+
+
+def test_batches_spread_by_headroom(probes):
+    keys = ["k1", "k2", "k3", "k4"]
+    pool = ApifyKeyManager(keys, max_runs_per_key=2, ledger=_ledger_with(dict(zip(keys, [100, 5, 5, 5]))))
+    for _ in range(46):
+        pool.release(pool.acquire())
+    batches = [row["batches"] for row in pool.utilization()]
+    assert sum(batches) == 46
+    assert batches[0] >= 35
+    assert max(batches[1:]) - min(batches[1:]) <= 1
+
+
+def test_acquire_does_not_wait_for_balance_probes(monkeypatch):
+    release_probe = threading.Event()
+
+    def _slow_probe(key):
+        release_probe.wait(5)
+        return None
+
+    monkeypatch.setattr(pipeline, "_probe_apify_balance", _slow_probe)
+    pool = ApifyKeyManager(["k1", "k2"], ledger=ApifyKeyLedger())
+    started = time.monotonic()
+    assert pool.acquire() is not None
+    assert pool.get_current_key() == "k1"
+    assert time.monotonic() - started < 1.0
+    release_probe.set()
+    _wait_for_probes(pool)
+
+
+def test_ledger_none_keeps_state_in_memory(probes, data_dir):
+    pool = ApifyKeyManager(["k1", "k2"], ledger=None)
+    assert pool.mark_exhausted(0) == "k2"
+    pool.charge(1, 1.5)
+    assert pool.active_indexes() == [1]
+    assert not (data_dir / "apify_keys.db").exists()
+    assert probes.calls == []
+
+
+def test_exhaustion_is_shared_through_the_ledger(probes):
+    ledger = _ledger_with({"k1": 10, "k2": 10})
+    ApifyKeyManager(["k1", "k2"], ledger=ledger).mark_exhausted(0)
+    other = ApifyKeyManager(["k1", "k2"], ledger=ledger)
+    assert other.active_indexes() == [1]
+    assert other.acquire() == 1
+
+
+def test_exhausted_key_is_revived_when_probe_finds_credit(probes, monkeypatch):
+    monkeypatch.setattr(pipeline, "APIFY_KEY_REPROBE_SECS", 0)
+    ledger = ApifyKeyLedger()
+    ledger.mark_exhausted(key_fingerprint("k1"))
+    probes.balances["k1"] = 20.0
+
+    pool = ApifyKeyManager(["k1"], ledger=ledger)
+    assert pool.active_indexes() == []
+    # Nothing is active, so acquire waits for the in-flight probe instead of giving up
+    assert pool.acquire() == 0
+    row = pool.utilization()[0]
+    assert (row["status"], row["source"], row["headroom_usd"]) == ("active", "reported", 20.0)
+
+
+def test_exhausted_key_stays_out_while_probe_finds_no_credit(probes, monkeypatch):
+    monkeypatch.setattr(pipeline, "APIFY_KEY_REPROBE_SECS", 0)
+    ledger = ApifyKeyLedger()
+    ledger.mark_exhausted(key_fingerprint("k1"))
+    probes.balances["k1"] = 0.0
+
+    pool = ApifyKeyManager(["k1"], ledger=ledger)
+    assert pool.acquire() is None
+    assert pool.is_exhausted()
+
+
+def test_failed_revival_backs_off_again(probes, monkeypatch):
+    monkeypatch.setattr(pipeline, "APIFY_KEY_REPROBE_SECS", 0)
+    ledger = ApifyKeyLedger()
+    fp = key_fingerprint("k1")
+    ledger.mark_exhausted(fp)
+    probes.balances["k1"] = 0.0
+    monkeypatch.setattr(pipeline, "APIFY_KEY_REPROBE_SECS", 3600)
+
+    ApifyKeyManager(["k1"], ledger=ledger).acquire()
+    row = ledger.rows([fp])[fp]
+    assert row["strikes"] == 2
+    assert row["retry_at"] > time.time() + 3600
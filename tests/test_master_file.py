@@ -0,0 +1,66 @@
+"""Streaming master lead files into SlugSets, from paths and uploaded file objects."""
+
+import builtins
+import gzip
+import io
+
+from pipeline import load_existing_linkedin_leads
+
+CSV = (
+    "Full Name,LinkedIn URL,City\n"
+    "Priya Iyer,https://in.linkedin.com/in/priya-iyer/,Pune\n"
+    "Rohit Das,https://www.linkedin.com/in/Rohit-Das?trk=x,Kota\n"
+    "Acme Classes,https://www.linkedin.com/company/acme-classes/about,Delhi\n"
+    "No Link,,Delhi\n"
+)
+
+
+def _track_open(monkeypatch) -> list:
+    opened = []
+    real_open = builtins.open
+
+    def _open(*args, **kwargs):
+        f = real_open(*args, **kwargs)
+        opened.append(f)
+        return f
+
+    monkeypatch.setattr(builtins, "open", _open)
+    return opened
+
+
+def test_csv_path_is_read_in_chunks_and_closed(tmp_path, monkeypatch):
+    path = tmp_path / "master.csv"
+    path.write_text(CSV, encoding="utf-8")
+    opened = _track_open(monkeypatch)
+    chunks = []
+
+    urls, names, count, error = load_existing_linkedin_leads(str(path), on_url_chunk=chunks.append, chunk_rows=2)
+
+    assert (count, error) == (3, "")
+    assert "https://www.linkedin.com/in/rohit-das" in urls
+    assert "https://www.linkedin.com/company/acme-classes" in urls
+    assert "priya iyer" in names
+    assert [len(c) for c in chunks] == [2, 1]
+    assert opened and all(f.closed for f in opened)
+
+
+def test_gzip_path_is_closed_after_a_read_error(tmp_path, monkeypatch):
+    path = tmp_path / "master.csv.gz"
+    path.write_bytes(gzip.compress(CSV.encode("utf-8"))[:40])
+    opened = _track_open(monkeypatch)
+
+    _, _, count, error = load_existing_linkedin_leads(path)
+
+    assert count == 0
+    assert error.startswith("❌ Error reading CSV")
+    assert opened and all(f.closed for f in opened)
+
+
+def test_uploaded_file_object_is_left_open():
+    upload = io.BytesIO(gzip.compress(CSV.encode("utf-8")))
+
+    urls, _, count, error = load_existing_linkedin_leads(upload)
+
+    assert (count, error) == (3, "")
+    assert "https://www.linkedin.com/in/priya-iyer" in urls
+    assert not upload.closed